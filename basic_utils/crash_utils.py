@@ -0,0 +1,184 @@
+"""
+This module provides the crash signatures, used to bucket the crashes caused by the same bug.
+
+The signature is computed at crash time from:
+- The assertion (or panic) message in the last log lines of the routing software.
+- The signal killing the daemon, as reported in its log.
+- The backtrace frames in its log (e.g., FRRouting logs the backtrace on `SIGSEGV`, Go panics dump the goroutines).
+- The path of the last mutated field of the last message sent.
+The numbers and the addresses are masked, so the crashes of the same bug get the same signature.
+The buckets are counted in `crash_index.json`, and the full artifacts are only kept for the first crashes of each bucket.
+"""
+
+import fcntl, hashlib, json, os, re
+from dataclasses import dataclass, field, asdict
+from .time_utils import get_current_time
+
+CRASH_INDEX_FILE = "crash_index.json"
+# The number of crashes of a bucket whose full artifacts are kept.
+CRASH_BUCKET_SAVE_NUM = 3
+# The number of the last crash names of a bucket kept to recognize a crash counted again.
+CRASH_RECENT_NAME_NUM = 64
+# The number of the last log lines searched for the crash information.
+CRASH_LOG_LINE_NUM = 50
+# The number of backtrace frames in the signature.
+CRASH_FRAME_NUM = 5
+
+ASSERT_PATTERNS = [
+    # Not the backtrace frames of these functions (e.g., `panic({...})`, `(abort+0x1a)`).
+    re.compile(r"\b(?:assert\w*|panic|fatal|abort\w*)\b(?![(+])|segmentation fault", re.IGNORECASE),
+    # Case-sensitive, `bug` is part of `debug`.
+    re.compile(r"\bBUG\b"),
+]
+# The debug-level lines (e.g., GoBGP runs with `-l debug`), never the crash message.
+DEBUG_LINE_PATTERN = re.compile(r"level=\"?debug\b|\"level\":\s*\"debug\"|<(?:DBG|TRACE)>", re.IGNORECASE)
+# The source locations of the backtrace frames (e.g., `\t/usr/local/go/src/runtime/panic.go:884 +0x213`).
+SOURCE_LINE_PATTERN = re.compile(r"^\s*\S+\.(?:go|c|h):\d+")
+SIGNAL_PATTERNS = [
+    re.compile(r"\b(SIG[A-Z]{2,6})\b"),
+    re.compile(r"[Ss]ignal[ :]+(\d+)\b"),
+]
+FRAME_PATTERNS = [
+    # glibc `backtrace_symbols`: `/usr/lib/libfrr.so.0(zlog_backtrace+0x3a) [0x7f...]`
+    re.compile(r"\(([A-Za-z_]\w*)\+0x[0-9a-fA-F]+\)"),
+    # Go panics: `github.com/osrg/gobgp/v3/pkg/packet/bgp.(*PathAttributeAsPath).DecodeFromBytes(...)`
+    re.compile(r"^\s*((?:[\w.-]+/)*[\w-]+\.(?:\(\*?\w+\)\.)?\w+)\(.*\)\s*$"),
+]
+
+def normalize_log_line(line: str) -> str:
+    """
+    Mask the parts of a log line changing between the crashes of the same bug (timestamps, addresses, numbers...).
+    """
+    line = re.sub(r"0x[0-9a-fA-F]+", "<addr>", line)
+    line = re.sub(r"\d+", "#", line)
+    return re.sub(r"\s+", " ", line).strip()
+
+def is_assert_line(line: str) -> bool:
+    """
+    Check if the log line reports the assertion (or panic), skipping the debug lines and the source locations.
+    """
+    if DEBUG_LINE_PATTERN.search(line) or SOURCE_LINE_PATTERN.match(line):
+        return False
+    return any(pattern.search(line) for pattern in ASSERT_PATTERNS)
+
+@dataclass
+class CrashSignature:
+    """
+    The information identifying the bug behind a crash.
+    """
+    router_type : str
+    assert_message : str = None
+    signal : str = None
+    frames : list[str] = field(default_factory=list)
+    field_path : str = None
+    # The last normalized log lines, used only if nothing else is found.
+    log_tail : list[str] = field(default_factory=list)
+
+    def get_id(self) -> str:
+        """
+        Get the ID of the bucket of the crash.
+        """
+        key = {
+            "router_type": self.router_type,
+            "assert_message": self.assert_message,
+            "signal": self.signal,
+            "frames": self.frames,
+            "field_path": self.field_path,
+        }
+        if self.assert_message is None and self.signal is None and not self.frames:
+            key["log_tail"] = self.log_tail
+        return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()[:12]
+
+    def get_string_expression(self) -> str:
+        """
+        Get the string expression of the signature.
+        """
+        return (f"bucket: {self.get_id()}\n"
+                f"router: {self.router_type}\n"
+                f"assert: {self.assert_message}\n"
+                f"signal: {self.signal}\n"
+                f"frames: {' <- '.join(self.frames)}\n"
+                f"field: {self.field_path}\n")
+
+def get_crash_signature(router_type: str, log_lines: list[str], field_path: str = None) -> CrashSignature:
+    """
+    Compute the crash signature from the last log lines of the routing software,
+    and the path of the last mutated field.
+    """
+    log_lines = [line for line in log_lines[-CRASH_LOG_LINE_NUM:] if line.strip()]
+    signature = CrashSignature(router_type=router_type,
+                               field_path=field_path,
+                               log_tail=[normalize_log_line(line) for line in log_lines[-3:]])
+    for line in log_lines:
+        # The last matching line is the closest to the crash.
+        if is_assert_line(line):
+            signature.assert_message = normalize_log_line(line)
+        for pattern in SIGNAL_PATTERNS:
+            match = pattern.search(line)
+            if signature.signal is None and match:
+                signature.signal = match.group(1)
+        if len(signature.frames) < CRASH_FRAME_NUM:
+            for pattern in FRAME_PATTERNS:
+                match = pattern.search(line)
+                if match:
+                    signature.frames.append(match.group(1))
+                    break
+    return signature
+
+class CrashIndex:
+    """
+    The index of the crash buckets, `CRASH_INDEX_FILE` in the directory of the crash settings.
+    Shared by the workers of a pool, every update is done under a file lock.
+    """
+    def __init__(self, dir_path: str, save_num: int = CRASH_BUCKET_SAVE_NUM):
+        """
+        `save_num`: The number of crashes of a bucket whose full artifacts are kept.
+        """
+        self.path = f"{dir_path}/{CRASH_INDEX_FILE}"
+        self.save_num = save_num
+
+    def read(self) -> dict:
+        """
+        Read the buckets, keyed by the bucket ID.
+        """
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r') as f:
+            try:
+                return json.load(f)
+            except json.JSONDecodeError:
+                return {}
+
+    def add(self, signature: CrashSignature, name: str) -> tuple[str, bool]:
+        """
+        Count a crash into its bucket.
+        Return the bucket ID, and whether the full artifacts of the crash should be kept.
+        A crash already counted under the same name (e.g., a testcase run again on `--resume`)
+        is not counted again, and its artifacts are saved again if they were.
+        """
+        bucket_id = signature.get_id()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            buckets = self.read()
+            bucket = buckets.setdefault(bucket_id, {
+                "signature": asdict(signature),
+                "count": 0,
+                "first_seen": get_current_time(),
+                "saved": [],
+            })
+            # Only the interrupted testcases are run again, the last crashes of the bucket are enough.
+            recent_names = bucket.setdefault("recent", [])
+            if name not in recent_names and name not in bucket["saved"]:
+                bucket["count"] += 1
+                bucket["recent"] = (recent_names + [name])[-CRASH_RECENT_NAME_NUM:]
+            bucket["last_seen"] = get_current_time()
+            bucket["last_name"] = name
+            save = name in bucket["saved"] or len(bucket["saved"]) < self.save_num
+            if save and name not in bucket["saved"]:
+                bucket["saved"].append(name)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(buckets, f, indent=2)
+            os.replace(temp_path, self.path)
+        return bucket_id, save
@@ -1,4 +1,5 @@
 from .const import USER_NAME
+from time import monotonic, sleep
 import os, re
 
 TESTCASE_DUMP_SINGLE = 'data/test_single'
@@ -6,6 +7,9 @@ TESTCASE_DUMP_BATCHED = 'data/test_batched'
 TESTCASE_DUMP_CRASHED = 'data/test_crashed'
 TESTCASE_DUMP_REPEATED = 'data/test_repeated'
 TESTCASE_DUMP_PLAYGROUND = 'data/test_playground'
+TESTCASE_DUMP_MULTI_SESSION = 'data/test_multi_session'
+TESTCASE_DUMP_REPLAY = 'data/test_replay'
+TESTCASE_DUMP_MINIMIZED = 'data/test_minimized'
 ANALYZED_DUMP = 'data/analyzed'
 
 def directory_exists(dir_path: str) -> bool:
@@ -61,6 +65,31 @@ def clear_file(path: str):
         file.write('')
     return
 
+def wait_for_file(path: str, newer_than: float = None, idle_window: float = 0.1, timeout: float = 2) -> bool:
+    """
+    Wait until the file is written completely, i.e., it exists and its size does not change for `idle_window` seconds.
+    `newer_than`: If set, the file must also be modified after this time (as `time.time()`), e.g., a periodic dump.
+    Return `False` if the file is not ready after `timeout` seconds.
+    """
+    deadline = monotonic() + timeout
+    stable_since = None
+    last_size = None
+    while True:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stat = None
+        now = monotonic()
+        if stat is None or (newer_than is not None and stat.st_mtime < newer_than):
+            stable_since, last_size = None, None
+        elif stat.st_size != last_size:
+            stable_since, last_size = now, stat.st_size
+        elif now - stable_since >= idle_window:
+            return True
+        if now >= deadline:
+            return False
+        sleep(min(idle_window / 2, max(deadline - now, 0)))
+
 def natural_key(s):
     return [int(text) if text.isdigit() else text.lower()
             for text in re.split(r'(\d+)', s)]
@@ -0,0 +1,255 @@
+"""
+This module provides the log tailer used to follow the logs of the BGP instances.
+
+The tailer keeps a byte offset in the log file, so only the newly appended bytes are read.
+Changes are waited with inotify (through `ctypes`), with a polling fallback where inotify is unavailable.
+The live log is never truncated: the log of a testcase is the byte range between two marks,
+copied in the kernel with `copy_file_range`/`sendfile`.
+"""
+
+import ctypes, ctypes.util, codecs, os, select
+from time import monotonic, sleep
+
+# The default time (in seconds) without log updates before the log is regarded as quiescent.
+LOG_IDLE_WINDOW = 0.1
+# The interval (in seconds) of checking the log when inotify is unavailable.
+LOG_POLL_INTERVAL = 0.05
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+def copy_file_range(src_path: str, dst_path: str, start: int, end: int):
+    """
+    Copy the bytes `[start, end)` of the source file into the destination file (overwritten).
+    The bytes are copied in the kernel with `copy_file_range`, falling back to `sendfile`,
+    and then to plain reads and writes.
+    """
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        offset = start
+        while offset < end:
+            try:
+                if hasattr(os, "copy_file_range"):
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), end - offset, offset)
+                else:
+                    copied = os.sendfile(dst.fileno(), src.fileno(), offset, end - offset)
+            except OSError:
+                # E.g., copying across file systems on old kernels.
+                src.seek(offset)
+                copied = dst.write(src.read(end - offset))
+            if copied == 0:
+                # The source is truncated.
+                break
+            offset += copied
+
+def get_libc():
+    """
+    Load the C library, return `None` if it does not provide inotify.
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+class LogTailer:
+    """
+    Follow a log file from a byte offset.
+
+    The directory of the log is watched instead of the file itself,
+    so the log may not exist yet, and may be deleted or recreated (e.g., by shell redirection).
+    A recreated or truncated log is read again from the beginning.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+        self.inode = None
+        self.offset = 0
+        # The inode and the offset of the log when `mark` is called.
+        self.mark_inode = None
+        self.mark_offset = 0
+        # The content read since the log was last cleared or marked.
+        self.chunks : list[str] = []
+        # The position (in characters) of the content up to which `new_lines` has yielded.
+        self.line_position = 0
+        # When new content was last read (as `monotonic()`), `None` if nothing has been read.
+        self.last_update_time : float = None
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.inotify_fd = None
+        libc = get_libc()
+        if libc is None:
+            return
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return
+        watch_mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        directory = os.path.dirname(os.path.abspath(path)).encode()
+        if libc.inotify_add_watch(fd, directory, watch_mask) < 0:
+            os.close(fd)
+            return
+        self.inotify_fd = fd
+
+    def reset(self):
+        """
+        Forget the content read so far, e.g., after the log is cleared.
+        """
+        self.close_file()
+        self.offset = 0
+        self.chunks = []
+        self.line_position = 0
+        self.decoder.reset()
+
+    def mark(self) -> int:
+        """
+        Mark the current end of the log, e.g., at the beginning of a testcase.
+        The content read so far is dropped, the log itself is untouched.
+        The existing content is skipped without being read, only the bytes appended after the mark are read.
+        Return the offset of the mark.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            # The log created later is read from the beginning.
+            stat = None
+            self.reset()
+        if stat is not None:
+            if stat.st_ino != self.inode or stat.st_size < self.offset:
+                self.reset()
+                self.file = open(self.path, 'rb')
+                self.inode = stat.st_ino
+            self.offset = stat.st_size
+            self.decoder.reset()
+        self.chunks = []
+        self.line_position = 0
+        self.mark_inode = self.inode
+        self.mark_offset = self.offset
+        return self.mark_offset
+
+    def dump_since_mark(self, dst_path: str):
+        """
+        Copy the log appended since the last mark into `dst_path`.
+        If the log has been recreated or truncated since the mark, the whole log is copied.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            open(dst_path, 'w').close()
+            return
+        start = self.mark_offset
+        if stat.st_ino != self.mark_inode or stat.st_size < start:
+            start = 0
+        copy_file_range(self.path, dst_path, start, stat.st_size)
+
+    def close_file(self):
+        """
+        Close the log file (if opened).
+        """
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+        self.inode = None
+
+    def update(self) -> str:
+        """
+        Read the bytes appended to the log since the last update.
+        Return the new content.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return ''
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            # The log is recreated or truncated.
+            self.reset()
+            self.file = open(self.path, 'rb')
+            self.inode = stat.st_ino
+        if stat.st_size == self.offset:
+            return ''
+        self.file.seek(self.offset)
+        data = self.file.read(stat.st_size - self.offset)
+        self.offset += len(data)
+        self.last_update_time = monotonic()
+        content = self.decoder.decode(data)
+        if content:
+            self.chunks.append(content)
+        return content
+
+    def new_lines(self):
+        """
+        Yield the complete lines appended to the log since the last call.
+        An incomplete last line is held back until it is completed.
+        """
+        content = self.read_all()
+        end = content.rfind('\n') + 1
+        if end <= self.line_position:
+            return
+        lines = content[self.line_position:end-1].split('\n')
+        self.line_position = end
+        yield from lines
+
+    def read_all(self) -> str:
+        """
+        Read all the content of the log.
+        Only the appended bytes are read from the file.
+        """
+        self.update()
+        if len(self.chunks) > 1:
+            self.chunks = [''.join(self.chunks)]
+        return self.chunks[0] if self.chunks else ''
+
+    def wait_for_event(self, timeout: float):
+        """
+        Wait until the log directory changes, or the timeout (in seconds) elapses.
+        """
+        if self.inotify_fd is None:
+            sleep(min(timeout, LOG_POLL_INTERVAL))
+            return
+        readable, _, _ = select.select([self.inotify_fd], [], [], timeout)
+        if readable:
+            # Drain the events, the new content is checked by `update` anyway.
+            try:
+                while os.read(self.inotify_fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def wait_for_idle(self, idle_window: float = LOG_IDLE_WINDOW, timeout: float = None) -> bool:
+        """
+        Wait until the log is not updated for `idle_window` seconds.
+        Return `False` if the log is still updating after `timeout` seconds.
+        """
+        start_time = monotonic()
+        last_update_time = start_time
+        self.update()
+        while True:
+            now = monotonic()
+            if now - last_update_time >= idle_window:
+                return True
+            if timeout is not None and now - start_time >= timeout:
+                return False
+            remaining = idle_window - (now - last_update_time)
+            if timeout is not None:
+                remaining = min(remaining, timeout - (now - start_time))
+            self.wait_for_event(remaining)
+            if self.update():
+                last_update_time = monotonic()
+
+    def close(self):
+        """
+        Close the log file and the inotify instance.
+        """
+        self.close_file()
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+
+    def __del__(self):
+        """
+        Destructor to ensure proper cleanup
+        """
+        self.close()
@@ -0,0 +1,87 @@
+"""
+This module provides the functions used to read the raw BGP messages from MRT (RFC 6396) files.
+Unlike the parsers in `data_analyzer`, the messages are kept as wire bytes.
+"""
+
+import socket, struct
+from dataclasses import dataclass
+
+MRT_HEADER_LEN = 12
+
+MRT_TYPE_BGP4MP = 16
+MRT_TYPE_BGP4MP_ET = 17
+
+BGP4MP_MESSAGE = 1
+BGP4MP_MESSAGE_AS4 = 4
+BGP4MP_MESSAGE_LOCAL = 6
+BGP4MP_MESSAGE_AS4_LOCAL = 7
+
+AFI_IPV4 = 1
+AFI_IPV6 = 2
+
+@dataclass
+class BGP4MPMessage:
+    """
+    A BGP message recorded in a BGP4MP MRT entry.
+    """
+    timestamp : float
+    peer_as : int
+    local_as : int
+    peer_ip : str
+    local_ip : str
+    message : bytes
+    # if the message is sent by the local (dumping) speaker instead of received from the peer
+    sent_by_local : bool = False
+
+def read_bgp4mp_messages(path: str) -> list[BGP4MPMessage]:
+    """
+    Read all the BGP4MP(_ET) message entries from the MRT file.
+    Other entries (e.g., state changes and RIB dumps) are skipped.
+    A truncated entry at the end of the file is ignored.
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    ret_list = []
+    offset = 0
+    while offset + MRT_HEADER_LEN <= len(content):
+        timestamp, mrt_type, subtype, length = struct.unpack("!IHHI", content[offset:offset+MRT_HEADER_LEN])
+        body = content[offset+MRT_HEADER_LEN:offset+MRT_HEADER_LEN+length]
+        offset += MRT_HEADER_LEN + length
+        if len(body) < length:
+            break
+        if mrt_type not in {MRT_TYPE_BGP4MP, MRT_TYPE_BGP4MP_ET}:
+            continue
+        if subtype not in {BGP4MP_MESSAGE, BGP4MP_MESSAGE_AS4, BGP4MP_MESSAGE_LOCAL, BGP4MP_MESSAGE_AS4_LOCAL}:
+            continue
+        timestamp = float(timestamp)
+        if mrt_type == MRT_TYPE_BGP4MP_ET:
+            # Extended timestamp: the microseconds field is counted in the length.
+            timestamp += struct.unpack("!I", body[:4])[0] / 1000000
+            body = body[4:]
+        if subtype in {BGP4MP_MESSAGE_AS4, BGP4MP_MESSAGE_AS4_LOCAL}:
+            peer_as, local_as = struct.unpack("!II", body[:8])
+            body = body[8:]
+        else:
+            peer_as, local_as = struct.unpack("!HH", body[:4])
+            body = body[4:]
+        # Skip the interface index.
+        afi = struct.unpack("!H", body[2:4])[0]
+        body = body[4:]
+        if afi == AFI_IPV4:
+            family, addr_len = socket.AF_INET, 4
+        elif afi == AFI_IPV6:
+            family, addr_len = socket.AF_INET6, 16
+        else:
+            continue
+        peer_ip = socket.inet_ntop(family, body[:addr_len])
+        local_ip = socket.inet_ntop(family, body[addr_len:2*addr_len])
+        ret_list.append(BGP4MPMessage(
+            timestamp=timestamp,
+            peer_as=peer_as,
+            local_as=local_as,
+            peer_ip=peer_ip,
+            local_ip=local_ip,
+            message=body[2*addr_len:],
+            sent_by_local=subtype in {BGP4MP_MESSAGE_LOCAL, BGP4MP_MESSAGE_AS4_LOCAL},
+        ))
+    return ret_list
@@ -0,0 +1,130 @@
+"""
+This module provides the cheap liveness checks of the daemon processes, used to detect software crashes.
+
+The daemons are found once by scanning `/proc`, then watched without spawning any subprocess:
+- Through pidfds (`os.pidfd_open`), which become readable as soon as the process exits.
+- Through `/proc/<pid>/stat` where pidfds are unavailable,
+  the start time of the process is compared so that a reused PID is not taken for the daemon.
+"""
+
+import os, re, select, threading
+from typing import Callable
+
+# The interval (in seconds) of checking `/proc/<pid>/stat` when pidfds are unavailable.
+PROCESS_POLL_INTERVAL = 0.05
+
+def get_process_start_time(pid: int) -> int:
+    """
+    Get the start time (in clock ticks since boot) of a running process.
+    Return `None` if the process does not exist or has exited (i.e., is a zombie).
+    """
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            stat = f.read()
+    except (FileNotFoundError, ProcessLookupError):
+        return None
+    # The command name may contain spaces and parentheses, the fields follow the last ')'.
+    fields = stat[stat.rfind(')')+2:].split()
+    if fields[0] in ('Z', 'X'):
+        return None
+    return int(fields[19])
+
+def find_pids(pattern: str) -> list[int]:
+    """
+    Find the processes whose command line (arguments joined by spaces) matches the regex pattern.
+    """
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit() or int(entry) == os.getpid():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", 'rb') as f:
+                cmdline = f.read().rstrip(b'\0').replace(b'\0', b' ').decode(errors="replace")
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+        if cmdline and re.search(pattern, cmdline):
+            pids.append(int(entry))
+    return pids
+
+class ProcessWatcher:
+    """
+    Watch a set of processes, e.g., the daemons of the routing software.
+
+    `exited` checks the processes without spawning any subprocess.
+    If `callback` is given, a background thread calls it with the PID as soon as one of the processes exits.
+    """
+    def __init__(self, pids: list[int], callback: Callable[[int], None] = None):
+        self.start_times = {pid: get_process_start_time(pid) for pid in pids}
+        self.pidfds : dict[int, int] = {}
+        for pid in pids:
+            try:
+                self.pidfds[pid] = os.pidfd_open(pid)
+            except (AttributeError, OSError):
+                # Unavailable before Linux 5.3 / Python 3.9, or the process has exited.
+                pass
+        self.exited_pid : int = None
+        self.callback = callback
+        self.stop_event = threading.Event()
+        self.stop_pipe = os.pipe()
+        self.thread : threading.Thread = None
+        if callback is not None:
+            self.thread = threading.Thread(target=self.watch_loop, daemon=True)
+            self.thread.start()
+
+    def check_process(self, pid: int) -> bool:
+        """
+        Check if the process is still alive.
+        """
+        pidfd = self.pidfds.get(pid)
+        if pidfd is not None:
+            readable, _, _ = select.select([pidfd], [], [], 0)
+            return not readable
+        start_time = self.start_times[pid]
+        return start_time is not None and get_process_start_time(pid) == start_time
+
+    def exited(self) -> bool:
+        """
+        Check if any of the processes has exited.
+        """
+        if self.exited_pid is not None:
+            return True
+        for pid in self.start_times:
+            if not self.check_process(pid):
+                self.exited_pid = pid
+                return True
+        return False
+
+    def watch_loop(self):
+        """
+        Wait until a process exits, then call the callback.
+        """
+        if len(self.pidfds) == len(self.start_times):
+            readable, _, _ = select.select(list(self.pidfds.values()) + [self.stop_pipe[0]], [], [])
+            if self.stop_pipe[0] in readable:
+                return
+        else:
+            while not self.exited():
+                if self.stop_event.wait(PROCESS_POLL_INTERVAL):
+                    return
+        if self.exited():
+            self.callback(self.exited_pid)
+
+    def stop(self):
+        """
+        Stop watching and release the pidfds.
+        """
+        if self.stop_event.is_set():
+            return
+        self.stop_event.set()
+        os.write(self.stop_pipe[1], b'\0')
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1)
+        for fd in list(self.pidfds.values()) + list(self.stop_pipe):
+            os.close(fd)
+        self.pidfds = {}
+
+    def __del__(self):
+        """
+        Destructor to ensure proper cleanup
+        """
+        self.stop()
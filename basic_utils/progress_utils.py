@@ -0,0 +1,97 @@
+"""
+This module provides the progress manifest of a batch run, used to resume an interrupted run.
+
+The manifest is an append-only JSONL file in the dump directory of the run.
+The first line describes the run, and every following line records a finished testcase.
+Each line is written with a single `O_APPEND` write and synced,
+so the manifest stays valid when the run dies (only the last line may be truncated),
+and several worker processes can append to it at the same time.
+"""
+
+import json, os, re
+from .file_utils import file_exists, list_subdirectories, natural_key
+
+PROGRESS_MANIFEST_FILE = "progress.jsonl"
+# The time suffix of the name of a run (see `get_current_time`).
+RUN_TIME_PATTERN = r"\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}"
+
+class ProgressManifest:
+    """
+    The progress manifest in the dump directory `dir_path`.
+    """
+    def __init__(self, dir_path: str):
+        self.path = f"{dir_path}/{PROGRESS_MANIFEST_FILE}"
+
+    def exists(self) -> bool:
+        """Check if the manifest exists."""
+        return file_exists(self.path)
+
+    def append(self, entry: dict):
+        """
+        Append an entry to the manifest.
+        """
+        line = (json.dumps(entry) + "\n").encode()
+        fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o666)
+        try:
+            size = os.fstat(fd).st_size
+            if size > 0 and os.pread(fd, 1, size - 1) != b"\n":
+                # Terminate the line truncated when the run died.
+                line = b"\n" + line
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def read(self) -> list[dict]:
+        """
+        Read all the entries of the manifest.
+        A truncated last line (written when the run died) is ignored.
+        """
+        if not self.exists():
+            return []
+        entries = []
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return entries
+
+    def start(self, test_batch_name: str, testcase_num: int):
+        """
+        Record the start of the run, or check that the resumed run is of the same batch.
+        """
+        header = [entry for entry in self.read() if "test_batch_name" in entry]
+        if header:
+            if header[0]["test_batch_name"] != test_batch_name or header[0]["testcase_num"] != testcase_num:
+                raise ValueError(f"The run in {self.path} is of batch {header[0]['test_batch_name']} "
+                                 f"({header[0]['testcase_num']} testcases), not {test_batch_name}!")
+            return
+        self.append({"test_batch_name": test_batch_name, "testcase_num": testcase_num})
+
+    def record(self, index: int, **info):
+        """
+        Record that the testcase at `index` (0-based) is finished.
+        """
+        self.append({"index": index, **info})
+
+    def get_finished_indices(self) -> set[int]:
+        """
+        Get the indices of the finished testcases.
+        """
+        return {entry["index"] for entry in self.read() if "index" in entry}
+
+def find_latest_run(dump_root_path: str, test_name: str) -> str:
+    """
+    Find the name of the latest run of `test_name` (i.e., `{test_name}_{time}`) under `dump_root_path`.
+    Other tests sharing the prefix (e.g., the shards `{test_name}_shard-0-of-4_{time}`) are not matched.
+    Return `None` if there is no such run.
+    """
+    run_pattern = re.compile(f"{re.escape(test_name)}_{RUN_TIME_PATTERN}")
+    runs = [name for name in list_subdirectories(dump_root_path)
+            if run_pattern.fullmatch(name)
+            and file_exists(f"{dump_root_path}/{name}/{PROGRESS_MANIFEST_FILE}")]
+    if not runs:
+        return None
+    return sorted(runs, key=natural_key)[-1]
@@ -0,0 +1,133 @@
+"""
+This module provides the selection of the testcases of a run (`--shard i/n`, `--range a:b`, `--ids`),
+so that several hosts, or several testbeds on one host, can split a campaign.
+
+The testcases are selected by their numbers, as they appear in the dump directories
+(`testcase_{number}`, see the run entry points for the first number).
+The range and the IDs are applied first, the remaining testcases are then dealt round-robin to the shards,
+so the shards get the testcases of all the parts of the batch.
+"""
+
+import argparse
+from dataclasses import dataclass
+
+@dataclass
+class TestcaseSelection:
+    """
+    The testcases selected for a run.
+    """
+    # The shard `(i, n)`: the i-th (from 0) of n shards.
+    shard : tuple[int, int] = None
+    # The numbers in `[start, stop)`, `None` for no bound.
+    start : int = None
+    stop : int = None
+    # The explicit numbers (a list is converted to a set).
+    ids : set[int] = None
+
+    def __post_init__(self):
+        if self.ids is not None:
+            self.ids = set(self.ids)
+        if self.shard is not None:
+            i, n = self.shard
+            if n <= 0 or not 0 <= i < n:
+                raise ValueError(f"Invalid shard {i}/{n}: must satisfy 0 <= i < n!")
+
+    def is_selected(self, number: int) -> bool:
+        """
+        Check if the testcase is selected by the range and the IDs (i.e., before sharding).
+        """
+        if self.start is not None and number < self.start:
+            return False
+        if self.stop is not None and number >= self.stop:
+            return False
+        return self.ids is None or number in self.ids
+
+    def get_numbers(self, testcase_num: int, first: int = 0) -> list[int]:
+        """
+        Get the numbers of the selected testcases, among the testcases numbered `first`, ..., `first+testcase_num-1`.
+        Only the numbers are computed, the testcases themselves are not loaded.
+        """
+        # With the IDs, only the IDs are checked, not every testcase of the batch.
+        candidates = range(first, first + testcase_num) if self.ids is None else \
+            sorted(number for number in self.ids if first <= number < first + testcase_num)
+        numbers = [number for number in candidates if self.is_selected(number)]
+        if self.shard is not None:
+            i, n = self.shard
+            numbers = numbers[i::n]
+        return numbers
+
+    def get_suffix(self) -> str:
+        """
+        Get the suffix distinguishing the runs of the shards (e.g., in the names of their dump directories).
+        """
+        if self.shard is None:
+            return ""
+        i, n = self.shard
+        return f"_shard-{i}-of-{n}"
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """
+    Parse `i/n`.
+    """
+    try:
+        i, n = value.split("/")
+        return int(i), int(n)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid shard {value}, expected i/n (e.g., 0/4).")
+
+def parse_range(value: str) -> tuple[int, int]:
+    """
+    Parse `a:b` (the stop is excluded), where both bounds are optional (e.g., `2:`).
+    """
+    try:
+        start, stop = value.split(":")
+        return (int(start) if start else None), (int(stop) if stop else None)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid range {value}, expected a:b (e.g., 100:200).")
+
+def parse_ids(value: str) -> list[int]:
+    """
+    Parse a comma-separated list of numbers and inclusive ranges (e.g., `3,7,10-12`).
+    """
+    ids = []
+    try:
+        for part in value.split(","):
+            if "-" in part:
+                first, last = part.split("-")
+                ids.extend(range(int(first), int(last) + 1))
+            elif part:
+                ids.append(int(part))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid IDs {value}, expected e.g. 3,7,10-12.")
+    return ids
+
+def add_selection_arguments(parser: argparse.ArgumentParser, default_range: str = None):
+    """
+    Add `--shard`, `--range` and `--ids` to the arg parser of a run entry point.
+    """
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        help="Run only the i-th (from 0) of n shards of the testcases, as i/n",
+    )
+    parser.add_argument(
+        "--range",
+        type=parse_range,
+        default=parse_range(default_range) if default_range is not None else None,
+        help="Run only the testcases numbered in [a, b), as a:b (either bound can be omitted)"
+             + (f" (default: {default_range})" if default_range is not None else ""),
+    )
+    parser.add_argument(
+        "--ids",
+        type=parse_ids,
+        default=None,
+        help="Run only the testcases with these numbers, as a comma-separated list (e.g., 3,7,10-12)",
+    )
+
+def get_selection(args: argparse.Namespace) -> TestcaseSelection:
+    """
+    Get the selection from the parsed arguments (see `add_selection_arguments`).
+    """
+    start, stop = args.range if args.range is not None else (None, None)
+    return TestcaseSelection(shard=args.shard, start=start, stop=stop, ids=args.ids)
@@ -2,7 +2,7 @@
 This module provides the serialization tool for the testcase
 """
 
-import pickle
+import pickle, os
 
 def save_variable_to_file(variable, filename, save_mode='ab'):
     """
@@ -25,3 +25,57 @@ def read_variables_from_file(filename):
             except EOFError:  # triggered when meet the end of the file
                 break
     return variables
+
+########## Indexed files ##########
+
+# The offsets of the variables in an indexed file are saved in `{filename}{INDEX_SUFFIX}`.
+INDEX_SUFFIX = ".idx"
+
+def save_variables_indexed(variables, filename):
+    """
+    Save the variables (e.g., the testcases of a batch) one by one, along with the index of their offsets,
+    so that any variable can be read without reading the others.
+    `variables` can be a generator, the variables are never all in memory.
+    """
+    offsets = []
+    with open(filename, 'wb') as file:
+        for variable in variables:
+            offsets.append(file.tell())
+            pickle.dump(variable, file)
+    with open(f"{filename}{INDEX_SUFFIX}", 'wb') as file:
+        pickle.dump(offsets, file)
+
+def index_variable_file(filename):
+    """
+    Convert a file holding a single list (the former format of the test batches) into an indexed file.
+    """
+    save_variables_indexed(read_variables_from_file(filename)[0], filename)
+
+class IndexedVariableFile:
+    """
+    Read the variables of an indexed file by their indices.
+    Only the offsets are kept in memory, each variable is read on access.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        # The content of a file without index, which has to be read entirely.
+        self.variable_list : list = None
+        if os.path.exists(f"{filename}{INDEX_SUFFIX}"):
+            with open(f"{filename}{INDEX_SUFFIX}", 'rb') as file:
+                self.offsets : list[int] = pickle.load(file)
+        else:
+            print(f"{filename} has no index and is read entirely, convert it with `index_variable_file`.")
+            self.variable_list = read_variables_from_file(filename)[0]
+
+    def __len__(self):
+        if self.variable_list is not None:
+            return len(self.variable_list)
+        return len(self.offsets)
+
+    def __getitem__(self, index: int):
+        if self.variable_list is not None:
+            return self.variable_list[index]
+        # The file is opened on every access, so the reader can be shared by forked processes.
+        with open(self.filename, 'rb') as file:
+            file.seek(self.offsets[index])
+            return pickle.load(file)
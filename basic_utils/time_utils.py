@@ -1,5 +1,6 @@
 from datetime import datetime
 from zoneinfo import ZoneInfo
+from time import monotonic, sleep
 
 def get_current_time() -> str:
     """
@@ -8,3 +9,15 @@ def get_current_time() -> str:
     tz_beijing = ZoneInfo("Asia/Shanghai")
     now = datetime.now(tz_beijing)
     return now.strftime("%Y-%m-%d_%H-%M-%S")
+
+def wait_until(condition, timeout: float, interval: float = 0.05) -> bool:
+    """
+    Wait until `condition()` holds, checking every `interval` seconds.
+    Return `False` if it still does not hold after `timeout` seconds.
+    """
+    deadline = monotonic() + timeout
+    while not condition():
+        if monotonic() >= deadline:
+            return False
+        sleep(min(interval, max(deadline - monotonic(), 0)))
+    return True
@@ -0,0 +1,126 @@
+"""
+This module provides the tracer recording where the time of the testcases goes.
+
+The spans are measured with the monotonic clock, and exported in the Chrome trace event format
+(complete events, `"ph": "X"`), loadable in `chrome://tracing` or Perfetto.
+The timestamps are anchored to the wall clock, so the traces of several processes (e.g., the workers)
+or several sessions (e.g., a resumed run) can be merged into one file.
+"""
+
+import json, os, threading
+from contextlib import contextmanager
+from time import monotonic, time
+
+def get_percentile(values: list[float], percentile: float) -> float:
+    """
+    Get the percentile (between 0 and 100) of the values, with linear interpolation.
+    """
+    values = sorted(values)
+    if not values:
+        return 0
+    position = (len(values) - 1) * percentile / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+class Tracer:
+    """
+    Record the spans of the phases of the testcases.
+
+    Spans are recorded either with `span` (a context manager),
+    or with `phase`, which ends the current phase and begins the next one (for a sequence of phases).
+    """
+    def __init__(self):
+        self.events : list[dict] = []
+        # The wall-clock time corresponding to the monotonic origin.
+        self.monotonic_origin = monotonic()
+        self.wall_origin = time()
+        # The current phase: its name, arguments and start time.
+        self.current_phase : tuple[str, dict, float] = None
+
+    def get_timestamp(self, monotonic_time: float) -> float:
+        """
+        Convert the monotonic time into the trace timestamp (in microseconds since the epoch).
+        """
+        return (self.wall_origin + monotonic_time - self.monotonic_origin) * 1e6
+
+    def add_span(self, name: str, start_time: float, end_time: float, category: str = "phase", **args):
+        """
+        Add a span between two monotonic times.
+        """
+        self.events.append({
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": self.get_timestamp(start_time),
+            "dur": (end_time - start_time) * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        })
+
+    @contextmanager
+    def span(self, name: str, category: str = "phase", **args):
+        """
+        Record the span of the code in the `with` block.
+        """
+        start_time = monotonic()
+        try:
+            yield
+        finally:
+            self.add_span(name, start_time, monotonic(), category, **args)
+
+    def phase(self, name: str, **args):
+        """
+        End the current phase (if any), and begin the phase `name`.
+        """
+        self.end_phase()
+        self.current_phase = (name, args, monotonic())
+
+    def end_phase(self):
+        """
+        End the current phase (if any).
+        """
+        if self.current_phase is None:
+            return
+        name, args, start_time = self.current_phase
+        self.current_phase = None
+        self.add_span(name, start_time, monotonic(), **args)
+
+    def get_durations(self, events: list[dict] = None) -> dict[str, list[float]]:
+        """
+        Get the durations (in seconds) of the spans, grouped by name.
+        """
+        durations : dict[str, list[float]] = {}
+        for event in self.events if events is None else events:
+            if event.get("ph") == "X":
+                durations.setdefault(event["name"], []).append(event["dur"] / 1e6)
+        return durations
+
+    def get_summary(self, events: list[dict] = None) -> str:
+        """
+        Get the table of the per-phase percentiles, the phase taking the most time first.
+        """
+        durations = self.get_durations(events)
+        lines = [f"{'phase':<24}{'count':>8}{'total(s)':>12}{'p50(ms)':>10}{'p90(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}"]
+        for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+            lines.append(f"{name:<24}{len(values):>8}{sum(values):>12.2f}"
+                         f"{get_percentile(values, 50)*1e3:>10.1f}{get_percentile(values, 90)*1e3:>10.1f}"
+                         f"{get_percentile(values, 99)*1e3:>10.1f}{max(values)*1e3:>10.1f}")
+        return "\n".join(lines)
+
+    def save(self, path: str, events: list[dict] = None) -> list[dict]:
+        """
+        Save the spans into the trace file, merged with the spans already in it (e.g., of a resumed run).
+        Return all the spans in the file.
+        """
+        events = list(self.events if events is None else events)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                try:
+                    events = json.load(f).get("traceEvents", []) + events
+                except json.JSONDecodeError:
+                    pass
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return events
@@ -0,0 +1,58 @@
+"""
+Functions used to process BGP messages on the wire (i.e., raw bytes),
+without building the BFN trees.
+"""
+
+from basic_utils.binary_utils import bytes2num
+from .message.msg_base import MessageType
+
+# Marker (16 octets) + Length (2 octets) + Type (1 octet)
+BGP_HEADER_LEN = 19
+# The maximum length of a BGP message (with extended message support).
+BGP_MAX_MESSAGE_LEN = 65535
+
+def get_message_length(header: bytes) -> int:
+    """
+    Get the length of the BGP message from its header.
+    """
+    return bytes2num(header[16:18])
+
+def get_message_type_val(message: bytes) -> int:
+    """
+    Get the type value of the BGP message.
+    """
+    return message[18]
+
+def is_message_type(message: bytes, message_type: MessageType) -> bool:
+    """
+    Check if the BGP message is of the given type.
+    """
+    return len(message) >= BGP_HEADER_LEN and get_message_type_val(message) == message_type.value
+
+def get_open_hold_time(message: bytes) -> int:
+    """
+    Get the hold time of a BGP OPEN message.
+    The hold time follows the version (1 octet) and the AS number (2 octets).
+    """
+    return bytes2num(message[BGP_HEADER_LEN+3:BGP_HEADER_LEN+5])
+
+def split_messages(stream: bytes) -> tuple[list[bytes], bytes]:
+    """
+    Split a byte stream into complete BGP messages.
+    Return the list of complete messages and the remaining (incomplete) bytes.
+
+    A length field smaller than the header length cannot be framed,
+    in this case the rest of the stream is returned as a single message.
+    """
+    messages = []
+    offset = 0
+    while len(stream) - offset >= BGP_HEADER_LEN:
+        length = get_message_length(stream[offset:offset+BGP_HEADER_LEN])
+        if length < BGP_HEADER_LEN:
+            messages.append(stream[offset:])
+            return messages, b''
+        if len(stream) - offset < length:
+            break
+        messages.append(stream[offset:offset+length])
+        offset += length
+    return messages, stream[offset:]
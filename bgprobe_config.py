@@ -6,6 +6,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from bgp_toolkit.bgp_toolkit_configuration import BGPToolkitConfiguration, parse_bgp_config_from_yaml
 from test_agents.exabgp_agent import generate_exabgp_config, ExaBGPAgentConfiguration
 from test_agents.tcp_agent import TCPAgentConfiguration
+from test_agents.bmp_agent import BMPAgentConfiguration
 from test_agents.router_agent import RouterAgentType
 from network_utils.utils import get_ipv4_prefix_parts
 
@@ -60,6 +61,9 @@ tcp_agent_config = TCPAgentConfiguration(host=router_agent_ip,
                                           netns=tester_agent_namespace)
 # Configure the ExaBGP agent
 exabgp_agent_config = ExaBGPAgentConfiguration(namespace=exabgp_agent_namespace)
+# Configure the BMP collector observing the routing software, `None` to disable it
+# (e.g., `BMPAgentConfiguration()` to collect on 127.0.0.1:11019).
+bmp_agent_config : BMPAgentConfiguration = None
 # Generate the configuration file for the ExaBGP agent
 generate_exabgp_config(peer_ip_addr=router_agent_ip,
                        peer_asn=router_agent_asn,
@@ -0,0 +1,55 @@
+"""
+This file defines the functions used to create sockets inside network namespaces,
+without switching the network namespace of the whole process.
+"""
+
+import os, socket, threading
+
+NETNS_RUN_DIR = "/var/run/netns"
+
+def netns_path(namespace: str) -> str:
+    """Get the path of the named network namespace."""
+    return f"{NETNS_RUN_DIR}/{namespace}"
+
+def run_in_netns(namespace: str, func, *args, **kwargs):
+    """
+    Run `func(*args, **kwargs)` inside the network namespace `namespace`, and return its result.
+
+    The function is executed in a short-lived helper thread.
+    `setns` only affects the calling thread, so the namespace of the rest of the process
+    (e.g., router control commands and file I/O) is left untouched.
+    Exceptions raised by `func` are re-raised in the caller.
+    If `namespace` is `None`, `func` is executed directly in the current thread.
+    """
+    if namespace is None:
+        return func(*args, **kwargs)
+
+    result = {}
+
+    def worker():
+        try:
+            with open(netns_path(namespace)) as netns_file:
+                os.setns(netns_file.fileno(), os.CLONE_NEWNET)
+            result["value"] = func(*args, **kwargs)
+        except BaseException as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=worker, name=f"netns-{namespace}")
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+def create_socket_in_netns(namespace: str = None,
+                           family: int = socket.AF_INET,
+                           sock_type: int = socket.SOCK_STREAM,
+                           proto: int = 0) -> socket.socket:
+    """
+    Create a socket inside the network namespace `namespace` and return it.
+
+    A socket stays attached to the network namespace it was created in,
+    so the returned socket can be bound, connected and used from any thread.
+    Sockets in several namespaces can thus be held by one process at the same time.
+    """
+    return run_in_netns(namespace, socket.socket, family, sock_type, proto)
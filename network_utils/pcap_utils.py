@@ -0,0 +1,207 @@
+"""
+This file defines the pcap recorder used to capture the traffic of a TCP connection from the harness side.
+
+The capture is written in the classic libpcap format with synthesized Ethernet/IPv4/TCP headers,
+so no packet capture privilege (e.g., tcpdump) is needed, and the file can be opened in Wireshark.
+"""
+
+import socket, struct, threading, time
+from dataclasses import dataclass
+
+PCAP_MAGIC = 0xa1b2c3d4
+PCAP_VERSION = (2, 4)
+PCAP_SNAPLEN = 262144
+PCAP_LINKTYPE_ETHERNET = 1
+
+ETHERTYPE_IPV4 = 0x0800
+IP_PROTO_TCP = 6
+ETHERNET_HEADER_LEN = 14
+IPV4_HEADER_LEN = 20
+TCP_HEADER_LEN = 20
+# The maximum TCP payload carried by a synthesized IPv4 packet.
+MAX_SEGMENT_PAYLOAD = 65535 - IPV4_HEADER_LEN - TCP_HEADER_LEN
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_PSH = 0x08
+TCP_ACK = 0x10
+
+def internet_checksum(data: bytes) -> int:
+    """
+    Calculate the internet checksum (RFC 1071) of the data.
+    """
+    if len(data) % 2 == 1:
+        data += b'\x00'
+    total = sum(struct.unpack(f"!{len(data)//2}H", data))
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    return ~total & 0xffff
+
+def mac_from_ip(ip_addr: str) -> bytes:
+    """
+    Synthesize a locally administered MAC address from the IPv4 address.
+    """
+    return b'\x02\x00' + socket.inet_aton(ip_addr)
+
+@dataclass
+class PcapPacket:
+    """
+    A TCP packet read from a pcap file.
+    """
+    timestamp : float
+    src : tuple
+    dst : tuple
+    flags : int
+    payload : bytes
+
+class PcapWriter:
+    """
+    Write the traffic of a single TCP connection into a pcap file.
+
+    `local` and `remote` are the (ip, port) tuples of the two endpoints.
+    The TCP sequence numbers of both directions are tracked,
+    so that Wireshark can reassemble the streams.
+    """
+    def __init__(self, path: str, local: tuple, remote: tuple):
+        self.path = path
+        self.local = local
+        self.remote = remote
+        # Next sequence number of each direction, indexed by `outgoing`.
+        self.next_seq = {True: 1000, False: 5000}
+        self.ip_id = 0
+        self.lock = threading.Lock()
+        self.file = open(path, "wb")
+        self.file.write(struct.pack("<IHHiIII",
+                                    PCAP_MAGIC,
+                                    PCAP_VERSION[0],
+                                    PCAP_VERSION[1],
+                                    0,
+                                    0,
+                                    PCAP_SNAPLEN,
+                                    PCAP_LINKTYPE_ETHERNET))
+        self.file.flush()
+
+    def build_packet(self, outgoing: bool, flags: int, payload: bytes = b'') -> bytes:
+        """
+        Build the Ethernet frame of a TCP segment.
+        """
+        src, dst = (self.local, self.remote) if outgoing else (self.remote, self.local)
+        src_ip, dst_ip = socket.inet_aton(src[0]), socket.inet_aton(dst[0])
+        seq = self.next_seq[outgoing]
+        ack = self.next_seq[not outgoing] if flags & TCP_ACK else 0
+
+        tcp_header = struct.pack("!HHIIBBHHH",
+                                 src[1], dst[1],
+                                 seq & 0xffffffff, ack & 0xffffffff,
+                                 (TCP_HEADER_LEN // 4) << 4, flags,
+                                 65535, 0, 0)
+        pseudo_header = struct.pack("!4s4sBBH", src_ip, dst_ip, 0, IP_PROTO_TCP,
+                                    TCP_HEADER_LEN + len(payload))
+        tcp_checksum = internet_checksum(pseudo_header + tcp_header + payload)
+        tcp_header = tcp_header[:16] + struct.pack("!H", tcp_checksum) + tcp_header[18:]
+
+        self.ip_id = (self.ip_id + 1) & 0xffff
+        ip_header = struct.pack("!BBHHHBBH4s4s",
+                                0x45, 0,
+                                IPV4_HEADER_LEN + TCP_HEADER_LEN + len(payload),
+                                self.ip_id, 0x4000,
+                                64, IP_PROTO_TCP, 0,
+                                src_ip, dst_ip)
+        ip_header = ip_header[:10] + struct.pack("!H", internet_checksum(ip_header)) + ip_header[12:]
+
+        ethernet_header = mac_from_ip(dst[0]) + mac_from_ip(src[0]) + struct.pack("!H", ETHERTYPE_IPV4)
+
+        # SYN and FIN consume one sequence number.
+        self.next_seq[outgoing] = seq + len(payload) + (1 if flags & (TCP_SYN | TCP_FIN) else 0)
+        return ethernet_header + ip_header + tcp_header + payload
+
+    def write_packet(self, packet: bytes, timestamp: float = None):
+        """
+        Write a packet record into the pcap file.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        seconds = int(timestamp)
+        microseconds = int((timestamp - seconds) * 1000000)
+        self.file.write(struct.pack("<IIII", seconds, microseconds, len(packet), len(packet)))
+        self.file.write(packet)
+
+    def record_handshake(self, timestamp: float = None):
+        """
+        Record the three-way handshake of the connection.
+        """
+        with self.lock:
+            self.write_packet(self.build_packet(True, TCP_SYN), timestamp)
+            self.write_packet(self.build_packet(False, TCP_SYN | TCP_ACK), timestamp)
+            self.write_packet(self.build_packet(True, TCP_ACK), timestamp)
+            self.file.flush()
+
+    def record(self, data: bytes, outgoing: bool, timestamp: float = None):
+        """
+        Record the data sent (`outgoing=True`) or received (`outgoing=False`) by the local endpoint.
+        """
+        with self.lock:
+            for offset in range(0, len(data), MAX_SEGMENT_PAYLOAD):
+                payload = data[offset:offset+MAX_SEGMENT_PAYLOAD]
+                self.write_packet(self.build_packet(outgoing, TCP_PSH | TCP_ACK, payload), timestamp)
+            self.file.flush()
+
+    def record_close(self, outgoing: bool = True, timestamp: float = None):
+        """
+        Record the closing of the connection, initiated by the local endpoint if `outgoing=True`.
+        """
+        with self.lock:
+            self.write_packet(self.build_packet(outgoing, TCP_FIN | TCP_ACK), timestamp)
+            self.file.flush()
+
+    def close(self):
+        """
+        Close the pcap file.
+        """
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+def read_pcap(path: str) -> list[PcapPacket]:
+    """
+    Read the TCP packets from a classic pcap file with Ethernet link type.
+    Packets which are not TCP over IPv4 are skipped.
+    """
+    packets = []
+    with open(path, "rb") as f:
+        content = f.read()
+    if content[:4] == struct.pack("<I", PCAP_MAGIC):
+        endian = "<"
+    elif content[:4] == struct.pack(">I", PCAP_MAGIC):
+        endian = ">"
+    else:
+        raise ValueError(f"{path} is not a classic pcap file (magic {content[:4].hex()})!")
+    linktype = struct.unpack(f"{endian}I", content[20:24])[0]
+    if linktype != PCAP_LINKTYPE_ETHERNET:
+        raise ValueError(f"Unsupported pcap link type {linktype}!")
+
+    offset = 24
+    while offset + 16 <= len(content):
+        seconds, microseconds, incl_len, _ = struct.unpack(f"{endian}IIII", content[offset:offset+16])
+        frame = content[offset+16:offset+16+incl_len]
+        offset += 16 + incl_len
+        if len(frame) < ETHERNET_HEADER_LEN + IPV4_HEADER_LEN:
+            continue
+        if struct.unpack("!H", frame[12:14])[0] != ETHERTYPE_IPV4:
+            continue
+        ip_packet = frame[ETHERNET_HEADER_LEN:]
+        ihl = (ip_packet[0] & 0x0f) * 4
+        total_len = struct.unpack("!H", ip_packet[2:4])[0]
+        if ip_packet[9] != IP_PROTO_TCP:
+            continue
+        tcp_segment = ip_packet[ihl:total_len]
+        src_port, dst_port = struct.unpack("!HH", tcp_segment[:4])
+        data_offset = (tcp_segment[12] >> 4) * 4
+        packets.append(PcapPacket(
+            timestamp=seconds + microseconds / 1000000,
+            src=(socket.inet_ntoa(ip_packet[12:16]), src_port),
+            dst=(socket.inet_ntoa(ip_packet[16:20]), dst_port),
+            flags=tcp_segment[13],
+            payload=tcp_segment[data_offset:],
+        ))
+    return packets
@@ -1,6 +1,10 @@
-import socket, os
+import socket, threading
 from dataclasses import dataclass
-from pyroute2 import netns
+from .netns_utils import create_socket_in_netns
+from .pcap_utils import PcapWriter
+
+# The maximum number of buffers passed to a single `sendmsg` call (IOV_MAX on Linux).
+SENDMSG_MAX_BUFFERS = 1024
 
 @dataclass
 class TCPClientConfiguration:
@@ -26,7 +30,12 @@ class TCPClient:
         self.configuration = configuration
         self.socket = None
         self.connected = False
-        self.original_fd = None
+        # The pcap recorder of the connection, set by `start_recording`.
+        self.recorder : PcapWriter = None
+        # The background thread receiving data from the server, set by `start_receiving`.
+        self.receiver : threading.Thread = None
+        # Serialize the writes of different threads, so that their messages are not interleaved.
+        self.send_lock = threading.Lock()
 
     def start(self):
         """
@@ -34,16 +43,13 @@ class TCPClient:
         You can choose the ip address and port to bind to via `bind_val`
         if `bind_val` is by default set to `None`, binding will not be performed
         and the system will assign a random IP and port for the socket.
+        If `netns` is specified, the socket is created inside that network namespace,
+        while the namespace of the process is left untouched.
         """
         try:
-            # Switch to network namespace if specified
-            if self.configuration.netns:
-                self.original_fd = os.open("/proc/self/ns/net", os.O_RDONLY)
-                netns_fd = open(f"/var/run/netns/{self.configuration.netns}")
-                os.setns(netns_fd.fileno(), 0)
-                netns_fd.close()
-
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket = create_socket_in_netns(self.configuration.netns,
+                                                 socket.AF_INET,
+                                                 socket.SOCK_STREAM)
             if self.configuration.bind_val is not None:
                 self.socket.bind(self.configuration.bind_val)
             self.socket.connect((self.configuration.host, self.configuration.port))
@@ -63,13 +69,60 @@ class TCPClient:
             print("Not connected to server")
             return False
         try:
-            self.socket.sendall(message)
+            with self.send_lock:
+                self.socket.sendall(message)
+                self.on_send(message)
+            return True
+        except Exception as e:
+            print(f"Send failed: {e}")
+            self.connected = False
+            return False
+
+    def send_coalesced(self, messages: list[bytes]):
+        """
+        Send the messages back-to-back with scatter-gather writes (`sendmsg`),
+        so that the kernel can coalesce them into as few segments as possible.
+        Partially sent buffers are resumed until all the messages are sent.
+        """
+        if not self.connected:
+            print("Not connected to server")
+            return False
+        buffers = [memoryview(message) for message in messages if len(message) > 0]
+        try:
+            with self.send_lock:
+                while buffers:
+                    sent = self.socket.sendmsg(buffers[:SENDMSG_MAX_BUFFERS])
+                    # Drop the buffers (or their parts) that have been sent.
+                    while sent > 0:
+                        if sent >= len(buffers[0]):
+                            sent -= len(buffers[0])
+                            buffers.pop(0)
+                        else:
+                            buffers[0] = buffers[0][sent:]
+                            sent = 0
+                self.on_send(b''.join(messages))
             return True
         except Exception as e:
             print(f"Send failed: {e}")
             self.connected = False
             return False
 
+    def set_nodelay(self, nodelay: bool):
+        """
+        Set the TCP_NODELAY option of the socket (disable Nagle's algorithm if `True`).
+        """
+        if self.socket:
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(nodelay))
+
+    def set_cork(self, cork: bool):
+        """
+        Set the TCP_CORK option of the socket.
+        Partial segments are held until the cork is removed,
+        removing the cork flushes the pending data.
+        """
+        if self.socket:
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, int(cork))
+
     def receive(self, buffer_size=1024):
         """
         Receive data from the server
@@ -82,6 +135,7 @@ class TCPClient:
             if not data:
                 self.connected = False
                 return None
+            self.record(data, outgoing=False)
             # return without decoding. 
             return data
         except Exception as e:
@@ -89,6 +143,59 @@ class TCPClient:
             self.connected = False
             return None
 
+    def start_recording(self, path: str):
+        """
+        Record every byte sent and received on the connection into the pcap file `path`.
+        Must be called after the connection is set up.
+        """
+        if not self.connected:
+            print("Not connected to server")
+            return False
+        self.recorder = PcapWriter(path,
+                                   local=self.socket.getsockname(),
+                                   remote=self.socket.getpeername())
+        self.recorder.record_handshake()
+        return True
+
+    def record(self, data: bytes, outgoing: bool):
+        """
+        Record the data into the pcap file if the recording is on.
+        """
+        if self.recorder is not None and len(data) > 0:
+            self.recorder.record(data, outgoing)
+
+    def start_receiving(self, buffer_size=65536):
+        """
+        Keep receiving data from the server in a background thread,
+        so that the data sent by the server is drained (and recorded).
+        The thread stops when the connection is closed.
+        """
+        def receive_loop():
+            while self.connected:
+                try:
+                    data = self.socket.recv(buffer_size)
+                except OSError:
+                    break
+                if not data:
+                    self.connected = False
+                    break
+                self.on_receive(data)
+
+        self.receiver = threading.Thread(target=receive_loop, daemon=True)
+        self.receiver.start()
+
+    def on_send(self, data: bytes):
+        """
+        Called with the data after it is sent.
+        """
+        self.record(data, outgoing=True)
+
+    def on_receive(self, data: bytes):
+        """
+        Called by the background receiving thread with the data received.
+        """
+        self.record(data, outgoing=False)
+
     def send_receive(self, message, buffer_size=1024):
         """
         Send a message and wait for response
@@ -102,16 +209,24 @@ class TCPClient:
         Close the connection
         """
         if self.socket:
+            try:
+                # Wake up the receiving thread blocked in `recv`.
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except:
+                pass
             try:
                 self.socket.close()
-                if self.original_fd is not None:
-                    os.setns(self.original_fd, 0)
-                    os.close(self.original_fd)
-                    self.original_fd = None
             except:
                 pass
         self.connected = False
         self.socket = None
+        if self.receiver is not None:
+            self.receiver.join(timeout=1)
+            self.receiver = None
+        if self.recorder is not None:
+            self.recorder.record_close()
+            self.recorder.close()
+            self.recorder = None
         # print("Connection closed")
 
     def __del__(self):
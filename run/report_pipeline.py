@@ -0,0 +1,82 @@
+# This file defines the report pipeline, analyzing the testcases while the batch is running.
+
+# The harness mostly sleeps while a testcase is executed,
+# so the report of testcase i (see `DataAnalyzer.generate_testcase_report`) is generated
+# in a process pool while testcase i+1 is executed.
+# The finished reports are streamed into the JSONL in the order of the testcases,
+# so the JSONL is always a prefix of the result of `DataAnalyzer.dump_batched_report`.
+
+import json, multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from basic_utils.file_utils import create_dir, ANALYZED_DUMP
+from basic_utils.const import REPO_ROOT_PATH
+
+# The default number of the processes generating the reports.
+REPORT_WORKER_NUM = 2
+
+def generate_report(path: str, testcase_id: str) -> dict:
+    """
+    Generate the report of a testcase in the worker process.
+    Return `None` if the report cannot be generated (e.g., the logs of a crashed testcase are missing).
+    """
+    # Imported here since `data_analyzer` imports the testbed.
+    from data_analyzer.data_analyzer import DataAnalyzer
+    try:
+        return DataAnalyzer.generate_testcase_report(path, testcase_id)
+    except Exception as e:
+        print(f"Failed to generate the report of {testcase_id}: {e}")
+        return None
+
+class ReportPipeline:
+    """
+    Generate the reports of the testcases in a process pool, and stream them into `{batch_name}.jsonl`.
+    """
+    def __init__(self, batch_name: str, worker_num: int = REPORT_WORKER_NUM, dump_path: str = None):
+        """
+        `batch_name`: The name of the dump directory of the batch, the reports are named after it.
+        `dump_path`: The directory of the JSONL, `ANALYZED_DUMP` by default.
+        """
+        self.batch_name = batch_name
+        if dump_path is None:
+            dump_path = f"{REPO_ROOT_PATH}/{ANALYZED_DUMP}"
+        create_dir(dump_path)
+        self.report_path = f"{dump_path}/{batch_name}.jsonl"
+        # The workers are spawned, since the harness runs threads (e.g., the KEEPALIVE manager).
+        self.executor = ProcessPoolExecutor(max_workers=worker_num,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        # The submitted reports not written yet, in the order of the testcases.
+        self.pending : deque[Future] = deque()
+        self.report_num = 0
+
+    def submit(self, testcase_dump_dir_path: str):
+        """
+        Submit the report generation of a finished testcase.
+        The reports finished so far are written.
+        """
+        # The same ID as `DataAnalyzer.generate_batched_report`.
+        testcase_id = f"{self.batch_name}_{testcase_dump_dir_path.rstrip('/').split('/')[-1]}"
+        self.pending.append(self.executor.submit(generate_report, testcase_dump_dir_path, testcase_id))
+        self.flush()
+
+    def flush(self, wait: bool = False):
+        """
+        Write the finished reports in order, stopping at the first unfinished one.
+        If `wait` is set, wait for all the submitted reports.
+        """
+        with open(self.report_path, "a") as f:
+            while self.pending and (wait or self.pending[0].done()):
+                report = self.pending.popleft().result()
+                if report is None:
+                    continue
+                f.write(json.dumps(report) + "\n")
+                f.flush()
+                self.report_num += 1
+
+    def close(self):
+        """
+        Wait for all the reports and shut down the process pool.
+        """
+        self.flush(wait=True)
+        self.executor.shutdown()
+        print(f"{self.report_num} reports written to {self.report_path}")
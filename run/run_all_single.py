@@ -6,6 +6,7 @@ import sys, os, argparse
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from basic_utils.binary_utils import make_bytes_displayable
+from basic_utils.selection_utils import TestcaseSelection, add_selection_arguments, get_selection
 
 from test_agents.router_agent import *
 
@@ -14,9 +15,10 @@ from testcase_factory.single_testcase_factory import single_testcase_suite
 
 from testbed import *
 
-def main(test_name: str = None):
+def main(test_name: str = None, selection: TestcaseSelection = None):
     """
     The main function of running single testcases.
+    `selection`: The testcases to run, numbered by their indices in `single_testcase_suite`.
     """
 
     ########## Configure the Router Software ##########
@@ -45,15 +47,17 @@ def main(test_name: str = None):
         tcp_agent_config = tcp_agent_config,
         router_agent_config = router_agent_config,
         exabgp_agent_config = exabgp_agent_config,
+        bmp_agent_config = bmp_agent_config,
     )
 
     ########## Run all single testcases ##########
 
     if test_name is None:
-        test_name = "all_single_testcases"
+        test_name = "all_single_testcases" + (selection.get_suffix() if selection is not None else "")
 
     testbed.run_test_single_all(
         test_name = test_name,
+        selection = selection,
     )
 
 if __name__ == "__main__":
@@ -65,6 +69,9 @@ if __name__ == "__main__":
         default=None,
         help="Optional name for the test",
     )
+    # The testcases are numbered by their indices in the suite, the first two are skipped by default.
+    add_selection_arguments(parser, default_range="2:")
     args = parser.parse_args()
     # Run the main function. 
-    main(test_name=args.test_name)
+    main(test_name=args.test_name,
+         selection=get_selection(args))
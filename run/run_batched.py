@@ -8,6 +8,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from basic_utils.binary_utils import make_bytes_displayable
 from basic_utils.file_utils import *
 from basic_utils.log_parse_utils import *
+from basic_utils.selection_utils import TestcaseSelection, add_selection_arguments, get_selection
 
 from test_agents.router_agent import *
 
@@ -15,6 +16,7 @@ from bgprobe_config import *
 from testcase_factory.batched_testcase_factory import *
 
 from testbed import *
+from testbed_pool import TestbedPool
 
 TESTCASE_ID = "id"
 CRASHED_KEY = "crashed"
@@ -23,11 +25,43 @@ ROUTE_DUMP_KEY = "route_dump"
 PROPAGATED_KEY = "propagated"
 PROPAGATE_INVALID_KEY = "propagate_invalid"
 
-def main(test_batch_name: str, test_name: str = None):
+def main(test_batch_name: str, test_name: str = None, session_reuse: bool = False, worker_num: int = 1, resume: str = None, analyze: bool = False, selection: TestcaseSelection = None):
     """
     The main function of running batched testcases.
+    `resume`: The run to resume, `""` for the latest run of the test.
+    `analyze`: Whether to generate the reports of the testcases while the batch is running.
+    `selection`: The testcases to run (e.g., a shard of the batch).
     """
 
+    if selection is None:
+        selection = TestcaseSelection()
+    if test_name is None:
+        # The shards run on several hosts or testbeds are dumped separately.
+        test_name = test_batch_name + selection.get_suffix()
+
+    ########## Run on the worker pool ##########
+
+    if worker_num != 1:
+        if TestbedPool.is_supported(router_type):
+            testbed_pool = TestbedPool(
+                vnet_config = VNET_CONFIG,
+                router_type = router_type,
+                router_agent_asn = router_agent_asn,
+                tester_agent_asn = tester_agent_asn,
+                exabgp_agent_asn = exabgp_agent_asn,
+                worker_num = None if worker_num == 0 else worker_num,
+                session_reuse = session_reuse,
+            )
+            testbed_pool.run_test_batch(
+                test_batch_name = test_batch_name,
+                test_name = test_name,
+                resume = resume,
+                analyze = analyze,
+                selection = selection,
+            )
+            return
+        print(f"{router_type.name} cannot run multiple instances, running on a single testbed.")
+
     ########## Configure the Router Software ##########
 
     router_agent_config = RouterAgentConfiguration(
@@ -54,16 +88,18 @@ def main(test_batch_name: str, test_name: str = None):
         tcp_agent_config = tcp_agent_config,
         router_agent_config = router_agent_config,
         exabgp_agent_config = exabgp_agent_config,
+        bmp_agent_config = bmp_agent_config,
+        session_reuse = session_reuse,
     )
 
     ########## Run test batch ##########
 
-    if test_name is None:
-        test_name = test_batch_name
-
     testbed.run_test_batch(
         test_batch_name = test_batch_name,
         test_name = test_name,
+        resume = resume,
+        analyze = analyze,
+        selection = selection,
     )
 
 if __name__ == "__main__":
@@ -80,9 +116,40 @@ if __name__ == "__main__":
         default=None,
         help="Optional name for the test",
     )
+    parser.add_argument(
+        "--reuse",
+        action="store_true",
+        help="Keep the routing software running between testcases, restart only on crashes or dirty RIBs",
+    )
+    parser.add_argument(
+        "--workers", "-w",
+        type=int,
+        default=1,
+        help="Number of parallel testbeds, 0 to size by the available cores",
+    )
+    parser.add_argument(
+        "--resume",
+        nargs="?",
+        const="",
+        default=None,
+        help="Resume an interrupted run (the name of its dump directory, default: the latest run of the test)",
+    )
+    parser.add_argument(
+        "--analyze",
+        action="store_true",
+        help="Generate the testcase reports while the batch is running",
+    )
+    # The testcases are numbered from 1, as in the dump directory.
+    add_selection_arguments(parser)
     args = parser.parse_args()
     # Run the main function. 
-    main(test_batch_name=args.name, test_name=args.test_name)
+    main(test_batch_name=args.name,
+         test_name=args.test_name,
+         session_reuse=args.reuse,
+         worker_num=args.workers,
+         resume=args.resume,
+         analyze=args.analyze,
+         selection=get_selection(args))
 
 
 #################### Deprecated ####################
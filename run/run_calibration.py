@@ -0,0 +1,142 @@
+# This file is used to calibrate the timing profile of the BGP routing software.
+# A simple testcase is run repeatedly with generous timeouts,
+# the time each condition-based wait of the testbed actually takes is measured,
+# and the profile (the measured worst case with a margin) is written into `TIMING_PROFILE_PATH`.
+
+import sys, os, argparse
+from copy import deepcopy
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test_agents.router_agent import *
+from test_agents.router_agent.timing_profile import TimingProfile, DEFAULT_TIMING_PROFILES, save_timing_profile, TIMING_PROFILE_PATH
+from bgp_toolkit.message import UpdateMessage_BFN, UpdateMessage
+
+from bgprobe_config import *
+from testcase_factory.basic_types import Halt, TestCase
+from testcase_factory.single_testcase_factory import vanilla_open_message, vanilla_keepalive_message
+
+from testbed import *
+
+# The generous timeouts used while calibrating.
+CALIBRATION_PROFILE = TimingProfile(halt_timeout=10,
+                                    propagation_window=3,
+                                    propagation_timeout=10,
+                                    rib_dump_timeout=10,
+                                    restart_timeout=30)
+# The lower bound of the calibrated timeouts.
+MIN_TIMEOUT = 0.5
+CALIBRATION_PREFIX = "59.66.130.0/24"
+
+def get_calibration_testcase() -> TestCase:
+    """
+    Announce a prefix, halt, and withdraw it, so that both propagations are measured.
+    """
+    announce_message = UpdateMessage(UpdateMessage_BFN.get_bfn(
+        withdrawn_routes=[],
+        aspath=[tester_agent_asn],
+        next_hop=tester_agent_ip,
+        nlri=[CALIBRATION_PREFIX]
+    ))
+    withdraw_message = UpdateMessage(UpdateMessage_BFN.get_bfn(
+        withdrawn_routes=[CALIBRATION_PREFIX],
+        aspath=[tester_agent_asn],
+        next_hop=tester_agent_ip,
+        nlri=[]
+    ))
+    return TestCase([deepcopy(vanilla_open_message),
+                     deepcopy(vanilla_keepalive_message),
+                     announce_message,
+                     Halt(),
+                     withdraw_message])
+
+def get_calibrated_profile(timing_records: dict[str, list[float]], margin: float) -> TimingProfile:
+    """
+    Derive the timing profile from the measured waits, using the worst case with a margin.
+    The waits not measured (e.g., the RIB dump of FRR, which is waited for inside the agent) keep their defaults.
+    """
+    profile = DEFAULT_TIMING_PROFILES.get(router_type, TimingProfile())
+    def calibrated(name: str, default: float, offset: float = 0) -> float:
+        if not timing_records.get(name):
+            return default
+        return max(max(timing_records[name]) * margin + offset, MIN_TIMEOUT)
+    propagation_window = calibrated("propagation", profile.propagation_window, profile.log_idle_window)
+    return TimingProfile(
+        log_idle_window=profile.log_idle_window,
+        halt_timeout=calibrated("halt", profile.halt_timeout),
+        propagation_window=propagation_window,
+        propagation_timeout=propagation_window * 2,
+        rib_dump_timeout=calibrated("rib_dump", profile.rib_dump_timeout),
+        restart_timeout=calibrated("restart", profile.restart_timeout),
+    )
+
+def main(rounds: int, margin: float):
+    """
+    The main function of calibrating the timing profile.
+    """
+
+    ########## Configure the Router Software ##########
+
+    router_agent_config = RouterAgentConfiguration(
+        asn=router_agent_asn,
+        router_id=router_agent_ip,
+        neighbors=[
+            Neighbor(
+                peer_ip=tester_agent_ip,
+                peer_asn=tester_agent_asn,
+                local_source=router_agent["veth"]
+            ),
+            Neighbor(
+                peer_ip=exabgp_agent_ip,
+                peer_asn=exabgp_agent_asn,
+                local_source=router_agent["veth"]
+            ),
+        ],
+        router_type=router_type
+    )
+
+    ########## Initialize the Testbed ##########
+
+    testbed = Testbed(
+        tcp_agent_config = tcp_agent_config,
+        router_agent_config = router_agent_config,
+        exabgp_agent_config = exabgp_agent_config,
+    )
+    testbed.timing_profile = CALIBRATION_PROFILE
+    testbed.router_agent.timing_profile = CALIBRATION_PROFILE
+
+    ########## Measure the waits ##########
+
+    testbed.run_test_repeated(
+        test_name=f"calibration_{router_type.name}",
+        testcase=get_calibration_testcase(),
+        repeated_num=rounds,
+    )
+
+    ########## Write the profile ##########
+
+    for name, elapsed_times in testbed.timing_records.items():
+        print(f"{name}: max {max(elapsed_times):.3f}s, mean {sum(elapsed_times)/len(elapsed_times):.3f}s "
+              f"over {len(elapsed_times)} waits")
+    profile = get_calibrated_profile(testbed.timing_records, margin)
+    save_timing_profile(router_type, profile)
+    print(f"Timing profile of {router_type.name} written to {TIMING_PROFILE_PATH}: {profile}")
+
+if __name__ == "__main__":
+    # Create the arg parser.
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--rounds", "-r",
+        type=int,
+        default=5,
+        help="Number of times the calibration testcase is run",
+    )
+    parser.add_argument(
+        "--margin",
+        type=float,
+        default=1.5,
+        help="Factor applied to the worst measured latency",
+    )
+    args = parser.parse_args()
+    # Run the main function.
+    main(rounds=args.rounds, margin=args.margin)
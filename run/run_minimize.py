@@ -0,0 +1,131 @@
+# This file is used to minimize a crashing testcase saved in `TESTCASE_DUMP_CRASHED`.
+# The testcase is shrunk by delta debugging (see `testcase_minimizer.py`):
+# every candidate is re-executed, on a worker pool if the routing software supports multiple instances.
+# The smallest testcase still crashing the routing software is saved next to the original one,
+# along with its wire bytes.
+
+import sys, os, argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from basic_utils.binary_utils import bytes2hexstr
+from basic_utils.file_utils import *
+from basic_utils.serialize_utils import save_variable_to_file, read_variables_from_file
+
+from test_agents.router_agent import *
+
+from bgprobe_config import *
+from testcase_factory.basic_types import TestCase
+from testcase_factory.testcase_minimizer import TestCaseMinimizer, get_wire_bytes
+
+from testbed import *
+from testbed_pool import TestbedPool
+
+MINIMIZED_PKL_FILE = "minimized.pkl"
+MINIMIZED_TXT_FILE = "minimized.txt"
+# The wire bytes of the messages, concatenated.
+MINIMIZED_BIN_FILE = "minimized.bin"
+
+def main(crash_name: str, worker_num: int = 1, max_rounds: int = 5):
+    """
+    The main function of minimizing a crashing testcase.
+    `crash_name`: The name of the crash setting in `TESTCASE_DUMP_CRASHED` (i.e., the `testcase_id`).
+    """
+
+    ########## Read the crash setting ##########
+
+    crash_path = f"{REPO_ROOT_PATH}/{TESTCASE_DUMP_CRASHED}/{crash_name}"
+    router_agent_config : RouterAgentConfiguration = read_variables_from_file(f"{crash_path}/{ROUTER_CONFIG_PKL_FILE}")[0]
+    testcase : TestCase = read_variables_from_file(f"{crash_path}/{TESTCASE_PKL_FILE}")[0]
+    dump_dir_path = f"{REPO_ROOT_PATH}/{TESTCASE_DUMP_MINIMIZED}/{crash_name}_{get_current_time()}"
+    create_dir(dump_dir_path)
+    allow_user_access(dump_dir_path)
+
+    ########## Define the oracle ##########
+
+    # The candidates are dumped into one directory per batch.
+    batch_num = 0
+
+    if worker_num != 1 and TestbedPool.is_supported(router_agent_config.router_type):
+        testbed_pool = TestbedPool(
+            vnet_config = VNET_CONFIG,
+            router_type = router_agent_config.router_type,
+            router_agent_asn = router_agent_asn,
+            tester_agent_asn = tester_agent_asn,
+            exabgp_agent_asn = exabgp_agent_asn,
+            worker_num = None if worker_num == 0 else worker_num,
+        )
+        testbed_pool.save_crashes = False
+
+        def oracle(candidates: list[TestCase]) -> list[bool]:
+            nonlocal batch_num
+            batch_num += 1
+            return testbed_pool.run_testcases(candidates,
+                                              f"{dump_dir_path}/batch_{batch_num}",
+                                              f"{crash_name}_batch-{batch_num}")
+    else:
+        if worker_num != 1:
+            print(f"{router_agent_config.router_type.name} cannot run multiple instances, running on a single testbed.")
+        testbed = Testbed(
+            tcp_agent_config = tcp_agent_config,
+            router_agent_config = router_agent_config,
+            exabgp_agent_config = exabgp_agent_config,
+        )
+        testbed.save_crashes = False
+
+        def oracle(candidates: list[TestCase]) -> list[bool]:
+            nonlocal batch_num
+            batch_num += 1
+            results = []
+            for i, candidate in enumerate(candidates):
+                candidate_dump_path = f"{dump_dir_path}/batch_{batch_num}/testcase_{i+1}"
+                create_dir(candidate_dump_path)
+                testbed.single_test_inner(
+                    testcase=candidate,
+                    dump_path=candidate_dump_path,
+                    testcase_id=f"{crash_name}_batch-{batch_num}_testcase-{i+1}"
+                )
+                results.append(file_exists(f"{candidate_dump_path}/{CRASH_MARKER_FILE}"))
+            return results
+
+    ########## Minimize ##########
+
+    minimizer = TestCaseMinimizer(testcase, oracle, max_rounds=max_rounds)
+    minimized = minimizer.minimize()
+
+    ########## Save the minimized testcase ##########
+
+    wire_bytes = get_wire_bytes(minimized)
+    save_variable_to_file(minimized, f"{crash_path}/{MINIMIZED_PKL_FILE}", save_mode='wb')
+    create_file(f"{crash_path}/{MINIMIZED_TXT_FILE}", minimized.get_string_expression())
+    with open(f"{crash_path}/{MINIMIZED_BIN_FILE}", 'wb') as f:
+        f.write(wire_bytes)
+    print(f"Minimized from {len(testcase)} items ({len(get_wire_bytes(testcase))} bytes) "
+          f"to {len(minimized)} items ({len(wire_bytes)} bytes) with {minimizer.run_num} runs.")
+    print(f"Wire bytes: {bytes2hexstr(wire_bytes)}")
+    print(f"Saved to {crash_path}/{MINIMIZED_PKL_FILE}")
+
+if __name__ == "__main__":
+    # Create the arg parser.
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--name", "-n",
+        required=True,
+        help="Name of the crash setting in data/test_crashed",
+    )
+    parser.add_argument(
+        "--workers", "-w",
+        type=int,
+        default=1,
+        help="Number of parallel testbeds, 0 to size by the available cores",
+    )
+    parser.add_argument(
+        "--max_rounds",
+        type=int,
+        default=5,
+        help="Maximum number of rounds of the reductions",
+    )
+    args = parser.parse_args()
+    # Run the main function.
+    main(crash_name=args.name,
+         worker_num=args.workers,
+         max_rounds=args.max_rounds)
@@ -0,0 +1,126 @@
+# This file is used to test the BGP routing software with many simulated BGP peers.
+# All the peers are driven from this process, each with its own OPEN message, ASN and schedule.
+# The routing software is automatically set-up and torn-down.
+
+import sys, os, argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test_agents.router_agent import *
+from test_agents.multi_session_agent import derive_session_configurations, get_session_neighbors
+from bgp_toolkit.bgp_toolkit_configuration import BGPToolkitConfiguration
+from bgp_toolkit.message import UpdateMessage_BFN, UpdateMessage
+
+from bgprobe_config import *
+
+from testbed import *
+
+CONST_PREFIX = "59.66.130.0/24"
+
+def session_schedule(bgp_config: BGPToolkitConfiguration) -> TestCase:
+    """
+    The schedule of each session: a trivial UPDATE message originated by the session.
+    """
+    update_message_bfn = UpdateMessage_BFN.get_bfn(
+        withdrawn_routes=[],
+        aspath=[bgp_config.asn],
+        next_hop=bgp_config.bgp_identifier,
+        nlri=[CONST_PREFIX]
+    )
+    return TestCase([UpdateMessage(update_message_bfn)])
+
+def main(session_num: int, first_ip: str, first_asn: int, hold_duration: float, test_name: str = None):
+    """
+    The main function of running the multi-session test.
+    """
+
+    ########## Configure the sessions ##########
+
+    session_configs = derive_session_configurations(
+        bgp_config=BGP_CONFIG,
+        host=router_agent_ip,
+        first_bind_ip=first_ip,
+        session_num=session_num,
+        schedule_func=session_schedule,
+        netns=tester_agent_namespace,
+        first_asn=first_asn,
+    )
+
+    ########## Configure the Router Software ##########
+
+    router_agent_config = RouterAgentConfiguration(
+        asn=router_agent_asn,
+        router_id=router_agent_ip,
+        neighbors=get_session_neighbors(session_configs, router_agent["veth"]) + [
+            Neighbor(
+                peer_ip=exabgp_agent_ip,
+                peer_asn=exabgp_agent_asn,
+                local_source=router_agent["veth"]
+            ),
+        ],
+        router_type=router_type
+    )
+
+    ########## Initialize the Testbed ##########
+
+    testbed = Testbed(
+        tcp_agent_config = tcp_agent_config,
+        router_agent_config = router_agent_config,
+        exabgp_agent_config = exabgp_agent_config,
+        bmp_agent_config = bmp_agent_config,
+    )
+
+    ########## Run the sessions ##########
+
+    if test_name is None:
+        test_name = f"multi_session-{session_num}"
+
+    _, prefix_len = get_ipv4_prefix_parts(tester_agent["ip"])
+    testbed.run_test_multi_session(
+        session_configs=session_configs,
+        test_name=test_name,
+        session_veth=tester_agent["veth"],
+        session_prefix_len=prefix_len,
+        hold_duration=hold_duration,
+    )
+
+if __name__ == "__main__":
+    # Create the arg parser.
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sessions", "-s",
+        type=int,
+        required=True,
+        help="Number of simulated BGP sessions",
+    )
+    parser.add_argument(
+        "--first_ip",
+        type=str,
+        default="10.0.0.128",
+        help="Address of the first session, the following sessions use the consecutive addresses",
+    )
+    parser.add_argument(
+        "--first_asn",
+        type=int,
+        default=65100,
+        help="AS number of the first session, the following sessions use the consecutive AS numbers",
+    )
+    parser.add_argument(
+        "--hold",
+        type=float,
+        default=5,
+        help="Seconds to keep the sessions after their schedules are sent",
+    )
+    parser.add_argument(
+        "--test_name",
+        type=str,
+        default=None,
+        help="Optional name for the test",
+    )
+    args = parser.parse_args()
+    # Run the main function.
+    main(session_num=args.sessions,
+         first_ip=args.first_ip,
+         first_asn=args.first_asn,
+         hold_duration=args.hold,
+         test_name=args.test_name)
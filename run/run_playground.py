@@ -2,19 +2,20 @@
 # to observe in detail the bahavior of the router software
 
 import sys, os, argparse
+from time import sleep
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from test_agents.router_agent import *
 
 from bgprobe_config import *
+from basic_utils.selection_utils import add_selection_arguments, get_selection, parse_ids
 
 from testbed import *
 
-testcase_id = 2
-test_name = f"playground_random_attribute_bfn_{testcase_id}"
-data_file_path = f"{REPO_ROOT_PATH}/testcase_factory/batched_testcases/random_attribute_bfn.pkl"
-testcase = read_variables_from_file(data_file_path)[0][testcase_id-1]
+# The testcases sent by `send_msg` by default: testcase 2 of `random_attribute_bfn`.
+DEFAULT_TEST_BATCH_NAME = "random_attribute_bfn"
+DEFAULT_TESTCASE_IDS = "2"
 
 ########## Configure the Router Software ##########
 
@@ -42,6 +43,7 @@ testbed = Testbed(
     tcp_agent_config = tcp_agent_config,
     router_agent_config = router_agent_config,
     exabgp_agent_config = exabgp_agent_config,
+    bmp_agent_config = bmp_agent_config,
 )
 
 # testbed.run_test_playground(
@@ -65,6 +67,15 @@ if __name__ == "__main__":
                  "print_log",
                  "clear_log"]
     )
+    parser.add_argument(
+        "--batch",
+        type=str,
+        default=DEFAULT_TEST_BATCH_NAME,
+        help="Name of the test batch the testcases of `send_msg` are taken from",
+    )
+    # The testcases are numbered from 1, as in the dump directory of a batch.
+    add_selection_arguments(parser)
+    parser.set_defaults(ids=parse_ids(DEFAULT_TESTCASE_IDS))
     args = parser.parse_args()
 
     match args.action:
@@ -79,17 +90,22 @@ if __name__ == "__main__":
             testbed.router_agent.wait_for_log() # Start the clients one by one.
             testbed.tcp_agent.start()
             print("Debug info: Ready!")
-            
-            # Send the message one-by-one
-            for message in testcase:
-                print("Debug info: Message sent!")
-                if isinstance(message, Halt):
-                    print("Halting between BGP messages to ensure fully updating...")
-                    sleep(2)
-                    continue
-                testbed.tcp_agent.send(message.get_binary_expression())
-                sleep(1)
-                testbed.router_agent.wait_for_log() # Wait the state to become stable.
+
+            # Only the selected testcases are read from the batch.
+            testcase_list = open_test_batch(args.batch)
+            for testcase_id in get_selection(args).get_numbers(len(testcase_list), first=1):
+                print(f"Debug info: Sending testcase {testcase_id} of {args.batch}")
+                testcase = testcase_list[testcase_id-1]
+                # Send the message one-by-one
+                for message in testcase:
+                    print("Debug info: Message sent!")
+                    if isinstance(message, Halt):
+                        print("Halting between BGP messages to ensure fully updating...")
+                        sleep(2)
+                        continue
+                    testbed.tcp_agent.send(message.get_binary_expression())
+                    sleep(1)
+                    testbed.router_agent.wait_for_log() # Wait the state to become stable.
         case "start_dump_msg":
             mrt_path = f"{REPO_ROOT_PATH}/{TESTCASE_DUMP_PLAYGROUND}/{MESSAGE_MRT_FILE}"
             if isinstance(testbed.router_agent, FRRRouterAgent):
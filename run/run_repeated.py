@@ -49,6 +49,7 @@ def main(test_id: int, repeat_num: int, test_name: str = None):
         tcp_agent_config = tcp_agent_config,
         router_agent_config = router_agent_config,
         exabgp_agent_config = exabgp_agent_config,
+        bmp_agent_config = bmp_agent_config,
     )
 
     ########## Run testcase ##########
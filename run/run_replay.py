@@ -0,0 +1,117 @@
+# This file is used to replay a recorded BGP session against the BGP router software,
+# preserving the original inter-message timing (optionally sped up).
+# The session can be read from a pcap capture (e.g., the `tester.pcap` of a testcase dump)
+# or from a BGP4MP MRT dump (e.g., the `messages.mrt` of a testcase dump).
+
+import sys, os, argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test_agents.router_agent import *
+from testcase_factory.replay_testcase_factory import get_replay_testcase, read_tester_messages_from_pcap, read_tester_messages_from_mrt
+
+from bgprobe_config import *
+
+from testbed import *
+
+def main(pcap_path: str, mrt_path: str, speedup: float, tester_ip: str = None, test_name: str = None):
+    """
+    The main function of replaying the recorded session.
+    """
+
+    ########## Read the recorded session ##########
+
+    if pcap_path is not None:
+        timed_messages = read_tester_messages_from_pcap(pcap_path, tester_ip)
+        source_path = pcap_path
+    else:
+        # The dump also records the other peers of the router, only the tester (by its AS) is replayed.
+        timed_messages = read_tester_messages_from_mrt(mrt_path, tester_ip, tester_asn=tester_agent_asn)
+        source_path = mrt_path
+    testcase = get_replay_testcase(timed_messages, speedup=speedup, bgp_config=BGP_CONFIG)
+    print(f"Replaying {len(testcase)} messages from {source_path}")
+
+    ########## Configure the Router Software ##########
+
+    router_agent_config = RouterAgentConfiguration(
+        asn=router_agent_asn,
+        router_id=router_agent_ip,
+        neighbors=[
+            Neighbor(
+                peer_ip=tester_agent_ip,
+                peer_asn=tester_agent_asn,
+                local_source=router_agent["veth"]
+            ),
+            Neighbor(
+                peer_ip=exabgp_agent_ip,
+                peer_asn=exabgp_agent_asn,
+                local_source=router_agent["veth"]
+            ),
+        ],
+        router_type=router_type
+    )
+
+    ########## Initialize the Testbed ##########
+
+    testbed = Testbed(
+        tcp_agent_config = tcp_agent_config,
+        router_agent_config = router_agent_config,
+        exabgp_agent_config = exabgp_agent_config,
+        bmp_agent_config = bmp_agent_config,
+    )
+
+    ########## Replay the session ##########
+
+    if test_name is None:
+        test_name = f"replay_{os.path.basename(source_path)}"
+
+    testbed.run_test_replay(
+        testcase=testcase,
+        test_name=test_name,
+    )
+
+if __name__ == "__main__":
+    # Create the arg parser.
+    parser = argparse.ArgumentParser()
+    source_group = parser.add_mutually_exclusive_group(required=True)
+    source_group.add_argument(
+        "--pcap",
+        type=str,
+        help="Path of the pcap capture to replay",
+    )
+    source_group.add_argument(
+        "--mrt",
+        type=str,
+        help="Path of the BGP4MP MRT dump to replay",
+    )
+    speed_group = parser.add_mutually_exclusive_group()
+    speed_group.add_argument(
+        "--speed",
+        type=float,
+        default=1,
+        help="Speed-up factor of the original timing",
+    )
+    speed_group.add_argument(
+        "--asap",
+        action="store_true",
+        help="Send the messages as fast as possible, ignoring the original timing",
+    )
+    parser.add_argument(
+        "--tester_ip",
+        type=str,
+        default=None,
+        help="Address of the recorded tester (default: the connecting side for pcap, the peer of the tester AS for MRT)",
+    )
+    parser.add_argument(
+        "--test_name",
+        type=str,
+        default=None,
+        help="Optional name for the test",
+    )
+    args = parser.parse_args()
+    # Run the main function.
+    main(pcap_path=args.pcap,
+         mrt_path=args.mrt,
+         speedup=None if args.asap else args.speed,
+         tester_ip=args.tester_ip,
+         test_name=args.test_name)
@@ -8,27 +8,46 @@
 # - `test_name` is the name of the test. It is just used to indicate a test, and can be reused. 
 # - `testcase_id` is a UNIQUE identification of a single testcase (Please recall the difference between "test" and "testcase"). 
 
-from time import sleep
-from basic_utils.serialize_utils import save_variable_to_file, read_variables_from_file
+from time import monotonic, time
+from basic_utils.serialize_utils import save_variable_to_file
+from basic_utils.selection_utils import TestcaseSelection
 from basic_utils.time_utils import get_current_time
 from basic_utils.file_utils import *
 from basic_utils.const import *
-from testcase_factory.basic_types import Halt, TestCase
+from basic_utils.progress_utils import ProgressManifest, find_latest_run
+from basic_utils.trace_utils import Tracer
+from basic_utils.crash_utils import CrashIndex, CrashSignature, get_crash_signature, CRASH_LOG_LINE_NUM
+from testcase_factory.basic_types import Halt, TestCase, SocketOption, SendMode
 from test_agents.tcp_agent import TCPAgent, TCPAgentConfiguration
-from test_agents.router_agent import RouterAgentConfiguration, FRRRouterAgent, BIRDRouterAgent, GoBGPRouterAgent, OpenBGPDRouterAgent, get_router_agent
+from test_agents.router_agent import RouterAgentConfiguration, BMPStation, FRRRouterAgent, BIRDRouterAgent, GoBGPRouterAgent, OpenBGPDRouterAgent, get_router_agent
 from test_agents.exabgp_agent import ExaBGPAgent, ExaBGPAgentConfiguration
+from test_agents.bmp_agent import BMPAgent, BMPAgentConfiguration
+from test_agents.multi_session_agent import MultiSessionAgent, BGPSessionConfiguration
+from network_utils.vnet_utils import execute_under_namespace, assign_prefix_to_interface
 from testcase_factory.single_testcase_factory import single_testcase_suite
+from testcase_factory.testcase_minimizer import get_mutated_paths, get_field_path
+from testcase_factory.corpus import open_test_batch
+from run.report_pipeline import ReportPipeline
 from subprocess import CalledProcessError
+from dataclasses import asdict
+import json, os, threading
 
 MESSAGE_MRT_FILE = "messages.mrt"
 ROUTE_MRT_FILE = "routes.mrt"
 EXABGP_LOG_FILE = "exabgp.log"
 BGPD_LOG_FILE = "bgpd.log"
+BMP_RECORD_FILE = "bmp.jsonl"
 ROUTER_CONFIG_PKL_FILE = "router_conf.pkl"
 ROUTER_CONFIG_TXT_FILE = "router_conf.txt"
 TESTCASE_PKL_FILE = "testcase.pkl"
 TESTCASE_TXT_FILE = "testcase.txt"
 CRASH_MARKER_FILE = "crashed"
+CRASH_SIGNATURE_FILE = "crash_signature.txt"
+TESTER_PCAP_FILE = "tester.pcap"
+SESSION_RESULT_FILE = "sessions.jsonl"
+THROUGHPUT_FILE = "throughput.json"
+TRACE_FILE = "trace.json"
+TRACE_SUMMARY_FILE = "trace_summary.txt"
 
 TEMP_DUMP_DIR = f"{REPO_ROOT_PATH}/data/temp_dump"
 TEMP_MESSAGE_DUMP = f"{TEMP_DUMP_DIR}/{MESSAGE_MRT_FILE}"
@@ -36,6 +55,64 @@ TEMP_ROUTE_DUMP = f"{TEMP_DUMP_DIR}/{ROUTE_MRT_FILE}"
 TEMP_EXABGP_DUMP = f"{TEMP_DUMP_DIR}/{EXABGP_LOG_FILE}"
 TEMP_BGPD_DUMP = f"{TEMP_DUMP_DIR}/{BGPD_LOG_FILE}"
 
+########## Batch Progress ##########
+
+def get_batch_dump_dir(test_name: str, resume: str = None) -> tuple[str, str]:
+    """
+    Get the name (with time) and the path of the dump directory of a batch run.
+
+    `resume`: `None` to start a new run.
+    Otherwise the name of the run to resume (i.e., `{test_name}_{time}`), or `""` for the latest run of `test_name`.
+    """
+    batched_dump_path = f"{REPO_ROOT_PATH}/{TESTCASE_DUMP_BATCHED}"
+    if resume is None:
+        test_name_with_time = f"{test_name}_{get_current_time()}"
+        dump_dir_path = f"{batched_dump_path}/{test_name_with_time}"
+        assert not directory_exists(dump_dir_path)
+        create_dir(dump_dir_path)
+        return test_name_with_time, dump_dir_path
+    test_name_with_time = os.path.basename(os.path.normpath(resume)) if resume else find_latest_run(batched_dump_path, test_name)
+    if test_name_with_time is None:
+        raise ValueError(f"No run of {test_name} to resume in {batched_dump_path}!")
+    dump_dir_path = f"{batched_dump_path}/{test_name_with_time}"
+    if not directory_exists(dump_dir_path):
+        raise ValueError(f"The run to resume {dump_dir_path} does not exist!")
+    print(f"Resuming the run in {dump_dir_path}")
+    return test_name_with_time, dump_dir_path
+
+def prepare_testcase_dump_dir(dump_dir_path: str, test_name_with_time: str, index: int) -> tuple[str, str]:
+    """
+    Prepare the dump directory of the testcase at `index` (0-based) in a batch run.
+    Leftovers of an interrupted execution of the testcase are removed,
+    since the dumps (e.g., the pickles) are appended, and the crash setting must not exist.
+    Return the path of the dump directory and the testcase ID.
+    """
+    testcase_dump_dir_path = f"{dump_dir_path}/testcase_{index+1}"
+    # `testcase_id` is defined here
+    testcase_id = f"{test_name_with_time}_testcase-{index+1}"
+    crash_setting_path = f"{REPO_ROOT_PATH}/{TESTCASE_DUMP_CRASHED}/{testcase_id}"
+    for stale_path in [testcase_dump_dir_path, crash_setting_path]:
+        if directory_exists(stale_path):
+            os.system(f"sudo rm -rf {stale_path}")
+    create_dir(testcase_dump_dir_path)
+    return testcase_dump_dir_path, testcase_id
+
+def save_trace(tracer: Tracer, dump_dir_path: str, events: list[dict] = None):
+    """
+    Save the spans of a run into the trace file of its dump directory (see `Tracer.save`),
+    and write the per-phase percentiles of the whole run.
+    """
+    events = tracer.save(f"{dump_dir_path}/{TRACE_FILE}", events)
+    summary = tracer.get_summary(events)
+    print(summary)
+    create_file(f"{dump_dir_path}/{TRACE_SUMMARY_FILE}", summary + "\n")
+
+def record_testcase_progress(manifest: ProgressManifest, testcase_dump_dir_path: str, index: int):
+    """
+    Record the finished testcase at `index` (0-based) in the progress manifest.
+    """
+    manifest.record(index, crashed=file_exists(f"{testcase_dump_dir_path}/{CRASH_MARKER_FILE}"))
+
 class Testbed:
     """
     BGProbe testbed. 
@@ -43,19 +120,72 @@ class Testbed:
     def __init__(self,
                  tcp_agent_config: TCPAgentConfiguration,
                  router_agent_config: RouterAgentConfiguration,
-                 exabgp_agent_config: ExaBGPAgentConfiguration
+                 exabgp_agent_config: ExaBGPAgentConfiguration,
+                 session_reuse: bool = False,
+                 bmp_agent_config: BMPAgentConfiguration = None
                  ):
         """
         Initialize the test agent for the BGP software
+
+        `session_reuse`: Keep the BGP instance (and ExaBGP) running between testcases.
+        Between two testcases, only the tester session is reset and the RIB is verified to be clean.
+        The instance is fully restarted after a crash or a failed cleanliness check.
+        Ignored for the routing softwares whose MRT dumping is set in the config file (GoBGP, OpenBGPD).
+
+        `bmp_agent_config`: The BMP collector observing the routing software, `None` to disable it.
+        The router reports to the collector unless its configuration sets another BMP station.
         """
         # First-stage initialization
         self.tcp_agent_config : TCPAgentConfiguration = tcp_agent_config
         self.router_agent_config: RouterAgentConfiguration = router_agent_config
         self.exabgp_agent_config : ExaBGPAgentConfiguration = exabgp_agent_config
+        self.bmp_agent_config : BMPAgentConfiguration = bmp_agent_config
+        if self.bmp_agent_config is not None and self.router_agent_config.bmp_station is None:
+            self.router_agent_config.bmp_station = BMPStation(ip=bmp_agent_config.host, port=bmp_agent_config.port)
         # Initialize the agents
         self.tcp_agent = TCPAgent(self.tcp_agent_config)
         self.router_agent = get_router_agent(self.router_agent_config)
         self.exabgp_agent = ExaBGPAgent(self.exabgp_agent_config)
+        # The BMP collector runs for the whole lifetime of the testbed, the routers reconnect to it after restarts.
+        self.bmp_agent : BMPAgent = None
+        if self.bmp_agent_config is not None:
+            self.bmp_agent = BMPAgent(self.bmp_agent_config)
+            self.bmp_agent.start()
+        # Session-reuse mode
+        self.session_reuse = session_reuse and self.router_agent.SESSION_REUSE
+        if session_reuse and not self.session_reuse:
+            print(f"Session reuse is not supported by {self.router_agent_config.router_type.name}, "
+                  "the instance is restarted for every testcase.")
+        # If the BGP instance is kept running from the previous testcase.
+        self.instance_running = False
+        # The number of routes in the RIB of a fresh instance.
+        self.rib_baseline = 0
+        # The number of full restarts of the routing software.
+        self.full_restart_count = 0
+        # Set as soon as a daemon of the routing software exits, even between messages.
+        self.crash_event = threading.Event()
+        self.router_agent.set_crash_callback(self.on_router_crash)
+        # The timing profile bounding the condition-based waits.
+        self.timing_profile = self.router_agent.get_timing_profile()
+        # How long (in seconds) each kind of wait has actually taken, used by the calibration.
+        self.timing_records : dict[str, list[float]] = {}
+        # The spans of the phases of the testcases.
+        self.tracer = Tracer()
+        # Whether the crashing testcases are saved to `TESTCASE_DUMP_CRASHED`.
+        # Unset when re-executing candidates (e.g., by the minimizer), only the crash marker is created.
+        self.save_crashes = True
+        # The crash buckets, only the first crashes of a bucket are saved.
+        self.crash_index = CrashIndex(f"{REPO_ROOT_PATH}/{TESTCASE_DUMP_CRASHED}")
+        # The last message sent to the router, whose mutated field is part of the crash signature.
+        self.last_sent_message = None
+
+    def on_router_crash(self, pid: int):
+        """
+        The crash callback of the router agent, called from the watcher thread.
+        The crash is confirmed by `if_crashed` (the daemon may be restarted intentionally).
+        """
+        print(f"Daemon {pid} of the routing software exited!")
+        self.crash_event.set()
 
     def single_test_inner(self,
                           testcase: TestCase,
@@ -72,6 +202,8 @@ class Testbed:
         - MESSAGE_MRT_FILE: Messages the software received
         - ROUTE_MRT_FILE: RIB of the target BGP instance
         - BGPD_LOG_FILE, EXABGP_LOG_FILE: The log of the two BGP instances
+        - BMP_RECORD_FILE: The BMP records of the router (if the BMP collector is enabled)
+        - TESTER_PCAP_FILE: All the bytes sent and received by the tester
         - ROUTER_CONFIG_PKL_FILE, TESTCASE_PKL_FILE: Saved configuration of the testcase
 
         `testcase_id`: The unique ID used to indicate the testcase.
@@ -79,15 +211,35 @@ class Testbed:
         `testcase_id` may be used in the following instances:
         - Saving the crash setting 
 
+        Every phase is traced by `self.tracer`.
+        """
+        with self.tracer.span("testcase", category="testcase", testcase_id=testcase_id):
+            try:
+                self.run_testcase_phases(testcase, dump_path, testcase_id)
+            finally:
+                self.tracer.end_phase()
+
+    def run_testcase_phases(self,
+                            testcase: TestCase,
+                            dump_path: str,
+                            testcase_id: str):
+        """
+        The phases of `single_test_inner`, each one traced as a span.
         """
 
         ########## Allow user to access the dumped directory ##########
 
+        self.tracer.phase("log mark")
+
         allow_user_access(dump_path)
 
         ########## Initialize the routing software interface. ##########
 
-        self.router_agent.clear_log() 
+        # Mark where the logs of this testcase begin, the live logs are never truncated.
+        self.router_agent.mark_log()
+        self.exabgp_agent.mark_log()
+        if self.bmp_agent is not None:
+            self.bmp_agent.mark()
 
         ########## Define the crash handling function. ##########
 
@@ -95,39 +247,66 @@ class Testbed:
             """
             Handle software crashes.
             """
+            self.tracer.phase("crash handling")
             # Allow user to access the dumped directory
             allow_user_access(dump_path)
             # Create a marker file in `dump_path`.
             if self.router_agent.if_crashed():
                 print("Software crashed!")
-                # Save the router configuration and the testcase to a special folder.
-                self.save_crash_setting(router_agent_config=self.router_agent_config,
-                                        testcase=testcase,
-                                        name=testcase_id)
+                # Let the dying daemon finish its log (e.g., the backtrace).
+                self.router_agent.wait_for_log()
+                signature = self.get_crash_signature()
+                create_file(f"{dump_path}/{CRASH_SIGNATURE_FILE}", signature.get_string_expression())
+                # Save the router configuration and the testcase to a special folder,
+                # unless enough crashes of the same bucket are saved.
+                if self.save_crashes:
+                    bucket_id, save = self.crash_index.add(signature, testcase_id)
+                    if save:
+                        self.save_crash_setting(router_agent_config=self.router_agent_config,
+                                                testcase=testcase,
+                                                name=testcase_id,
+                                                signature=signature)
+                    else:
+                        print(f"Crash bucket {bucket_id} already has {self.crash_index.save_num} saved crashes, "
+                              "only counted.")
                 # Mark the testcase has crashed
                 create_file(f"{dump_path}/{CRASH_MARKER_FILE}", "1")
+            # Keep what the router reported before the crash.
+            if self.bmp_agent is not None:
+                self.bmp_agent.dump_since_mark(f"{dump_path}/{BMP_RECORD_FILE}")
             # Clear the test pipeline 
             self.tcp_agent.end()
             self.exabgp_agent.end()
-            self.router_agent.end_bgp_instance()
-            self.router_agent.restart_software()
+            self.full_restart()
 
         ########## Start the routing software instance and clients ##########
 
-        if isinstance(self.router_agent, GoBGPRouterAgent):
-            self.router_agent.message_mrt_dump_config(f"{dump_path}/{MESSAGE_MRT_FILE}")
-            self.router_agent.route_mrt_dump_config(f"{dump_path}/{ROUTE_MRT_FILE}")
-        elif isinstance(self.router_agent, OpenBGPDRouterAgent):
-            self.router_agent.message_mrt_dump_config(f"{dump_path}/{MESSAGE_MRT_FILE}")
-            self.router_agent.route_mrt_dump_config(f"{dump_path}/{ROUTE_MRT_FILE}")
-        self.router_agent.start_bgp_instance()
-        self.router_agent.wait_for_log() # Start the clients one by one.
-        self.exabgp_agent.start()
-        self.router_agent.wait_for_log() # Start the clients one by one.
+        if not self.instance_running:
+            if isinstance(self.router_agent, GoBGPRouterAgent):
+                self.router_agent.message_mrt_dump_config(f"{dump_path}/{MESSAGE_MRT_FILE}")
+                self.router_agent.route_mrt_dump_config(f"{dump_path}/{ROUTE_MRT_FILE}")
+            elif isinstance(self.router_agent, OpenBGPDRouterAgent):
+                self.router_agent.message_mrt_dump_config(f"{dump_path}/{MESSAGE_MRT_FILE}")
+                self.router_agent.route_mrt_dump_config(f"{dump_path}/{ROUTE_MRT_FILE}")
+            self.tracer.phase("router start")
+            self.router_agent.start_bgp_instance()
+            self.router_agent.wait_for_log() # Start the clients one by one.
+            self.tracer.phase("exabgp start")
+            self.exabgp_agent.start()
+            self.router_agent.wait_for_log() # Start the clients one by one.
+            if self.session_reuse:
+                self.rib_baseline = self.router_agent.get_rib_size() or 0
+                self.instance_running = True
+        self.tracer.phase("tester connect")
         self.tcp_agent.start()
+        # Capture the traffic of the tester, and drain the messages from the router.
+        self.tcp_agent.start_recording(f"{dump_path}/{TESTER_PCAP_FILE}")
+        self.tcp_agent.start_receiving()
+        self.tcp_agent.start_keepalive()
 
         ########## Dumping BGP messages ##########
 
+        self.tracer.phase("message dump start")
         # Different dumping behavior for different BGP softwares
         if isinstance(self.router_agent, FRRRouterAgent):
             # For FRRouting bgpd, we start to dump ONLY BGP UPDATE messages here.
@@ -136,7 +315,7 @@ class Testbed:
             # For BIRD bgpd, we start to dump ALL BGP messages here.
             self.router_agent.dump_messages(f"{dump_path}/{MESSAGE_MRT_FILE}")
         elif isinstance(self.router_agent, GoBGPRouterAgent):
-            # The MRT file dumping of GoBGPRouterAgent is set in the config file.
+            # The MRT file dumping of GoBGPRouterAgent is set before the instance starts (in the config file, or through the gRPC API).
             pass
         elif isinstance(self.router_agent, OpenBGPDRouterAgent):
             # The MRT file dumping of OpenBGPDRouterAgent is set in the config file.
@@ -147,34 +326,30 @@ class Testbed:
         
         ########## Send test messages ##########
 
-        # Send the message one-by-one
-        for message in testcase:
-            if isinstance(message, Halt):
-                print("Halting between BGP messages to ensure fully updating...")
-                sleep(2)
-                continue
-            self.tcp_agent.send(message.get_binary_expression())
-            self.router_agent.wait_for_log() # Wait the state to become stable.
-            if self.router_agent.if_crashed():
-                crash_handling()
-                return
+        # Send the messages according to the send policy of the testcase
+        self.tracer.phase("messages")
+        if self.send_testcase(testcase):
+            crash_handling()
+            return
         
         ########## Dumping BGP logs ##########
         
         # Wait for the ExaBGP log to be ready
-        sleep(2)
-
-        # Get the contents for bgpd log and exabgp log
-        bgpd_log_content = self.router_agent.read_log()
-        exabgp_log_content = self.exabgp_agent.read_log()
-        # There is no need to clear the exabgp log since it will be overwritten 
-        self.router_agent.clear_log()
-        # Create bgpd log and exabgp log
-        create_file(f"{dump_path}/{BGPD_LOG_FILE}", bgpd_log_content)
-        create_file(f"{dump_path}/{EXABGP_LOG_FILE}", exabgp_log_content)
+        self.tracer.phase("propagation wait")
+        self.wait_for_propagation()
+        # The RIB dumped after this time reflects all the messages.
+        stable_time = time()
+
+        # Copy the bgpd log and exabgp log of this testcase (since the marks)
+        self.tracer.phase("log dump")
+        self.router_agent.dump_log(f"{dump_path}/{BGPD_LOG_FILE}")
+        self.exabgp_agent.dump_log(f"{dump_path}/{EXABGP_LOG_FILE}")
+        if self.bmp_agent is not None:
+            self.bmp_agent.dump_since_mark(f"{dump_path}/{BMP_RECORD_FILE}")
 
         ########## Dump the testcase settings ##########
 
+        self.tracer.phase("settings dump")
         save_variable_to_file(self.router_agent_config, 
                               f"{dump_path}/{ROUTER_CONFIG_PKL_FILE}")
         save_variable_to_file(testcase, 
@@ -188,6 +363,7 @@ class Testbed:
 
             ########## Dumping RIB ##########
 
+            self.tracer.phase("rib dump")
             # Dumping RIB here, different behaviors for different BGP softwares
             if isinstance(self.router_agent, FRRRouterAgent):
                 # For FRRouting bgpd, dumping RIB is like taking a snapshot.
@@ -196,20 +372,21 @@ class Testbed:
             elif isinstance(self.router_agent, BIRDRouterAgent):
                 # For BIRD bgpd, dumping is periodic, we set the period as 1 second.
                 self.router_agent.dump_routing_table(f"{dump_path}/{ROUTE_MRT_FILE}")
-                # So we need to sleep longer
-                sleep(2)
+                # So we need to wait for the first periodic dump
+                self.wait_for_rib_dump(f"{dump_path}/{ROUTE_MRT_FILE}", stable_time)
             elif isinstance(self.router_agent, GoBGPRouterAgent):
-                # The MRT file dumping of GoBGPRouterAgent has been set in the config file.
-                sleep(1)
+                # The MRT file dumping of GoBGPRouterAgent has been set before the instance started.
+                self.wait_for_rib_dump(f"{dump_path}/{ROUTE_MRT_FILE}", stable_time)
             elif isinstance(self.router_agent, OpenBGPDRouterAgent):
                 # The MRT file dumping of OpenBGPDRouterAgent as been set in the config file.
-                sleep(1)
+                self.wait_for_rib_dump(f"{dump_path}/{ROUTE_MRT_FILE}", stable_time)
             else:
                 # This should not happen...
                 raise ValueError("Unexpected type of the router interface!")
 
             ########## Stop MRT dumping ##########
 
+            self.tracer.phase("mrt dump stop")
             if isinstance(self.router_agent, FRRRouterAgent):
                 self.router_agent.stop_dump_updates()
                 self.router_agent.stop_dump_routing_table()
@@ -229,18 +406,221 @@ class Testbed:
 
         ########## Deal with software crashes ##########
 
+        self.tracer.phase("crash check")
         if self.router_agent.if_crashed():
             crash_handling()
             return
         
         ########## Clear the test pipeline ##########
                 
+        self.tracer.phase("teardown")
         self.tcp_agent.end()
         self.router_agent.wait_for_log() # Shut down the clients one by one.
+        if self.instance_running:
+            self.tracer.phase("session reset")
+            if self.reset_session():
+                # Keep the instance for the next testcase.
+                return
+        self.tracer.phase("restart")
         self.exabgp_agent.end()
+        self.full_restart()
+
+    ########## Condition-based waits ##########
+
+    def record_timing(self, name: str, elapsed_time: float):
+        """
+        Record how long a kind of wait has actually taken.
+        """
+        self.timing_records.setdefault(name, []).append(elapsed_time)
+
+    def wait_for_stable(self) -> bool:
+        """
+        Wait until both the router and ExaBGP are stable (e.g., at a `Halt`),
+        bounded by the halt timeout of the timing profile.
+        Return `False` if any of their logs is still updating at the timeout.
+        """
+        profile = self.timing_profile
+        start_time = monotonic()
+        router_stable = self.router_agent.wait_for_log(timeout=profile.halt_timeout)
+        remaining_time = max(profile.halt_timeout - (monotonic() - start_time), 0)
+        exabgp_stable = self.exabgp_agent.wait_for_log(profile.log_idle_window, timeout=remaining_time)
+        self.record_timing("halt", monotonic() - start_time)
+        return router_stable and exabgp_stable
+
+    def wait_for_propagation(self) -> bool:
+        """
+        Wait until the routes propagated to ExaBGP are complete,
+        i.e., the ExaBGP log is not updated for the propagation window of the timing profile.
+        With the BMP collector, the BMP records must also stop coming, so the records dumped are complete.
+        Return `False` if the log (or the records) are still updating at the propagation timeout.
+        """
+        profile = self.timing_profile
+        start_time = monotonic()
+        stable = self.exabgp_agent.wait_for_log(profile.propagation_window, timeout=profile.propagation_timeout)
+        # The propagation delay is the time until the last update of the log.
+        last_update_time = self.exabgp_agent.log_tailer.last_update_time
+        self.record_timing("propagation", max(last_update_time - start_time, 0) if last_update_time is not None else 0)
+        if self.bmp_agent is not None:
+            remaining_time = max(profile.propagation_timeout - (monotonic() - start_time), 0)
+            stable = self.bmp_agent.wait_for_idle(profile.propagation_window, timeout=remaining_time) and stable
+        return stable
+
+    def wait_for_rib_dump(self, path: str, newer_than: float) -> bool:
+        """
+        Wait until the RIB is dumped into the MRT file after `newer_than` (as `time.time()`),
+        bounded by the RIB dump timeout of the timing profile.
+        Return `False` if the dump is not ready at the timeout.
+        """
+        start_time = monotonic()
+        ready = wait_for_file(path, newer_than=newer_than, timeout=self.timing_profile.rib_dump_timeout)
+        self.record_timing("rib_dump", monotonic() - start_time)
+        if not ready:
+            print(f"RIB dump {path} not ready in {self.timing_profile.rib_dump_timeout}s.")
+        return ready
+
+    def reset_session(self) -> bool:
+        """
+        Reset the state of the running instance cheaply (session-reuse mode).
+        The tester session is reset and the RIB is verified to shrink back to the baseline.
+        Return `False` if the instance is not clean and should be fully restarted.
+        """
+        if self.tcp_agent_config.bind_val is not None:
+            self.router_agent.reset_peer(self.tcp_agent_config.bind_val[0])
+        self.router_agent.wait_for_log()
+        if self.router_agent.if_crashed():
+            return False
+        if not self.router_agent.wait_for_clean_rib(self.rib_baseline):
+            return False
+        # The withdrawals sent to ExaBGP (and the BMP records) must not leak into the next testcase.
+        profile = self.timing_profile
+        self.exabgp_agent.wait_for_log(profile.propagation_window, timeout=profile.propagation_timeout)
+        if self.bmp_agent is not None:
+            self.bmp_agent.wait_for_idle(profile.propagation_window, timeout=profile.propagation_timeout)
+        return True
+
+    def full_restart(self):
+        """
+        Shut down the BGP instance and restart the routing software.
+        """
         self.router_agent.end_bgp_instance()
+        start_time = monotonic()
         self.router_agent.restart_software()
+        self.record_timing("restart", monotonic() - start_time)
+        self.instance_running = False
+        self.full_restart_count += 1
+
+    def end_reused_instance(self):
+        """
+        Shut down the instance kept running by the session-reuse mode (e.g., after a batch).
+        """
+        if self.instance_running:
+            self.exabgp_agent.end()
+            self.full_restart()
+
+    def report_throughput(self, testcase_num: int, elapsed_time: float, dump_dir_path: str = None):
+        """
+        Report the throughput of the testcases, and save it to `dump_dir_path` if given.
+        """
+        throughput = {
+            "session_reuse": self.session_reuse,
+            "testcase_num": testcase_num,
+            "elapsed_time": elapsed_time,
+            "testcases_per_hour": testcase_num * 3600 / elapsed_time if elapsed_time > 0 else 0,
+            "full_restart_num": self.full_restart_count,
+        }
+        print(f"{testcase_num} testcases in {elapsed_time:.1f}s "
+              f"({throughput['testcases_per_hour']:.1f} testcases/hour, "
+              f"{self.full_restart_count} full restarts).")
+        if dump_dir_path is not None:
+            create_file(f"{dump_dir_path}/{THROUGHPUT_FILE}", json.dumps(throughput, indent=2))
+
+
+    def apply_socket_option(self, socket_option: SocketOption):
+        """
+        Apply the TCP options to the socket of the TCP agent.
+        """
+        if socket_option.nodelay is not None:
+            self.tcp_agent.set_nodelay(socket_option.nodelay)
+        if socket_option.cork is not None:
+            self.tcp_agent.set_cork(socket_option.cork)
+
+    def send_testcase(self, testcase: TestCase) -> bool:
+        """
+        Send the messages of the testcase according to its send policy.
+        Return `True` if the router software crashed.
 
+        - `SendMode.SEQUENTIAL`: Wait for the router to become stable after each message.
+        - `SendMode.BURST`: Coalesce the messages between two `Halt`s into one scatter-gather write.
+        - `SendMode.PACED`: Send the messages at the fixed rate of the policy.
+        - `SendMode.TIMED`: Send each message at its `send_time`, scaled by the speed-up of the policy.
+        """
+        send_policy = testcase.get_send_policy()
+        self.apply_socket_option(SocketOption(nodelay=send_policy.nodelay,
+                                              cork=send_policy.cork))
+        # Messages waiting to be coalesced (only used by `SendMode.BURST`).
+        pending_messages = []
+        next_send_time = monotonic()
+        start_time = next_send_time
+        self.crash_event.clear()
+        self.last_sent_message = None
+
+        def flush_pending_messages():
+            """Send the pending messages in a single scatter-gather write."""
+            if pending_messages:
+                with self.tracer.span("send", category="message", message_num=len(pending_messages)):
+                    self.tcp_agent.send_coalesced(pending_messages)
+                pending_messages.clear()
+
+        for item in testcase:
+            if self.crash_event.is_set():
+                if self.router_agent.if_crashed():
+                    return True
+                self.crash_event.clear()
+            if isinstance(item, SocketOption):
+                # The option must not affect the messages before it.
+                flush_pending_messages()
+                self.apply_socket_option(item)
+                continue
+            if isinstance(item, Halt):
+                flush_pending_messages()
+                print("Halting between BGP messages to ensure fully updating...")
+                with self.tracer.span("halt", category="message"):
+                    self.wait_for_stable()
+                continue
+            message_bytes = item.get_binary_expression()
+            self.last_sent_message = item
+            match send_policy.mode:
+                case SendMode.SEQUENTIAL:
+                    with self.tracer.span("send", category="message"):
+                        self.tcp_agent.send(message_bytes)
+                    with self.tracer.span("wait", category="message"):
+                        self.router_agent.wait_for_log() # Wait the state to become stable.
+                    with self.tracer.span("crash check", category="message"):
+                        if self.router_agent.if_crashed():
+                            return True
+                case SendMode.BURST:
+                    pending_messages.append(message_bytes)
+                case SendMode.PACED:
+                    with self.tracer.span("pace", category="message"):
+                        self.crash_event.wait(max(next_send_time - monotonic(), 0))
+                    with self.tracer.span("send", category="message"):
+                        self.tcp_agent.send(message_bytes)
+                    next_send_time = max(next_send_time, monotonic()) + 1 / send_policy.rate
+                case SendMode.TIMED:
+                    # Messages without `send_time` and replays without speed-up are sent immediately.
+                    send_time = getattr(item, "send_time", None)
+                    if send_time is not None and send_policy.speedup is not None:
+                        with self.tracer.span("pace", category="message"):
+                            self.crash_event.wait(max(start_time + send_time / send_policy.speedup - monotonic(), 0))
+                    with self.tracer.span("send", category="message"):
+                        self.tcp_agent.send(message_bytes)
+        flush_pending_messages()
+
+        if send_policy.mode != SendMode.SEQUENTIAL:
+            with self.tracer.span("wait", category="message"):
+                self.router_agent.wait_for_log() # Wait the state to become stable.
+            return self.router_agent.if_crashed()
+        return False
 
     # TODO: Deal with the dumping here: Can we make it a callback function?
     def run_test_single(self,
@@ -269,11 +649,14 @@ class Testbed:
         )
     
     def run_test_single_all(self,
-                            test_name: str):
+                            test_name: str,
+                            selection: TestcaseSelection = None):
         """
         Run all single testcases.
 
         `test_name`: The name of the test.
+        `selection`: The testcases to run, numbered by their indices in `single_testcase_suite`.
+        By default from testcase 2 on.
         """
 
         ########## Prepare the directory for dumping ##########
@@ -290,7 +673,10 @@ class Testbed:
 
         # First retrieve the testcases.
         testcase_list = single_testcase_suite
-        for i in range(2,len(testcase_list)):
+        if selection is None:
+            selection = TestcaseSelection(start=2)
+        self.tracer = Tracer()
+        for i in selection.get_numbers(len(testcase_list)):
 
             print(f"======= Running testcase {i} =======")
 
@@ -305,47 +691,76 @@ class Testbed:
                 testcase_id=f"{test_name_with_time}_testcase-{i}"
             )
 
+        save_trace(self.tracer, dump_dir_path)
+
     def run_test_batch(self, 
                        test_batch_name: str,
-                       test_name: str):
+                       test_name: str,
+                       resume: str = None,
+                       analyze: bool = False,
+                       selection: TestcaseSelection = None):
         
         """
         Run the test in batch, and dump the result into the target directory.
+        The finished testcases are recorded in the progress manifest of the dump directory.
 
         `test_batch_name`: The name of the file containing the generated testcases.
         `test_name`: The name of the test.
+        `resume`: The run to resume (see `get_batch_dump_dir`), the finished testcases are skipped.
+        `analyze`: Whether to generate the reports of the testcases while the batch is running (see `ReportPipeline`).
+        `selection`: The testcases to run, numbered from 1 as in the dump directory. All the testcases by default.
+        Only the selected testcases are read from the batch.
         """
 
         ######### Prepare the directory for dumping #########
 
-        test_name_with_time = f"{test_name}_{get_current_time()}"
-        
-        data_file_path = f"{REPO_ROOT_PATH}/testcase_factory/batched_testcases/{test_batch_name}.pkl"
-        dump_dir_path = f"{REPO_ROOT_PATH}/{TESTCASE_DUMP_BATCHED}/{test_name_with_time}"
-        assert not directory_exists(dump_dir_path)
-        create_dir(dump_dir_path)
+        test_name_with_time, dump_dir_path = get_batch_dump_dir(test_name, resume)
 
         allow_user_access(dump_dir_path)
 
         ########## Enumerate the testcases ##########
 
-        # First retrieve the testcases.
-        testcase_list = read_variables_from_file(data_file_path)[0]
+        # First retrieve the testcases, each one is read when it runs.
+        testcase_list = open_test_batch(test_batch_name)
+        if selection is None:
+            selection = TestcaseSelection()
+        manifest = ProgressManifest(dump_dir_path)
+        manifest.start(test_batch_name, len(testcase_list))
+        finished_indices = manifest.get_finished_indices()
+        if finished_indices:
+            print(f"Skipping {len(finished_indices)} finished testcases.")
+        self.tracer = Tracer()
+        start_time = monotonic()
+        self.full_restart_count = 0
+        testcase_num = 0
+        report_pipeline = ReportPipeline(test_name_with_time) if analyze else None
         
-        for i in range(0,len(testcase_list)):
+        for number in selection.get_numbers(len(testcase_list), first=1):
+
+            i = number - 1
+            if i in finished_indices:
+                continue
 
             print(f"======= Running testcase {i+1} =======")
 
-            testcase_dump_dir_path = f"{dump_dir_path}/testcase_{i+1}"
-            create_dir(testcase_dump_dir_path)
+            testcase_dump_dir_path, testcase_id = prepare_testcase_dump_dir(dump_dir_path, test_name_with_time, i)
             testcase = testcase_list[i]
 
             self.single_test_inner(
                 testcase=testcase,
                 dump_path=testcase_dump_dir_path,
-                # `testcase_id` is defined here
-                testcase_id=f"{test_name_with_time}_testcase-{i+1}"
+                testcase_id=testcase_id
             )
+            record_testcase_progress(manifest, testcase_dump_dir_path, i)
+            testcase_num += 1
+            if report_pipeline is not None:
+                report_pipeline.submit(testcase_dump_dir_path)
+
+        self.end_reused_instance()
+        if report_pipeline is not None:
+            report_pipeline.close()
+        self.report_throughput(testcase_num, monotonic() - start_time, dump_dir_path)
+        save_trace(self.tracer, dump_dir_path)
 
     def run_test_repeated(self,
                           test_name: str,
@@ -368,6 +783,7 @@ class Testbed:
 
         ########## Enumerate the testcases ##########
         
+        self.tracer = Tracer()
         for i in range(0,repeated_num):
 
             print(f"======= Running testcase {i+1} =======")
@@ -381,6 +797,8 @@ class Testbed:
                 # `testcase_id` is defined here
                 testcase_id=f"{test_name_with_time}_execution-{i+1}"
             )
+
+        save_trace(self.tracer, dump_path)
     
     def run_test_playground(self,
                             testcase: TestCase,
@@ -409,10 +827,138 @@ class Testbed:
             testcase_id=testcase_id,
         )
 
+    def run_test_replay(self,
+                        testcase: TestCase,
+                        test_name: str):
+        """
+        Replay a recorded session (see `testcase_factory.replay_testcase_factory`).
+        The testcase is expected to use `SendMode.TIMED`.
+
+        `test_name`: The name of the test.
+        """
+
+        ########## Prepare the directory for dumping ##########
+
+        testcase_id = f"{test_name}_{get_current_time()}"
+        dump_path = f"{REPO_ROOT_PATH}/{TESTCASE_DUMP_REPLAY}/{testcase_id}"
+        assert not directory_exists(dump_path)
+        create_dir(dump_path)
+
+        allow_user_access(dump_path)
+
+        ########## Run the test ##########
+
+        self.single_test_inner(
+            testcase=testcase,
+            dump_path=dump_path,
+            testcase_id=testcase_id,
+        )
+
+    def run_test_multi_session(self,
+                               session_configs: list[BGPSessionConfiguration],
+                               test_name: str,
+                               session_veth: str = None,
+                               session_prefix_len: int = 24,
+                               hold_duration: float = 5):
+        """
+        Run the schedules of many simulated BGP sessions concurrently against the router.
+
+        `session_configs`: The configurations of the sessions,
+        the router agent configuration must contain a neighbor for each session.
+        `test_name`: The name of the test.
+        `session_veth`: If set, the addresses of the sessions are assigned to this interface
+        (inside the namespace of each session) before connecting.
+        `hold_duration`: How long (in seconds) the sessions are kept after their schedules are sent.
+        """
+
+        ########## Prepare the directory for dumping ##########
+
+        testcase_id = f"{test_name}_{get_current_time()}"
+        dump_path = f"{REPO_ROOT_PATH}/{TESTCASE_DUMP_MULTI_SESSION}/{testcase_id}"
+        assert not directory_exists(dump_path)
+        create_dir(dump_path)
+
+        allow_user_access(dump_path)
+
+        ########## Assign the addresses of the sessions ##########
+
+        if session_veth is not None:
+            for session_config in session_configs:
+                execute_under_namespace(
+                    assign_prefix_to_interface(f"{session_config.bind_ip}/{session_prefix_len}",
+                                               session_veth),
+                    namespace=session_config.netns
+                )
+
+        ########## Start the routing software instance and the observer ##########
+
+        self.router_agent.mark_log()
+        self.exabgp_agent.mark_log()
+        if self.bmp_agent is not None:
+            self.bmp_agent.mark()
+        self.router_agent.start_bgp_instance()
+        self.router_agent.wait_for_log() # Start the clients one by one.
+        self.exabgp_agent.start()
+        self.router_agent.wait_for_log() # Start the clients one by one.
+
+        ########## Run the sessions ##########
+
+        multi_session_agent = MultiSessionAgent(session_configs,
+                                                hold_duration=hold_duration)
+        session_results = multi_session_agent.run()
+        self.router_agent.wait_for_log() # Wait the state to become stable.
+
+        ########## Dumping BGP logs and session results ##########
+
+        # Wait for the ExaBGP log to be ready
+        self.wait_for_propagation()
+
+        self.router_agent.dump_log(f"{dump_path}/{BGPD_LOG_FILE}")
+        self.exabgp_agent.dump_log(f"{dump_path}/{EXABGP_LOG_FILE}")
+        if self.bmp_agent is not None:
+            self.bmp_agent.dump_since_mark(f"{dump_path}/{BMP_RECORD_FILE}")
+        create_file(f"{dump_path}/{SESSION_RESULT_FILE}",
+                    "".join(json.dumps(asdict(result)) + "\n" for result in session_results))
+        create_file(f"{dump_path}/{ROUTER_CONFIG_TXT_FILE}",
+                    self.router_agent_config.get_string_expression())
+        established_num = sum(result.established for result in session_results)
+        print(f"{established_num}/{len(session_results)} sessions established.")
+
+        ########## Deal with software crashes ##########
+
+        if self.router_agent.if_crashed():
+            print("Software crashed!")
+            create_file(f"{dump_path}/{CRASH_MARKER_FILE}", "1")
+
+        ########## Clear the test pipeline ##########
+
+        self.exabgp_agent.end()
+        self.router_agent.end_bgp_instance()
+        self.router_agent.restart_software()
+
+    def get_crash_signature(self) -> CrashSignature:
+        """
+        Compute the signature of the crash from the log of the router and the last message sent.
+        """
+        field_path = None
+        if self.last_sent_message is not None and self.last_sent_message.message_bfn is None:
+            print("WARNING: The last message sent has no BFN tree (e.g., read from a corpus), "
+                  "the mutated field is not in the crash signature! "
+                  "Generate the test batch with `corpus=False` to keep the BFN trees.")
+        elif self.last_sent_message is not None:
+            message_testcase = TestCase([self.last_sent_message])
+            mutated_paths = get_mutated_paths(message_testcase)
+            if mutated_paths:
+                field_path = get_field_path(message_testcase, mutated_paths[-1])
+        return get_crash_signature(self.router_agent_config.router_type.name,
+                                   self.router_agent.get_log_tail(CRASH_LOG_LINE_NUM),
+                                   field_path)
+
     def save_crash_setting(self,
                            router_agent_config: RouterAgentConfiguration,
                            testcase: TestCase,
-                           name: str = None):
+                           name: str = None,
+                           signature: CrashSignature = None):
         """
         Save the test setting causing crash.
         """
@@ -430,3 +976,6 @@ class Testbed:
                     router_agent_config.get_string_expression())
         create_file(f"{dump_path}/{TESTCASE_TXT_FILE}",
                     testcase.get_string_expression())
+        if signature is not None:
+            create_file(f"{dump_path}/{CRASH_SIGNATURE_FILE}",
+                        signature.get_string_expression())
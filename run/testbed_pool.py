@@ -0,0 +1,370 @@
+# This file defines the worker pool running a test batch on several isolated testbeds in parallel.
+
+# Each worker owns a full copy of the virtual network (see `vnet_config.py`):
+# - A bridge, and the namespaces of the router software, the tester and the ExaBGP observer.
+# - A router instance launched inside its own namespace.
+# Since every worker is isolated by namespaces, all the workers use the same addresses.
+# The testcases are dispatched to the workers through a shared queue,
+# and every worker dumps into the same dump tree (`testcase_{i+1}` as in `Testbed.run_test_batch`).
+# The workers append the finished testcases to the shared progress manifest, so the run can be resumed.
+
+import multiprocessing, queue, os, json
+from collections import deque
+from time import monotonic
+from basic_utils.selection_utils import TestcaseSelection
+from basic_utils.progress_utils import ProgressManifest
+from basic_utils.trace_utils import Tracer
+from basic_utils.file_utils import *
+from basic_utils.const import *
+from test_agents.tcp_agent import TCPAgentConfiguration
+from test_agents.router_agent import RouterAgentConfiguration, RouterAgentType, Neighbor, get_router_agent
+from test_agents.exabgp_agent import ExaBGPAgentConfiguration, generate_exabgp_config
+from network_utils.utils import get_ipv4_prefix_parts
+from vnet_config import set_up_vnet, tear_down_vnet
+from run.report_pipeline import ReportPipeline
+from testcase_factory.corpus import open_test_batch
+from testbed import Testbed, THROUGHPUT_FILE, get_batch_dump_dir, prepare_testcase_dump_dir, record_testcase_progress, save_trace
+
+# The cores used by a worker: one for the router software, one for the harness and ExaBGP.
+CORES_PER_WORKER = 2
+# The interval (in seconds) of checking the progress manifest for the testcases to analyze.
+REPORT_POLL_INTERVAL = 1
+
+def get_worker_num(max_worker_num: int = None) -> int:
+    """
+    Size the worker pool by the cores available to this process.
+    """
+    worker_num = max(len(os.sched_getaffinity(0)) // CORES_PER_WORKER, 1)
+    if max_worker_num is not None:
+        worker_num = min(worker_num, max_worker_num)
+    return worker_num
+
+def derive_worker_vnet_config(vnet_config: dict, worker_id: int) -> dict:
+    """
+    Derive the virtual network of the worker from `VNET_CONFIG`.
+    The names of the bridge, veths and namespaces are suffixed with the worker ID,
+    and the router software is moved into its own namespace.
+    """
+    suffix = f"-w{worker_id}"
+    return {
+        "bridge": vnet_config["bridge"] + suffix,
+        "router_software": {
+            "namespace": f"ns-rtr{suffix}",
+            "ip": vnet_config["router_software"]["ip"],
+            "veth": vnet_config["router_software"]["veth"] + suffix,
+        },
+        "clients": [
+            {
+                "namespace": client["namespace"] + suffix,
+                "ip": client["ip"],
+                "veth": client["veth"] + suffix,
+            } for client in vnet_config["clients"]
+        ],
+    }
+
+class TestbedPool:
+    """
+    Run the testcases of a batch on `worker_num` isolated testbeds in parallel.
+    The router agent must support multiple instances (see `BaseRouterAgent.MULTI_INSTANCE`).
+    """
+    @staticmethod
+    def is_supported(router_type: RouterAgentType) -> bool:
+        """
+        Check if the routing software can be launched once per worker.
+        """
+        return get_router_agent(RouterAgentConfiguration(router_type=router_type)).MULTI_INSTANCE
+
+    def __init__(self,
+                 vnet_config: dict,
+                 router_type: RouterAgentType,
+                 router_agent_asn: int,
+                 tester_agent_asn: int,
+                 exabgp_agent_asn: int,
+                 worker_num: int = None,
+                 session_reuse: bool = False):
+        """
+        `vnet_config`: The virtual network of a single testbed (i.e., `VNET_CONFIG`).
+        `worker_num`: The number of workers, `None` to size by the available cores.
+        """
+        self.vnet_config = vnet_config
+        self.router_type = router_type
+        self.router_agent_asn = router_agent_asn
+        self.tester_agent_asn = tester_agent_asn
+        self.exabgp_agent_asn = exabgp_agent_asn
+        self.session_reuse = session_reuse
+        self.worker_num = get_worker_num() if worker_num is None else worker_num
+        # Whether the workers save the crashing testcases (see `Testbed.save_crashes`).
+        self.save_crashes = True
+
+    def get_worker_testbed(self, worker_id: int) -> Testbed:
+        """
+        Build the testbed of the worker on its own virtual network.
+        """
+        suffix = f"-w{worker_id}"
+        worker_vnet_config = derive_worker_vnet_config(self.vnet_config, worker_id)
+        router_software = worker_vnet_config["router_software"]
+        tester_agent = worker_vnet_config["clients"][0]
+        exabgp_agent = worker_vnet_config["clients"][1]
+        router_agent_ip, _ = get_ipv4_prefix_parts(router_software["ip"])
+        tester_agent_ip, _ = get_ipv4_prefix_parts(tester_agent["ip"])
+        exabgp_agent_ip, _ = get_ipv4_prefix_parts(exabgp_agent["ip"])
+
+        exabgp_config_path = f"{REPO_ROOT_PATH}/config/exabgp{suffix}.conf"
+        generate_exabgp_config(peer_ip_addr=router_agent_ip,
+                               peer_asn=self.router_agent_asn,
+                               local_ip_addr=exabgp_agent_ip,
+                               local_asn=self.exabgp_agent_asn,
+                               output_file=exabgp_config_path)
+        testbed = Testbed(
+            tcp_agent_config=TCPAgentConfiguration(host=router_agent_ip,
+                                                   port=179,
+                                                   bind_val=(tester_agent_ip, 0),
+                                                   netns=tester_agent["namespace"]),
+            router_agent_config=RouterAgentConfiguration(
+                asn=self.router_agent_asn,
+                router_id=router_agent_ip,
+                neighbors=[
+                    Neighbor(
+                        peer_ip=tester_agent_ip,
+                        peer_asn=self.tester_agent_asn,
+                        local_source=router_software["veth"]
+                    ),
+                    Neighbor(
+                        peer_ip=exabgp_agent_ip,
+                        peer_asn=self.exabgp_agent_asn,
+                        local_source=router_software["veth"]
+                    ),
+                ],
+                router_type=self.router_type,
+                namespace=router_software["namespace"],
+            ),
+            exabgp_agent_config=ExaBGPAgentConfiguration(
+                namespace=exabgp_agent["namespace"],
+                config_path=exabgp_config_path,
+                log_path=f"{REPO_ROOT_PATH}/data/exabgp{suffix}.log",
+            ),
+            session_reuse=self.session_reuse,
+        )
+        testbed.save_crashes = self.save_crashes
+        return testbed
+
+    def run_worker(self,
+                   worker_id: int,
+                   testcase_list: list,
+                   index_queue: multiprocessing.Queue,
+                   result_queue: multiprocessing.Queue,
+                   dump_dir_path: str,
+                   test_name_with_time: str,
+                   manifest: ProgressManifest):
+        """
+        The main function of a worker process.
+        Take the testcase indices from `index_queue` until it is empty.
+        """
+        worker_vnet_config = derive_worker_vnet_config(self.vnet_config, worker_id)
+        testcase_num = 0
+        testbed = None
+        try:
+            set_up_vnet(worker_vnet_config)
+            testbed = self.get_worker_testbed(worker_id)
+            while True:
+                i = index_queue.get()
+                if i is None:
+                    break
+                print(f"======= Running testcase {i+1} on worker {worker_id} =======")
+                testcase_dump_dir_path, testcase_id = prepare_testcase_dump_dir(dump_dir_path, test_name_with_time, i)
+                try:
+                    testbed.single_test_inner(
+                        testcase=testcase_list[i],
+                        dump_path=testcase_dump_dir_path,
+                        testcase_id=testcase_id
+                    )
+                except Exception as e:
+                    print(f"Worker {worker_id} failed on testcase {i+1}: {e}")
+                    continue
+                record_testcase_progress(manifest, testcase_dump_dir_path, i)
+                testcase_num += 1
+            testbed.end_reused_instance()
+        finally:
+            tear_down_vnet(worker_vnet_config)
+            result_queue.put({
+                "worker_id": worker_id,
+                "testcase_num": testcase_num,
+                "full_restart_num": testbed.full_restart_count if testbed is not None else 0,
+                # Merged into the trace of the run by the main process.
+                "trace_events": testbed.tracer.events if testbed is not None else [],
+            })
+
+    def get_workers(self,
+                    testcase_list: list,
+                    pending_indices: list[int],
+                    worker_num: int,
+                    dump_dir_path: str,
+                    test_name_with_time: str,
+                    manifest: ProgressManifest) -> tuple[list[multiprocessing.Process], multiprocessing.Queue]:
+        """
+        Create (without starting) the worker processes running the pending testcases,
+        and the queue of their results.
+        """
+        context = multiprocessing.get_context("fork")
+        index_queue = context.Queue()
+        result_queue = context.Queue()
+        for i in pending_indices:
+            index_queue.put(i)
+        for _ in range(worker_num):
+            index_queue.put(None)
+        workers = [
+            context.Process(target=self.run_worker,
+                            args=(worker_id,
+                                  testcase_list,
+                                  index_queue,
+                                  result_queue,
+                                  dump_dir_path,
+                                  test_name_with_time,
+                                  manifest))
+            for worker_id in range(worker_num)
+        ]
+        return workers, result_queue
+
+    def wait_for_workers(self,
+                         workers: list[multiprocessing.Process],
+                         result_queue: multiprocessing.Queue,
+                         poll = None) -> list[dict]:
+        """
+        Collect the results of the workers, and join them.
+        A worker exited without reporting (e.g., killed by a signal) is no longer waited for.
+        `poll`: Called every `REPORT_POLL_INTERVAL` seconds while waiting.
+        """
+        worker_results = {}
+        lost_worker_ids = set()
+        while len(worker_results) + len(lost_worker_ids) < len(workers):
+            try:
+                result = result_queue.get(timeout=REPORT_POLL_INTERVAL)
+                worker_results[result["worker_id"]] = result
+            except queue.Empty:
+                exited_worker_ids = [worker_id for worker_id, worker in enumerate(workers)
+                                     if not worker.is_alive()
+                                     and worker_id not in worker_results and worker_id not in lost_worker_ids]
+                # The result may have been sent right before the exit.
+                while exited_worker_ids:
+                    try:
+                        result = result_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    worker_results[result["worker_id"]] = result
+                for worker_id in exited_worker_ids:
+                    if worker_id not in worker_results:
+                        print(f"Worker {worker_id} exited without reporting (exit code {workers[worker_id].exitcode})!")
+                        lost_worker_ids.add(worker_id)
+            if poll is not None:
+                poll()
+        for worker in workers:
+            worker.join()
+        return list(worker_results.values())
+
+    def run_testcases(self,
+                      testcase_list: list,
+                      dump_dir_path: str,
+                      test_name_with_time: str) -> list[bool]:
+        """
+        Run the testcases (e.g., the candidates of the minimizer) on the worker pool,
+        dumping into `dump_dir_path` as `Testbed.run_test_batch` does.
+        Return whether each testcase crashed, a testcase failed on its worker is regarded as not crashed.
+        """
+        create_dir(dump_dir_path)
+        allow_user_access(dump_dir_path)
+        manifest = ProgressManifest(dump_dir_path)
+        manifest.start(test_name_with_time, len(testcase_list))
+        worker_num = max(min(self.worker_num, len(testcase_list)), 1)
+        workers, result_queue = self.get_workers(testcase_list, list(range(len(testcase_list))), worker_num,
+                                                 dump_dir_path, test_name_with_time, manifest)
+        for worker in workers:
+            worker.start()
+        self.wait_for_workers(workers, result_queue)
+        crashed = {entry["index"]: entry.get("crashed", False) for entry in manifest.read() if "index" in entry}
+        return [crashed.get(i, False) for i in range(len(testcase_list))]
+
+    def run_test_batch(self,
+                       test_batch_name: str,
+                       test_name: str,
+                       resume: str = None,
+                       analyze: bool = False,
+                       selection: TestcaseSelection = None):
+        """
+        Run the test batch on the worker pool, and dump the result into one dump tree.
+        The layout of the dump tree is the same as `Testbed.run_test_batch`.
+
+        `test_batch_name`: The name of the file containing the generated testcases.
+        `test_name`: The name of the test.
+        `resume`: The run to resume (see `get_batch_dump_dir`), the finished testcases are skipped.
+        `analyze`: Whether to generate the reports of the testcases while the batch is running (see `ReportPipeline`).
+        The workers finish the testcases out of order, a report is submitted once all the testcases before it are finished.
+        `selection`: The testcases to run, numbered from 1 as in the dump directory. All the testcases by default.
+        """
+
+        ######### Prepare the directory for dumping #########
+
+        test_name_with_time, dump_dir_path = get_batch_dump_dir(test_name, resume)
+
+        allow_user_access(dump_dir_path)
+
+        ########## Dispatch the testcases ##########
+
+        # The reader of the batch is inherited by the forked workers, only the indices are sent,
+        # and each worker reads the testcases it runs.
+        testcase_list = open_test_batch(test_batch_name)
+        if selection is None:
+            selection = TestcaseSelection()
+        manifest = ProgressManifest(dump_dir_path)
+        manifest.start(test_batch_name, len(testcase_list))
+        finished_indices = manifest.get_finished_indices()
+        pending_indices = [number - 1 for number in selection.get_numbers(len(testcase_list), first=1)
+                           if number - 1 not in finished_indices]
+        worker_num = max(min(self.worker_num, len(pending_indices)), 1)
+        print(f"Running {len(pending_indices)} testcases on {worker_num} workers "
+              f"({len(finished_indices)} finished testcases skipped).")
+
+        start_time = monotonic()
+        workers, result_queue = self.get_workers(testcase_list, pending_indices, worker_num,
+                                                 dump_dir_path, test_name_with_time, manifest)
+        report_pipeline = ReportPipeline(test_name_with_time) if analyze else None
+        report_indices = deque(pending_indices)
+
+        def submit_reports(finished_indices: set[int], wait: bool = False):
+            """
+            Submit the reports of the finished testcases in order.
+            If `wait` is not set, stop at the first unfinished testcase.
+            """
+            while report_indices and (wait or report_indices[0] in finished_indices):
+                i = report_indices.popleft()
+                if i in finished_indices:
+                    report_pipeline.submit(f"{dump_dir_path}/testcase_{i+1}")
+
+        for worker in workers:
+            worker.start()
+        worker_results = self.wait_for_workers(
+            workers, result_queue,
+            poll=(lambda: submit_reports(manifest.get_finished_indices())) if report_pipeline is not None else None)
+        if report_pipeline is not None:
+            # The testcases failed on the workers are not recorded, and thus not analyzed.
+            submit_reports(manifest.get_finished_indices(), wait=True)
+            report_pipeline.close()
+        elapsed_time = monotonic() - start_time
+
+        ########## Merge the results ##########
+
+        allow_user_access(dump_dir_path)
+        trace_events = [event for result in worker_results for event in result.pop("trace_events")]
+        save_trace(Tracer(), dump_dir_path, trace_events)
+        testcase_num = sum(result["testcase_num"] for result in worker_results)
+        throughput = {
+            "session_reuse": self.session_reuse,
+            "worker_num": worker_num,
+            "testcase_num": testcase_num,
+            "elapsed_time": elapsed_time,
+            "testcases_per_hour": testcase_num * 3600 / elapsed_time if elapsed_time > 0 else 0,
+            "full_restart_num": sum(result["full_restart_num"] for result in worker_results),
+            "workers": sorted(worker_results, key=lambda result: result["worker_id"]),
+        }
+        print(f"{testcase_num} testcases in {elapsed_time:.1f}s on {worker_num} workers "
+              f"({throughput['testcases_per_hour']:.1f} testcases/hour).")
+        create_file(f"{dump_dir_path}/{THROUGHPUT_FILE}", json.dumps(throughput, indent=2))
@@ -0,0 +1,319 @@
+"""
+This file defines the BMP (RFC 7854) collector observing the routing software.
+
+The router streams its Adj-RIB-In (pre/post-policy) and Loc-RIB (RFC 9069) changes, peer up/down events
+and statistics to the collector, which turns them into structured records in real time,
+instead of scraping the logs and polling the MRT dumps.
+The collector runs an asyncio server in a background thread, the records are marked and dumped per testcase,
+like the logs of the other agents.
+"""
+
+import asyncio, json, socket, struct, threading
+from dataclasses import dataclass
+from time import monotonic, time
+from basic_utils.binary_utils import bytes2hexstr
+
+# The default port of the collector (the one used in the examples of GoBGP).
+BMP_PORT = 11019
+BMP_VERSION = 3
+# Version (1), length (4), type (1)
+BMP_COMMON_HEADER_FORMAT = "!BIB"
+BMP_COMMON_HEADER_LEN = struct.calcsize(BMP_COMMON_HEADER_FORMAT)
+# Peer type (1), flags (1), distinguisher (8), address (16), AS (4), BGP ID (4), timestamp (4+4)
+BMP_PER_PEER_HEADER_FORMAT = "!BB8s16sI4sII"
+BMP_PER_PEER_HEADER_LEN = struct.calcsize(BMP_PER_PEER_HEADER_FORMAT)
+BGP_HEADER_LEN = 19
+
+BMP_MESSAGE_TYPES = {
+    0: "route_monitoring",
+    1: "stats_report",
+    2: "peer_down",
+    3: "peer_up",
+    4: "initiation",
+    5: "termination",
+    6: "route_mirroring",
+}
+BMP_PEER_TYPES = {0: "global", 1: "rd", 2: "local", 3: "loc_rib"}
+BMP_PEER_FLAG_V = 0x80
+BMP_PEER_FLAG_L = 0x40
+BMP_PEER_FLAG_A = 0x20
+BMP_PEER_DOWN_REASONS = {
+    1: "local_notification",
+    2: "local_no_notification",
+    3: "remote_notification",
+    4: "remote_no_notification",
+    5: "peer_deconfigured",
+    6: "local_system_closed",
+}
+BMP_STATS_TYPES = {
+    0: "rejected_prefixes",
+    1: "duplicate_prefix_advertisements",
+    2: "duplicate_withdraws",
+    3: "invalidated_cluster_list_loop",
+    4: "invalidated_as_path_loop",
+    5: "invalidated_originator_id",
+    6: "invalidated_as_confed_loop",
+    7: "adj_rib_in_routes",
+    8: "loc_rib_routes",
+    11: "updates_treated_as_withdraw",
+    12: "prefixes_treated_as_withdraw",
+    13: "duplicate_update_messages",
+}
+BMP_INFO_TYPES = {0: "string", 1: "sys_descr", 2: "sys_name"}
+
+########## Parsing ##########
+
+def parse_bmp_address(address: bytes, is_ipv6: bool) -> str:
+    """
+    Parse the 16-octet address field (IPv4 addresses are in the last 4 octets).
+    """
+    if is_ipv6:
+        return socket.inet_ntop(socket.AF_INET6, address)
+    return socket.inet_ntop(socket.AF_INET, address[12:])
+
+def parse_ipv4_prefixes(data: bytes) -> list[str]:
+    """
+    Parse the IPv4 prefixes of the withdrawn routes or the NLRI of an UPDATE message.
+    A truncated prefix ends the parsing.
+    """
+    prefixes = []
+    offset = 0
+    while offset < len(data):
+        prefix_len = data[offset]
+        octet_num = (prefix_len + 7) // 8
+        if prefix_len > 32 or offset + 1 + octet_num > len(data):
+            prefixes.append(f"<malformed:{bytes2hexstr(data[offset:])}>")
+            break
+        address = data[offset+1:offset+1+octet_num] + b'\0' * (4 - octet_num)
+        prefixes.append(f"{socket.inet_ntop(socket.AF_INET, address)}/{prefix_len}")
+        offset += 1 + octet_num
+    return prefixes
+
+def parse_update(message: bytes) -> dict:
+    """
+    Parse the IPv4 withdrawn routes and NLRI of a BGP UPDATE message, the attributes are kept as wire bytes.
+    """
+    body = message[BGP_HEADER_LEN:]
+    try:
+        withdrawn_len = struct.unpack_from("!H", body, 0)[0]
+        withdrawn = body[2:2+withdrawn_len]
+        attr_len = struct.unpack_from("!H", body, 2 + withdrawn_len)[0]
+        attributes = body[4+withdrawn_len:4+withdrawn_len+attr_len]
+        nlri = body[4+withdrawn_len+attr_len:]
+    except struct.error:
+        return {"malformed": True, "update": bytes2hexstr(message)}
+    return {
+        "withdrawn": parse_ipv4_prefixes(withdrawn),
+        "nlri": parse_ipv4_prefixes(nlri),
+        "attributes": bytes2hexstr(attributes),
+    }
+
+def parse_info_tlvs(data: bytes, names: dict) -> dict:
+    """
+    Parse the information TLVs (of the initiation, termination and peer up messages).
+    """
+    info = {}
+    offset = 0
+    while offset + 4 <= len(data):
+        tlv_type, tlv_len = struct.unpack_from("!HH", data, offset)
+        value = data[offset+4:offset+4+tlv_len]
+        info[names.get(tlv_type, f"type_{tlv_type}")] = value.decode(errors="replace")
+        offset += 4 + tlv_len
+    return info
+
+def parse_stats(data: bytes) -> dict:
+    """
+    Parse the counters of a statistics report.
+    """
+    stats = {}
+    count = struct.unpack_from("!I", data, 0)[0]
+    offset = 4
+    for _ in range(count):
+        if offset + 4 > len(data):
+            break
+        stat_type, stat_len = struct.unpack_from("!HH", data, offset)
+        value = data[offset+4:offset+4+stat_len]
+        name = BMP_STATS_TYPES.get(stat_type, f"type_{stat_type}")
+        stats[name] = int.from_bytes(value, "big") if stat_len in (4, 8) else bytes2hexstr(value)
+        offset += 4 + stat_len
+    return stats
+
+def parse_bmp_message(message: bytes) -> dict:
+    """
+    Parse a BMP message (including its common header) into a record.
+    """
+    _, _, message_type = struct.unpack_from(BMP_COMMON_HEADER_FORMAT, message, 0)
+    record = {"type": BMP_MESSAGE_TYPES.get(message_type, f"type_{message_type}")}
+    data = message[BMP_COMMON_HEADER_LEN:]
+    if message_type in (4, 5):
+        record["info"] = parse_info_tlvs(data, BMP_INFO_TYPES if message_type == 4 else {0: "string", 1: "reason"})
+        return record
+    peer_type, flags, _, address, peer_as, bgp_id, ts_sec, ts_usec = \
+        struct.unpack_from(BMP_PER_PEER_HEADER_FORMAT, data, 0)
+    record["peer"] = {
+        "type": BMP_PEER_TYPES.get(peer_type, peer_type),
+        "address": parse_bmp_address(address, bool(flags & BMP_PEER_FLAG_V)),
+        "asn": peer_as,
+        "bgp_id": socket.inet_ntop(socket.AF_INET, bgp_id),
+        # Loc-RIB (RFC 9069) uses the L flag for filtered routes.
+        "post_policy": bool(flags & BMP_PEER_FLAG_L),
+        "timestamp": ts_sec + ts_usec / 1e6,
+    }
+    data = data[BMP_PER_PEER_HEADER_LEN:]
+    match message_type:
+        case 0:
+            record.update(parse_update(data))
+        case 1:
+            record["stats"] = parse_stats(data)
+        case 2:
+            reason = data[0] if data else 0
+            record["reason"] = BMP_PEER_DOWN_REASONS.get(reason, reason)
+            record["data"] = bytes2hexstr(data[1:])
+        case 3:
+            record["local_address"] = parse_bmp_address(data[:16], bool(flags & BMP_PEER_FLAG_V))
+            record["local_port"], record["remote_port"] = struct.unpack_from("!HH", data, 16)
+        case _:
+            record["data"] = bytes2hexstr(data)
+    return record
+
+########## Collector ##########
+
+@dataclass
+class BMPAgentConfiguration:
+    """
+    The configuration of the BMP collector.
+    The routers connect to `host:port` (see `BMPStation` of the router agent configuration).
+    """
+    host : str = "127.0.0.1"
+    port : int = BMP_PORT
+
+class BMPAgent:
+    """
+    The BMP collector, running an asyncio server in a background thread.
+    """
+    def __init__(self, configuration: BMPAgentConfiguration):
+        self.configuration = configuration
+        self.loop : asyncio.AbstractEventLoop = None
+        self.server : asyncio.AbstractServer = None
+        self.thread : threading.Thread = None
+        self.started = threading.Event()
+        # The records since the last mark, guarded by the condition.
+        self.records : list[dict] = []
+        self.condition = threading.Condition()
+        # When the last record was received (as `monotonic()`), `None` if no record has been received.
+        self.last_update_time : float = None
+
+    def start(self):
+        """
+        Start the collector, and wait until it listens.
+        """
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.run_loop, daemon=True)
+        self.thread.start()
+        self.started.wait()
+
+    def run_loop(self):
+        """
+        The main function of the collector thread.
+        """
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self.handle_router, self.configuration.host, self.configuration.port,
+                                     reuse_address=True))
+        except OSError as e:
+            print(f"Failed to start the BMP collector on {self.configuration.host}:{self.configuration.port}: {e}")
+            self.started.set()
+            return
+        self.started.set()
+        self.loop.run_forever()
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    async def handle_router(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Read the BMP messages of a router connection until it is closed.
+        """
+        router = writer.get_extra_info("peername")[0]
+        try:
+            while True:
+                header = await reader.readexactly(BMP_COMMON_HEADER_LEN)
+                version, length, _ = struct.unpack(BMP_COMMON_HEADER_FORMAT, header)
+                if version != BMP_VERSION or length < BMP_COMMON_HEADER_LEN:
+                    print(f"Unexpected BMP message (version {version}, length {length}) from {router}!")
+                    break
+                message = header + await reader.readexactly(length - BMP_COMMON_HEADER_LEN)
+                try:
+                    record = parse_bmp_message(message)
+                except (struct.error, IndexError, ValueError):
+                    record = {"type": "malformed", "data": bytes2hexstr(message)}
+                self.add_record({"time": time(), "router": router, **record})
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def add_record(self, record: dict):
+        """
+        Add a record, and wake up the waiters.
+        """
+        with self.condition:
+            self.records.append(record)
+            self.last_update_time = monotonic()
+            self.condition.notify_all()
+
+    def mark(self):
+        """
+        Mark the beginning of a testcase, the records received so far are dropped.
+        """
+        with self.condition:
+            self.records = []
+
+    def get_records(self, record_type: str = None) -> list[dict]:
+        """
+        Get the records received since the mark, optionally of a single type (e.g., `route_monitoring`).
+        """
+        with self.condition:
+            return [record for record in self.records if record_type is None or record["type"] == record_type]
+
+    def wait_for_idle(self, idle_window: float, timeout: float = None) -> bool:
+        """
+        Wait until no record is received for `idle_window` seconds (e.g., before dumping the records).
+        Return `False` if the records are still coming after `timeout` seconds.
+        """
+        start_time = monotonic()
+        with self.condition:
+            while True:
+                now = monotonic()
+                last_update_time = max(start_time, self.last_update_time or start_time)
+                if now - last_update_time >= idle_window:
+                    return True
+                if timeout is not None and now - start_time >= timeout:
+                    return False
+                remaining = idle_window - (now - last_update_time)
+                if timeout is not None:
+                    remaining = min(remaining, timeout - (now - start_time))
+                self.condition.wait(remaining)
+
+    def dump_since_mark(self, path: str):
+        """
+        Dump the records received since the mark into the JSONL file.
+        """
+        with open(path, 'w') as f:
+            for record in self.get_records():
+                f.write(json.dumps(record) + "\n")
+
+    def end(self):
+        """
+        Stop the collector.
+        """
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+        self.thread = None
+        self.loop = None
+        self.started.clear()
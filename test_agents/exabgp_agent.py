@@ -5,9 +5,11 @@ This file defines the agent observing the behavior of the routing software.
 from configparser import ConfigParser
 from dataclasses import dataclass
 from basic_utils.const import REPO_ROOT_PATH
+from basic_utils.log_tail_utils import LogTailer, LOG_IDLE_WINDOW
 import re, subprocess, os, signal, atexit
 
 EXA_BGP_LOG = f"{REPO_ROOT_PATH}/data/exabgp.log"
+EXA_BGP_CONF = f"{REPO_ROOT_PATH}/config/exabgp.conf"
 
 # This function is currently unused.
 def parse_exabgp_config(file_path):
@@ -85,6 +87,9 @@ class ExaBGPAgentConfiguration:
     """
     # the namespace used by the ExaBGP agent
     namespace : str
+    # the configuration file (see `generate_exabgp_config`) and the log of the ExaBGP agent
+    config_path : str = EXA_BGP_CONF
+    log_path : str = EXA_BGP_LOG
 
 class ExaBGPAgent:
     """
@@ -94,6 +99,7 @@ class ExaBGPAgent:
     def __init__(self, configuration : ExaBGPAgentConfiguration):
         self.configuration = configuration
         self.process = None
+        self.log_tailer = LogTailer(self.configuration.log_path)
 
     def start(self):
         """
@@ -116,9 +122,9 @@ class ExaBGPAgent:
             # You should replace this place with your own user home
             site_package_path = site_package_path.replace("/root", "/home/xinpeilin", 1)
 
-        os.system(f"sudo rm {EXA_BGP_LOG}")
+        os.system(f"sudo rm {self.configuration.log_path}")
         process = subprocess.Popen(
-            f"sudo ip netns exec {self.configuration.namespace} env PYTHONPATH={site_package_path} {exabgp_path} {REPO_ROOT_PATH}/config/exabgp.conf --debug > {EXA_BGP_LOG}",
+            f"sudo ip netns exec {self.configuration.namespace} env PYTHONPATH={site_package_path} {exabgp_path} {self.configuration.config_path} --debug > {self.configuration.log_path}",
             shell=True,
             stdout=subprocess.PIPE,
             preexec_fn=os.setsid
@@ -137,23 +143,43 @@ class ExaBGPAgent:
         """
         Read the content from the ExaBGP agent's log.
         """
-        with open(EXA_BGP_LOG, 'r') as file:
-            content = file.read()
-        return content
+        return self.log_tailer.read_all()
+
+    def wait_for_log(self, idle_window: float = LOG_IDLE_WINDOW, timeout: float = None) -> bool:
+        """
+        Wait until no new bytes are appended to the ExaBGP agent's log for `idle_window` seconds.
+        Return `False` if the log is still updating after `timeout` seconds.
+        """
+        return self.log_tailer.wait_for_idle(idle_window, timeout)
+
+    def mark_log(self):
+        """
+        Mark the current end of the ExaBGP agent's log, the following `dump_log` starts from here.
+        """
+        self.log_tailer.mark()
+
+    def dump_log(self, path: str):
+        """
+        Copy the ExaBGP agent's log appended since `mark_log` into the file `path`.
+        The log is recreated on `start`, in this case the whole log is copied.
+        """
+        self.log_tailer.dump_since_mark(path)
 
     def clear_log(self):
         """
         Clear the content from the ExaBGP agent's log.
         """
-        with open(EXA_BGP_LOG, 'w') as file:
+        with open(self.configuration.log_path, 'w') as file:
             file.write('')
+        self.log_tailer.reset()
         return
 
     def __del__(self):
         """
         Destructor to ensure proper cleanup
+        Only the ExaBGP instance using the configuration file of this agent is killed.
         """
-        os.system("sudo pkill -f exabgp")
+        os.system(f"sudo pkill -f {self.configuration.config_path}")
 
 #################### Deprecated ####################
 
@@ -0,0 +1,258 @@
+"""
+This file defines the multi-session agent of BGProbe.
+The agent simulates many BGP peers, and drives all the sessions from a single asyncio event loop.
+"""
+
+import asyncio, ipaddress, socket, time
+from copy import deepcopy
+from dataclasses import dataclass, field
+from typing import Callable
+from bgp_toolkit.bgp_toolkit_configuration import BGPToolkitConfiguration
+from bgp_toolkit.message import MessageType, OpenMessage_BFN, OpenMessage, KeepAliveMessage_BFN, KeepAliveMessage
+from bgp_toolkit.wire_utils import BGP_HEADER_LEN, get_message_length, get_message_type_val, get_open_hold_time
+from network_utils.netns_utils import create_socket_in_netns
+from testcase_factory.basic_types import Halt, TestCase, SocketOption
+from test_agents.router_agent import Neighbor
+
+@dataclass
+class BGPSessionConfiguration:
+    """
+    This class is used to configure a single simulated BGP session.
+    """
+    # the configuration used to build the OPEN message of the session
+    bgp_config : BGPToolkitConfiguration
+    # the ip address of the router software
+    host : str
+    # the ip address the session binds to
+    bind_ip : str
+    # the messages sent after the OPEN and KEEPALIVE messages
+    schedule : TestCase = field(default_factory=TestCase)
+    # the port of the router software
+    port : int = 179
+    # the name of the network namespace
+    netns : str = None
+    # interval between two messages in the schedule (in seconds)
+    message_interval : float = 0
+    # sleeping time of a `Halt` in the schedule (in seconds)
+    halt_time : float = 2
+    # if send the OPEN and KEEPALIVE messages before the schedule
+    send_open : bool = True
+
+@dataclass
+class BGPSessionResult:
+    """
+    The outcome of a single simulated BGP session.
+    """
+    bind_ip : str
+    asn : int
+    established : bool = False
+    messages_sent : int = 0
+    messages_received : int = 0
+    notification_received : bool = False
+    # time between the connection and the first KEEPALIVE from the router (in seconds)
+    establish_time : float = None
+    error : str = None
+
+def derive_session_configurations(bgp_config: BGPToolkitConfiguration,
+                                  host: str,
+                                  first_bind_ip: str,
+                                  session_num: int,
+                                  schedule_func: Callable[[BGPToolkitConfiguration], TestCase] = None,
+                                  netns: str = None,
+                                  first_asn: int = None) -> list[BGPSessionConfiguration]:
+    """
+    Derive `session_num` session configurations from a single BGP configuration.
+
+    Session `i` uses the `i`-th address after `first_bind_ip` as its address and BGP identifier,
+    and the AS number `first_asn + i` (`first_asn` defaults to the ASN in `bgp_config`).
+    `schedule_func` takes the BGP configuration of a session and returns its schedule.
+    """
+    if first_asn is None:
+        first_asn = bgp_config.asn
+    session_configs = []
+    for i in range(session_num):
+        bind_ip = str(ipaddress.IPv4Address(first_bind_ip) + i)
+        session_bgp_config = deepcopy(bgp_config)
+        session_bgp_config.asn = first_asn + i
+        session_bgp_config.bgp_identifier = bind_ip
+        session_configs.append(BGPSessionConfiguration(
+            bgp_config=session_bgp_config,
+            host=host,
+            bind_ip=bind_ip,
+            schedule=schedule_func(session_bgp_config) if schedule_func is not None else TestCase(),
+            netns=netns,
+        ))
+    return session_configs
+
+def get_session_neighbors(session_configs: list[BGPSessionConfiguration],
+                          local_source: str) -> list[Neighbor]:
+    """
+    Get the neighbors the router software should configure for the sessions.
+    """
+    return [
+        Neighbor(
+            peer_ip=session_config.bind_ip,
+            peer_asn=session_config.bgp_config.asn,
+            local_source=local_source
+        ) for session_config in session_configs
+    ]
+
+class MultiSessionAgent:
+    """
+    The agent simulating many BGP peers in one process.
+    All the sessions are multiplexed on a single asyncio event loop.
+    You must use a list of `BGPSessionConfiguration` to initialize.
+    """
+    def __init__(self,
+                 session_configs: list[BGPSessionConfiguration],
+                 connect_concurrency: int = 64,
+                 hold_duration: float = 0):
+        """
+        `connect_concurrency`: The maximum number of sessions connecting at the same time.
+        `hold_duration`: How long (in seconds) the sessions are kept after their schedules are sent.
+        """
+        self.session_configs = session_configs
+        self.connect_concurrency = connect_concurrency
+        self.hold_duration = hold_duration
+        self.results : list[BGPSessionResult] = []
+
+    def run(self) -> list[BGPSessionResult]:
+        """
+        Run all the sessions and return their results.
+        """
+        self.results = asyncio.run(self.run_sessions())
+        return self.results
+
+    async def run_sessions(self) -> list[BGPSessionResult]:
+        """
+        Run all the sessions concurrently.
+        """
+        semaphore = asyncio.Semaphore(self.connect_concurrency)
+        return await asyncio.gather(*[
+            self.run_session(session_config, semaphore) for session_config in self.session_configs
+        ])
+
+    async def run_session(self,
+                          session_config: BGPSessionConfiguration,
+                          semaphore: asyncio.Semaphore) -> BGPSessionResult:
+        """
+        Connect, send the schedule and keep the session alive.
+        """
+        result = BGPSessionResult(bind_ip=session_config.bind_ip,
+                                  asn=session_config.bgp_config.asn)
+        loop = asyncio.get_running_loop()
+        sock = None
+        writer = None
+        try:
+            async with semaphore:
+                # The socket is created by a thread entering the namespace, off the event loop.
+                sock = await loop.run_in_executor(None,
+                                                  create_socket_in_netns,
+                                                  session_config.netns,
+                                                  socket.AF_INET,
+                                                  socket.SOCK_STREAM)
+                sock.setblocking(False)
+                sock.bind((session_config.bind_ip, 0))
+                await loop.sock_connect(sock, (session_config.host, session_config.port))
+            connect_time = time.monotonic()
+            reader, writer = await asyncio.open_connection(sock=sock)
+
+            # Negotiated hold time, set when the OPEN message of the router is received.
+            hold_time = loop.create_future()
+            receiving = asyncio.create_task(
+                self.receive_messages(reader, result, hold_time, connect_time)
+            )
+
+            await self.send_schedule(writer, session_config, result)
+            keepalive = asyncio.create_task(
+                self.send_keepalives(writer, session_config, hold_time)
+            )
+            await asyncio.sleep(self.hold_duration)
+            keepalive.cancel()
+            receiving.cancel()
+            await asyncio.gather(keepalive, receiving, return_exceptions=True)
+        except (OSError, asyncio.IncompleteReadError) as e:
+            result.error = str(e)
+        finally:
+            if writer is not None:
+                writer.close()
+            elif sock is not None:
+                sock.close()
+        return result
+
+    async def send_schedule(self,
+                            writer: asyncio.StreamWriter,
+                            session_config: BGPSessionConfiguration,
+                            result: BGPSessionResult):
+        """
+        Send the OPEN and KEEPALIVE messages, and then the scheduled messages of the session.
+        """
+        if session_config.send_open:
+            open_message = OpenMessage(OpenMessage_BFN.get_bfn(session_config.bgp_config))
+            keepalive_message = KeepAliveMessage(KeepAliveMessage_BFN.get_bfn())
+            schedule = [open_message, keepalive_message] + list(session_config.schedule)
+        else:
+            schedule = list(session_config.schedule)
+        for message in schedule:
+            if isinstance(message, Halt):
+                await asyncio.sleep(session_config.halt_time)
+                continue
+            if isinstance(message, SocketOption):
+                sock = writer.get_extra_info("socket")
+                if message.nodelay is not None:
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(message.nodelay))
+                if message.cork is not None:
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, int(message.cork))
+                continue
+            writer.write(message.get_binary_expression())
+            await writer.drain()
+            result.messages_sent += 1
+            if session_config.message_interval > 0:
+                await asyncio.sleep(session_config.message_interval)
+
+    async def send_keepalives(self,
+                              writer: asyncio.StreamWriter,
+                              session_config: BGPSessionConfiguration,
+                              hold_time: asyncio.Future):
+        """
+        Send KEEPALIVE messages every third of the negotiated hold time.
+        """
+        negotiated_hold_time = min(await hold_time, session_config.bgp_config.hold_time)
+        if negotiated_hold_time == 0:
+            # Hold time 0 means KEEPALIVE messages must not be sent.
+            return
+        keepalive_bytes = KeepAliveMessage(KeepAliveMessage_BFN.get_bfn()).get_binary_expression()
+        while True:
+            await asyncio.sleep(negotiated_hold_time / 3)
+            writer.write(keepalive_bytes)
+            await writer.drain()
+
+    async def receive_messages(self,
+                               reader: asyncio.StreamReader,
+                               result: BGPSessionResult,
+                               hold_time: asyncio.Future,
+                               connect_time: float):
+        """
+        Drain the messages sent by the router software.
+        """
+        while True:
+            try:
+                header = await reader.readexactly(BGP_HEADER_LEN)
+                length = get_message_length(header)
+                body = await reader.readexactly(max(length - BGP_HEADER_LEN, 0))
+            except (asyncio.IncompleteReadError, ConnectionError):
+                # The router software closed the session.
+                return
+            message = header + body
+            result.messages_received += 1
+            match get_message_type_val(message):
+                case MessageType.OPEN.value:
+                    if not hold_time.done():
+                        hold_time.set_result(get_open_hold_time(message))
+                case MessageType.KEEPALIVE.value:
+                    if not result.established:
+                        result.established = True
+                        result.establish_time = time.monotonic() - connect_time
+                case MessageType.NOTIFICATION.value:
+                    result.notification_received = True
+                    return
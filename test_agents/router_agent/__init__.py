@@ -1,4 +1,4 @@
-from .basic_types import RouterAgentConfiguration, RouterAgentType, Neighbor
+from .basic_types import RouterAgentConfiguration, RouterAgentType, Neighbor, BMPStation
 from .router_agent_base import BaseRouterAgent
 from .router_agent_bird import BIRDRouterAgent
 from .router_agent_frr import FRRRouterAgent
@@ -24,26 +24,49 @@ class Neighbor:
     # local source used for communication
     local_source : str
 
+@dataclass
+class BMPStation:
+    """
+    The BMP (RFC 7854) collector the routing software reports to (see `test_agents/bmp_agent.py`).
+    """
+    ip : str = "127.0.0.1"
+    port : int = 11019
+    # The interval of the statistics reports, in seconds.
+    stats_interval : int = 1
+
 class RouterAgentConfiguration:
     """
     This class is used to configure the BGP instance.
     We want this to be transparent to software type.
     """
+    # Default for the configurations pickled before `namespace` is added.
+    namespace : str = None
+    # Default for the configurations pickled before `bmp_station` is added.
+    bmp_station : BMPStation = None
+
     def __init__(self,
                  asn : int = 65001,
                  router_id : str = '1.1.1.1',
                  local_prefixes : list[str] = [],
                  neighbors : list[Neighbor] = [],
-                 router_type: RouterAgentType = RouterAgentType.FRR
+                 router_type: RouterAgentType = RouterAgentType.FRR,
+                 namespace: str = None,
+                 bmp_station: BMPStation = None
                  ):
         """
         Initialize the BGP configuration
+
+        `namespace`: The network namespace of the router instance,
+        `None` for the system-wide instance in the default namespace.
+        `bmp_station`: The BMP collector the instance reports to, `None` for no BMP.
         """
         self.asn : int = asn
         self.router_id : str = router_id
         self.local_prefixes : list[str] = local_prefixes
         self.neighbors : list[Neighbor] = neighbors
         self.router_type : RouterAgentType = router_type
+        self.namespace : str = namespace
+        self.bmp_station : BMPStation = bmp_station
 
     def get_router_type(self) -> RouterAgentType:
         """Get the router software type."""
@@ -53,11 +76,14 @@ class RouterAgentConfiguration:
         """
         Get the string expression of the router agent configuration.
         """
-        return f"""ASN: {self.asn}
+        expression = f"""ASN: {self.asn}
 router id: {self.router_id}
 local prefixes: {self.local_prefixes}
 neighbors: {self.neighbors}
 router type: {self.router_type.name}"""
+        if self.bmp_station is not None:
+            expression += f"\nBMP station: {self.bmp_station.ip}:{self.bmp_station.port}"
+        return expression
 
 
     ########## Deprecated ##########
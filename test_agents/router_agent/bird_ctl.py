@@ -0,0 +1,173 @@
+"""
+The persistent control channel to BIRD, through its control socket (`bird.ctl`).
+
+birdc itself speaks a line-based text protocol on the socket:
+the daemon greets with `0001 BIRD <version> ready.`, then answers each command with lines of the form
+`<code>-<text>` (more lines follow), ` <text>` (continuing the previous code) or `<code> <text>` (the last line).
+The codes 8xxx (runtime errors) and 9xxx (parse errors) report failures.
+Keeping the socket open saves the fork of `sudo birdc` for every reconfiguration, status check and query,
+and no birdc process can be left behind.
+
+The socket is created by the daemon (root): if it cannot be connected,
+the commands are run by `sudo birdc` calls instead.
+"""
+
+from dataclasses import dataclass, field
+import os, re, socket, subprocess
+
+# The first code of the errors.
+BIRD_ERROR_CODE = 8000
+BIRD_CTL_TIMEOUT = 10
+BIRD_REPLY_LINE = re.compile(r"^(\d{4})([ -])(.*)$")
+
+@dataclass
+class BIRDReply:
+    """
+    The reply of the daemon to a command.
+    """
+    command : str
+    # The code of the last line.
+    code : int
+    lines : list[str] = field(default_factory=list)
+
+    def succeeded(self) -> bool:
+        """Check if the command succeeded."""
+        return self.code < BIRD_ERROR_CODE
+
+    def get_output(self) -> str:
+        """Get the text of the reply."""
+        return "\n".join(self.lines)
+
+class BIRDControlClient:
+    """
+    The client of the control socket of a BIRD daemon, connected on the first command and kept open.
+    A command reconnects once if the daemon has been restarted (e.g., after a crash).
+    """
+    def __init__(self, socket_path: str, birdc_command: list[str], timeout: float = BIRD_CTL_TIMEOUT):
+        """
+        `socket_path`: The control socket of the daemon.
+        `birdc_command`: The birdc command of the instance (e.g., `["sudo", "birdc", "-s", socket_path]`),
+        used if the socket cannot be connected.
+        """
+        self.socket_path = socket_path
+        self.birdc_command = birdc_command
+        self.timeout = timeout
+        self.sock : socket.socket = None
+        self.buffer = bytearray()
+        # The process owning the connection, a forked process connects on its own.
+        self.pid : int = None
+        # Set once the socket is found not accessible, the commands go to birdc from then on.
+        self.use_birdc = False
+
+    ########## Connection ##########
+
+    def connect(self) -> bool:
+        """
+        Connect to the control socket and read the greeting.
+        Return `False` if the socket cannot be connected.
+        """
+        self.close()
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+        except PermissionError:
+            print(f"No permission on {self.socket_path}, using birdc instead.")
+            self.use_birdc = True
+            return False
+        except OSError:
+            return False
+        self.sock = sock
+        self.pid = os.getpid()
+        return self.read_reply("").succeeded()
+
+    def close(self):
+        """
+        Close the connection.
+        """
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.buffer = bytearray()
+        self.pid = None
+
+    def connected(self) -> bool:
+        """
+        Check if the connection is open (in this process).
+        """
+        return self.sock is not None and self.pid == os.getpid()
+
+    ########## Commands ##########
+
+    def read_line(self) -> str:
+        """
+        Read a line from the connection.
+        Raise `OSError` if the connection is broken.
+        """
+        while b"\n" not in self.buffer:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionResetError(f"{self.socket_path} closed the connection.")
+            self.buffer += chunk
+        line, _, rest = self.buffer.partition(b"\n")
+        self.buffer = bytearray(rest)
+        return line.decode(errors="replace")
+
+    def read_reply(self, command: str) -> BIRDReply:
+        """
+        Read the lines of a reply, up to its last line.
+        """
+        reply = BIRDReply(command=command, code=0)
+        while True:
+            line = self.read_line()
+            match = BIRD_REPLY_LINE.match(line)
+            if match is None:
+                # ` <text>` continues the previous code.
+                reply.lines.append(line[1:])
+                continue
+            code, separator, text = match.groups()
+            reply.code = int(code)
+            reply.lines.append(text)
+            if separator == " ":
+                return reply
+
+    def execute_on_socket(self, command: str) -> BIRDReply:
+        """
+        Run the command on the control socket.
+        Raise `OSError` if the connection is broken.
+        """
+        self.sock.sendall(command.encode() + b"\n")
+        return self.read_reply(command)
+
+    def execute_with_birdc(self, command: str) -> BIRDReply:
+        """
+        Run the command with a birdc call (birdc reports the errors in its output only).
+        """
+        completed = subprocess.run(self.birdc_command + command.split(), capture_output=True, text=True)
+        lines = (completed.stdout + completed.stderr).splitlines()
+        failed = completed.returncode != 0 or any(re.search(r"error", line, re.IGNORECASE) for line in lines)
+        return BIRDReply(command=command, code=BIRD_ERROR_CODE if failed else 0, lines=lines)
+
+    def execute(self, command: str) -> BIRDReply:
+        """
+        Run a command (e.g., `configure`, `show status`, `restart peer1`), and print its error if it failed.
+        """
+        reply = None
+        if not self.use_birdc:
+            for _ in range(2):
+                try:
+                    if not self.connected() and not self.connect():
+                        break
+                    reply = self.execute_on_socket(command)
+                    break
+                except OSError:
+                    # The daemon has been restarted, reconnect once.
+                    self.close()
+        if reply is None:
+            reply = self.execute_with_birdc(command)
+        if not reply.succeeded():
+            print(f"BIRD command `{command}` failed ({reply.code}): {reply.get_output()}")
+        return reply
@@ -0,0 +1,117 @@
+"""
+The incremental rendering of the config files of the routing softwares (BIRD, OpenBGPD).
+
+A config file is the base (the part up to the marker, kept from the installed file)
+followed by named sections (e.g., the peers, the MRT dumps) rendered by the agent.
+A section is only rendered again when its key (e.g., the router agent configuration, the dump path) changes,
+and the file is only written when its content changes,
+so the agent reloads the routing software only when something actually changed.
+"""
+
+import os, re
+
+class ConfigRenderer:
+    """
+    Render a config file from its base and its sections, and write it only if it changed.
+    """
+    def __init__(self, conf_path: str, marker: str, section_names: list[str], base_filter: str = None):
+        """
+        `marker`: The line ending the base, the sections are rendered below it.
+        `section_names`: The sections, in the order of the file.
+        `base_filter`: A regex matching the lines dropped from the base
+        (e.g., the settings written above the marker by older versions).
+        """
+        self.conf_path = conf_path
+        self.marker = marker
+        self.section_names = section_names
+        self.base_filter = re.compile(base_filter) if base_filter is not None else None
+        # The base, read on first use.
+        self.base : str = None
+        # The rendered sections and the keys they are rendered from.
+        self.sections : dict[str, str] = {}
+        self.keys : dict[str, object] = {}
+        # The content last written, and the modification time of the file after writing it.
+        self.written : str = None
+        self.written_mtime : int = None
+
+    def read_base(self) -> str:
+        """
+        Read the base of the config file, up to (and including) the marker.
+        """
+        if self.base is None:
+            with open(self.conf_path, 'r') as f:
+                lines = f.readlines()
+            for i, line in enumerate(lines):
+                if line.strip() == self.marker.strip():
+                    break
+            else:
+                raise ValueError(f"Configuration file marker not found in {self.conf_path}! ({self.marker})")
+            lines = lines[:i+1]
+            if self.base_filter is not None:
+                lines = [line for line in lines if not self.base_filter.match(line)]
+            self.base = "".join(lines)
+        return self.base
+
+    def set_section(self, name: str, key, render) -> bool:
+        """
+        Set the section rendered by `render()` from `key`, `render` is only called if the key changed.
+        `render` may return `None` to remove the section.
+        Return `True` if the section changed.
+        """
+        if name not in self.section_names:
+            raise ValueError(f"Unknown section {name} of {self.conf_path}!")
+        if name in self.keys and self.keys[name] == key:
+            return False
+        content = render()
+        self.keys[name] = key
+        changed = self.sections.get(name) != content
+        if content is None:
+            self.sections.pop(name, None)
+        else:
+            self.sections[name] = content
+        return changed
+
+    def get_key(self, name: str):
+        """
+        Get the key the section is rendered from, `None` if it is not rendered.
+        """
+        return self.keys.get(name)
+
+    def remove_section(self, name: str) -> bool:
+        """
+        Remove the section.
+        Return `True` if the section changed.
+        """
+        return self.set_section(name, None, lambda: None)
+
+    def render(self) -> str:
+        """
+        Render the whole config file.
+        """
+        sections = [self.sections[name].strip("\n") for name in self.section_names if name in self.sections]
+        return self.read_base() + "".join(f"\n{section}\n" for section in sections)
+
+    def get_mtime(self) -> int:
+        """Get the modification time of the config file, `None` if it does not exist."""
+        try:
+            return os.stat(self.conf_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def write(self) -> bool:
+        """
+        Write the config file if its content changed (or the file was modified by someone else).
+        Return `True` if the file was written.
+        """
+        modified = self.get_mtime() != self.written_mtime
+        if modified and self.written is not None:
+            # Read the base again from the modified file.
+            self.base = None
+        content = self.render()
+        if content == self.written and not modified:
+            return False
+        with open(self.conf_path, 'w') as f:
+            f.write(content)
+        self.written = content
+        self.written_mtime = self.get_mtime()
+        return True
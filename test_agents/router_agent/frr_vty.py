@@ -0,0 +1,180 @@
+"""
+The persistent control channel to the FRR bgpd, through its VTY socket.
+
+vtysh itself talks to the daemons through their VTY sockets (e.g., `/var/run/frr/bgpd.vty`):
+a command is sent NUL-terminated, and the daemon answers with the output followed by `\\0\\0\\0<status>`.
+Keeping the socket open saves the fork of `sudo vtysh` (tens to hundreds of milliseconds) for every batch,
+and the commands are sent as they are, without shell quoting.
+
+The socket belongs to the `frrvty` group: if it cannot be connected (e.g., the user is not in the group),
+the batches are run by a single `sudo vtysh` call each, still without the shell.
+"""
+
+from dataclasses import dataclass
+import os, socket, subprocess
+
+# The status of a successful command (`CMD_SUCCESS` of FRR).
+FRR_CMD_SUCCESS = 0
+# Returned by the daemon for commands only meaningful to vtysh (`CMD_SUCCESS_DAEMON` of FRR).
+FRR_CMD_SUCCESS_DAEMON = 10
+# The end of a response: three NULs, then the status.
+FRR_VTY_RESPONSE_END = b"\0\0\0"
+FRR_VTY_TIMEOUT = 10
+
+@dataclass
+class VTYResult:
+    """
+    The response of the daemon to a command.
+    """
+    command : str
+    status : int
+    output : str
+
+    def succeeded(self) -> bool:
+        """Check if the command succeeded."""
+        return self.status in (FRR_CMD_SUCCESS, FRR_CMD_SUCCESS_DAEMON)
+
+class FRRVTYClient:
+    """
+    The client of the VTY socket of a daemon, connected on the first batch and kept open.
+    A batch reconnects once if the daemon has been restarted (e.g., after a crash).
+    """
+    def __init__(self, socket_path: str, vtysh_command: list[str], timeout: float = FRR_VTY_TIMEOUT):
+        """
+        `socket_path`: The VTY socket of the daemon.
+        `vtysh_command`: The vtysh command of the instance (e.g., `["sudo", "vtysh", "-N", "ns-rtr"]`),
+        used if the socket cannot be connected.
+        """
+        self.socket_path = socket_path
+        self.vtysh_command = vtysh_command
+        self.timeout = timeout
+        self.sock : socket.socket = None
+        # The process owning the connection, a forked process connects on its own.
+        self.pid : int = None
+        # Set once the socket is found not accessible, the batches go to vtysh from then on.
+        self.use_vtysh = False
+
+    ########## Connection ##########
+
+    def connect(self) -> bool:
+        """
+        Connect to the VTY socket and enter the enable node.
+        Return `False` if the socket cannot be connected.
+        """
+        self.close()
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+        except PermissionError:
+            print(f"No permission on {self.socket_path} (add the user to the frrvty group), using vtysh instead.")
+            self.use_vtysh = True
+            return False
+        except OSError:
+            return False
+        self.sock = sock
+        self.pid = os.getpid()
+        # The VTY of vtysh starts in the view node.
+        if not self.send_command("enable").succeeded():
+            # The commands would fail out of the enable node, do not reuse the connection.
+            self.close()
+            return False
+        return True
+
+    def close(self):
+        """
+        Close the connection.
+        """
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.pid = None
+
+    def connected(self) -> bool:
+        """
+        Check if the connection is open (in this process).
+        """
+        return self.sock is not None and self.pid == os.getpid()
+
+    ########## Commands ##########
+
+    def send_command(self, command: str) -> VTYResult:
+        """
+        Send a command on the open connection and read the response.
+        Raise `OSError` if the connection is broken.
+        """
+        self.sock.sendall(command.encode() + b"\0")
+        response = bytearray()
+        while len(response) < 4 or response[-4:-1] != FRR_VTY_RESPONSE_END:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionResetError(f"{self.socket_path} closed the connection.")
+            response += chunk
+        return VTYResult(command=command,
+                         status=response[-1],
+                         output=response[:-4].rstrip(b"\0").decode(errors="replace"))
+
+    def execute_on_socket(self, commands: list[str]) -> list[VTYResult]:
+        """
+        Run the batch on the VTY socket, stopping at the first failed command.
+        Raise `OSError` if the connection is broken.
+        """
+        results = []
+        for command in commands:
+            results.append(self.send_command(command))
+            if not results[-1].succeeded():
+                break
+        return results
+
+    def execute_with_vtysh(self, commands: list[str]) -> list[VTYResult]:
+        """
+        Run the batch with a single vtysh call.
+        vtysh stops at the first failed command, the result covers the whole batch.
+        """
+        args = list(self.vtysh_command)
+        for command in commands:
+            args += ["-c", command]
+        completed = subprocess.run(args, capture_output=True, text=True)
+        return [VTYResult(command="; ".join(commands),
+                          status=completed.returncode,
+                          output=completed.stdout + completed.stderr)]
+
+    def execute(self, commands: list[str], config: bool = False) -> list[VTYResult]:
+        """
+        Run a batch of commands, in the `configure terminal` level if `config` is set.
+        Return the results (the batch stops at the first failed command, whose error is printed).
+        """
+        if config:
+            commands = ["configure terminal"] + commands + ["end"]
+        results = None
+        if not self.use_vtysh:
+            for _ in range(2):
+                try:
+                    if not self.connected() and not self.connect():
+                        break
+                    results = self.execute_on_socket(commands)
+                    break
+                except OSError:
+                    # The daemon has been restarted, reconnect once.
+                    self.close()
+        if results is None:
+            results = self.execute_with_vtysh(commands)
+        if results and not results[-1].succeeded():
+            print(f"FRR command `{results[-1].command}` failed ({results[-1].status}): {results[-1].output.strip()}")
+            if config and self.connected():
+                # Do not leave the connection in the config level.
+                try:
+                    self.send_command("end")
+                except OSError:
+                    self.close()
+        return results
+
+    def get_output(self, command: str) -> str:
+        """
+        Run a single command and get its output, `None` if it failed.
+        """
+        result = self.execute([command])[-1]
+        return result.output if result.succeeded() else None
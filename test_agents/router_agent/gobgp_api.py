@@ -0,0 +1,249 @@
+"""
+The control of a long-running gobgpd through its gRPC API (GoBGP v3).
+
+The BGP instance (global config, policies, peers, BMP stations, MRT dumps) is set up and torn down
+with API calls, so gobgpd is only (re)started when it crashes, and the RIBs are queried as structured data.
+
+`grpc` and the stubs generated from the protos of GoBGP are optional and imported on first use:
+    python -m grpc_tools.protoc -I <gobgp>/api --python_out=config/gobgp_api --grpc_python_out=config/gobgp_api \\
+        gobgp.proto attribute.proto capability.proto
+Without them, the GoBGP agent falls back to rewriting the config file and restarting gobgpd.
+"""
+
+import sys
+from basic_utils.const import REPO_ROOT_PATH
+
+# The directory of the generated stubs (`gobgp_pb2`, `gobgp_pb2_grpc`, ...), which import each other by name.
+GOBGP_API_DIR = f"{REPO_ROOT_PATH}/config/gobgp_api"
+GOBGP_API_PORT = 50051
+GOBGP_API_TIMEOUT = 5
+# The names of the policy objects set up by `GoBGPAPIClient.start_bgp`.
+GOBGP_AS_PATH_SET = "neighboring-as"
+GOBGP_IMPORT_POLICY = "only-from-neighbors"
+
+def load_gobgp_api():
+    """
+    Import `grpc` and the stubs, return `(grpc, gobgp_pb2, gobgp_pb2_grpc)`, or `None` if any is missing.
+    """
+    try:
+        import grpc
+        if GOBGP_API_DIR not in sys.path:
+            sys.path.append(GOBGP_API_DIR)
+        import gobgp_pb2, gobgp_pb2_grpc
+    except ImportError as e:
+        print(f"GoBGP gRPC API not available ({e}), using the config file instead.")
+        return None
+    return grpc, gobgp_pb2, gobgp_pb2_grpc
+
+class GoBGPAPIClient:
+    """
+    The client of the gRPC API of a gobgpd, connected on first use.
+    """
+    def __init__(self, target: str, timeout: float = GOBGP_API_TIMEOUT):
+        """
+        `target`: The gRPC target of the API (e.g., `127.0.0.1:50051`, `unix:///path/gobgpd.sock`).
+        """
+        self.target = target
+        self.timeout = timeout
+        self.api = None
+        self.channel = None
+        self.stub = None
+        # `None` until the stubs are loaded.
+        self.loaded : bool = None
+
+    def available(self) -> bool:
+        """
+        Check if `grpc` and the stubs can be imported (only tried once).
+        """
+        if self.loaded is None:
+            self.api = load_gobgp_api()
+            self.loaded = self.api is not None
+        return self.loaded
+
+    def get_stub(self):
+        """
+        Get the stub of the `GobgpApi` service, opening the channel if needed.
+        """
+        if self.stub is None:
+            grpc, _, gobgp_pb2_grpc = self.api
+            self.channel = grpc.insecure_channel(self.target)
+            self.stub = gobgp_pb2_grpc.GobgpApiStub(self.channel)
+        return self.stub
+
+    def close(self):
+        """
+        Close the channel (e.g., after gobgpd is restarted, or in a forked process).
+        """
+        if self.channel is not None:
+            self.channel.close()
+        self.channel = None
+        self.stub = None
+
+    def call(self, method: str, request, ignore_error: bool = False):
+        """
+        Call a unary method of the API.
+        Return the response, or `None` if the call failed (the error is printed unless `ignore_error`).
+        """
+        grpc = self.api[0]
+        try:
+            return getattr(self.get_stub(), method)(request, timeout=self.timeout)
+        except grpc.RpcError as e:
+            if not ignore_error:
+                print(f"GoBGP API `{method}` failed: {e.code().name} {e.details()}")
+            return None
+
+    def call_stream(self, method: str, request) -> list:
+        """
+        Call a server-streaming method of the API, and collect the responses.
+        Return `None` if the call failed.
+        """
+        grpc = self.api[0]
+        try:
+            return list(getattr(self.get_stub(), method)(request, timeout=self.timeout))
+        except grpc.RpcError as e:
+            print(f"GoBGP API `{method}` failed: {e.code().name} {e.details()}")
+            return None
+
+    def wait_until_ready(self, timeout: float) -> bool:
+        """
+        Wait until the API accepts connections (e.g., after gobgpd is launched).
+        """
+        grpc = self.api[0]
+        self.get_stub()
+        try:
+            grpc.channel_ready_future(self.channel).result(timeout=timeout)
+            return True
+        except grpc.FutureTimeoutError:
+            return False
+
+    ########## The BGP instance ##########
+
+    def start_bgp(self, configuration, bmp_station=None) -> bool:
+        """
+        Start the BGP instance of the router agent configuration:
+        the global config, the import policy only accepting the routes from the neighboring ASes,
+        the passive peers, and the BMP station if any.
+        Return `False` if a call failed.
+        """
+        _, pb, _ = self.api
+        requests = [
+            ("StartBgp", pb.StartBgpRequest(**{"global": pb.Global(asn=configuration.asn, router_id="10.0.0.127")})),
+            ("AddDefinedSet", pb.AddDefinedSetRequest(defined_set=pb.DefinedSet(
+                defined_type=pb.DefinedType.AS_PATH,
+                name=GOBGP_AS_PATH_SET,
+                list=[f"^{neighbor.peer_asn}" for neighbor in configuration.neighbors],
+            ), replace=True)),
+            ("AddPolicy", pb.AddPolicyRequest(policy=pb.Policy(
+                name=GOBGP_IMPORT_POLICY,
+                statements=[pb.Statement(
+                    name=f"{GOBGP_IMPORT_POLICY}-accept",
+                    conditions=pb.Conditions(as_path_set=pb.MatchSet(type=pb.MatchSet.ANY, name=GOBGP_AS_PATH_SET)),
+                    actions=pb.Actions(route_action=pb.RouteAction.ACCEPT),
+                )],
+            ))),
+            ("AddPolicyAssignment", pb.AddPolicyAssignmentRequest(assignment=pb.PolicyAssignment(
+                name="global",
+                direction=pb.PolicyDirection.IMPORT,
+                policies=[pb.Policy(name=GOBGP_IMPORT_POLICY)],
+                default_action=pb.RouteAction.REJECT,
+            ))),
+        ]
+        for neighbor in configuration.neighbors:
+            requests.append(("AddPeer", pb.AddPeerRequest(peer=pb.Peer(
+                conf=pb.PeerConf(neighbor_address=neighbor.peer_ip, peer_asn=neighbor.peer_asn),
+                transport=pb.Transport(passive_mode=True, ttl=64),
+                # Directly connected, the peer would be deleted after the hold time with multihop.
+                ebgp_multihop=pb.EbgpMultihop(enabled=False, multihop_ttl=100),
+            ))))
+        if bmp_station is not None:
+            requests.append(("AddBmp", pb.AddBmpRequest(
+                address=bmp_station.ip,
+                port=bmp_station.port,
+                policy=pb.AddBmpRequest.ALL,
+                StatisticsTimeout=bmp_station.stats_interval,
+            )))
+        return all(self.call(method, request) is not None for method, request in requests)
+
+    def stop_bgp(self, configuration, bmp_station=None):
+        """
+        Stop the BGP instance started by `start_bgp`, and remove its policies, so it can be started again.
+        The calls fail harmlessly on a fresh gobgpd.
+        """
+        _, pb, _ = self.api
+        if bmp_station is not None:
+            self.call("DeleteBmp", pb.DeleteBmpRequest(address=bmp_station.ip, port=bmp_station.port), ignore_error=True)
+        self.call("DeletePolicyAssignment", pb.DeletePolicyAssignmentRequest(
+            assignment=pb.PolicyAssignment(name="global", direction=pb.PolicyDirection.IMPORT), all=True),
+            ignore_error=True)
+        self.call("DeletePolicy", pb.DeletePolicyRequest(policy=pb.Policy(name=GOBGP_IMPORT_POLICY), all=True),
+                  ignore_error=True)
+        self.call("DeleteDefinedSet", pb.DeleteDefinedSetRequest(
+            defined_set=pb.DefinedSet(defined_type=pb.DefinedType.AS_PATH, name=GOBGP_AS_PATH_SET), all=True),
+            ignore_error=True)
+        self.call("StopBgp", pb.StopBgpRequest(), ignore_error=True)
+
+    def reset_peer(self, peer_ip: str) -> bool:
+        """
+        Hard-reset the session with the peer.
+        """
+        _, pb, _ = self.api
+        return self.call("ResetPeer", pb.ResetPeerRequest(address=peer_ip, soft=False)) is not None
+
+    ########## MRT dumps ##########
+
+    def enable_mrt(self, path: str, table: bool, dump_interval: int = 1) -> bool:
+        """
+        Dump the updates (or the table, every `dump_interval` seconds) into the MRT file.
+        """
+        _, pb, _ = self.api
+        dump_type = pb.EnableMrtRequest.TABLE if table else pb.EnableMrtRequest.UPDATES
+        request = pb.EnableMrtRequest(dump_type=dump_type, filename=path, dump_interval=dump_interval if table else 0)
+        return self.call("EnableMrt", request) is not None
+
+    def disable_mrt(self, path: str) -> bool:
+        """
+        Stop dumping into the MRT file.
+        """
+        _, pb, _ = self.api
+        return self.call("DisableMrt", pb.DisableMrtRequest(filename=path)) is not None
+
+    ########## Queries ##########
+
+    def get_family(self):
+        """Get the IPv4 unicast family."""
+        _, pb, _ = self.api
+        return pb.Family(afi=pb.Family.AFI_IP, safi=pb.Family.SAFI_UNICAST)
+
+    def list_paths(self, peer_ip: str = None) -> list[dict]:
+        """
+        Get the destinations of the Loc-RIB, or of the Adj-RIB-In of the peer, as dicts.
+        Return `None` if the call failed.
+        """
+        _, pb, _ = self.api
+        from google.protobuf.json_format import MessageToDict
+        request = pb.ListPathRequest(table_type=pb.TableType.ADJ_IN if peer_ip else pb.TableType.GLOBAL,
+                                     name=peer_ip or "",
+                                     family=self.get_family())
+        responses = self.call_stream("ListPath", request)
+        if responses is None:
+            return None
+        return [MessageToDict(response.destination) for response in responses]
+
+    def get_rib_size(self) -> int:
+        """
+        Get the number of paths in the Loc-RIB, `None` if the call failed.
+        """
+        _, pb, _ = self.api
+        response = self.call("GetTable", pb.GetTableRequest(table_type=pb.TableType.GLOBAL, family=self.get_family()))
+        return None if response is None else response.num_path
+
+    def list_peers(self) -> list[dict]:
+        """
+        Get the peers (config, state, timers) as dicts, `None` if the call failed.
+        """
+        _, pb, _ = self.api
+        from google.protobuf.json_format import MessageToDict
+        responses = self.call_stream("ListPeer", pb.ListPeerRequest())
+        if responses is None:
+            return None
+        return [MessageToDict(response.peer) for response in responses]
@@ -3,8 +3,17 @@ The basic type of the router agent.
 """
 
 from abc import ABC, abstractmethod
-from time import sleep
 from .basic_types import *
+from basic_utils.log_tail_utils import LogTailer
+from basic_utils.process_utils import ProcessWatcher, find_pids
+from basic_utils.time_utils import wait_until
+from .timing_profile import TimingProfile, load_timing_profile
+from basic_utils.const import REPO_ROOT_PATH
+from time import sleep, monotonic
+import subprocess
+
+# The directory holding the files (config, control socket, log, ...) of the router instances.
+ROUTER_INSTANCE_DIR = f"{REPO_ROOT_PATH}/data/router_instances"
 
 class BaseRouterAgent(ABC):
     """
@@ -20,6 +29,8 @@ class BaseRouterAgent(ABC):
         """
         self.router_agent_type : RouterAgentType = None
         self.router_agent_configuration : RouterAgentConfiguration = configuration
+        # The tailer following the log of the routing software.
+        self.log_tailer : LogTailer = None
 
     ########## Turn on/off the instance ##########
 
@@ -76,13 +87,214 @@ class BaseRouterAgent(ABC):
         """
         raise NotImplementedError("`restart_bgp_instance` not implemented!")
 
+    def mark_log(self):
+        """
+        Mark the current end of the log, the following `dump_log` starts from here.
+        Unlike `clear_log`, the live log is not truncated.
+        """
+        self.log_tailer.mark()
+
+    def dump_log(self, path: str):
+        """
+        Copy the log appended since `mark_log` into the file `path`.
+        Must execute with sudo-command.
+        """
+        self.log_tailer.dump_since_mark(path)
+
+    def get_log_tail(self, line_num: int) -> list[str]:
+        """
+        Get the last lines of the log appended since `mark_log`, e.g., to compute the crash signature.
+        """
+        return self.log_tailer.read_all().splitlines()[-line_num:]
+
+    ########## Multiple instances ##########
+
+    # If several instances can run side by side, each in the namespace of its configuration.
+    MULTI_INSTANCE = False
+
+    def get_namespace(self) -> str:
+        """
+        Get the namespace of the instance,
+        `None` for the system-wide instance in the default namespace.
+        The namespace also names the instance.
+        """
+        return self.router_agent_configuration.namespace
+
+    def get_instance_path(self, file_name: str) -> str:
+        """
+        Get the path of a file (config, control socket, log, ...) of the instance.
+        """
+        instance_dir = f"{ROUTER_INSTANCE_DIR}/{self.get_namespace()}"
+        os.makedirs(instance_dir, exist_ok=True)
+        return f"{instance_dir}/{file_name}"
+
+    def get_command(self, command: str) -> str:
+        """
+        Get the shell command executed with sudo (in the namespace of the instance, if any).
+        """
+        if self.get_namespace() is None:
+            return f"sudo {command}"
+        return f"sudo ip netns exec {self.get_namespace()} {command}"
+
+    @staticmethod
+    def pid_alive(pid_path: str) -> bool:
+        """
+        Check if the process recorded in the PID file is alive.
+        """
+        try:
+            pid = int(subprocess.getoutput(f"sudo cat {pid_path}").strip())
+        except ValueError:
+            return False
+        return os.path.exists(f"/proc/{pid}")
+
+    @staticmethod
+    def process_alive(pattern: str) -> bool:
+        """
+        Check if there is a process whose command line matches the pattern
+        (e.g., the config path of the instance).
+        """
+        return subprocess.run(["pgrep", "-f", pattern],
+                              stdout=subprocess.DEVNULL).returncode == 0
+
+    ########## BMP ##########
+
+    # If the routing software can report to a BMP station (see `RouterAgentConfiguration.bmp_station`).
+    BMP_SUPPORT = False
+
+    def get_bmp_station(self) -> BMPStation:
+        """
+        Get the BMP station the instance should report to,
+        `None` if there is none or the routing software cannot report to it.
+        """
+        bmp_station = self.router_agent_configuration.bmp_station
+        if bmp_station is not None and not self.BMP_SUPPORT:
+            print(f"{self.router_agent_configuration.router_type.name} does not support BMP, the BMP station is ignored.")
+            return None
+        return bmp_station
+
+    ########## Session reuse ##########
+
+    # If the BGP instance can be kept running between testcases,
+    # i.e., the MRT dumping can be switched without restarting the instance.
+    SESSION_REUSE = False
+
+    def reset_peer(self, peer_ip: str):
+        """
+        Reset the BGP session with the peer, dropping the routes learned from it.
+        """
+        raise NotImplementedError("`reset_peer` not implemented!")
+
+    def get_rib_size(self) -> int:
+        """
+        Get the number of routes in the RIB, `None` if it cannot be retrieved.
+        """
+        raise NotImplementedError("`get_rib_size` not implemented!")
+
+    def wait_for_clean_rib(self, baseline: int, timeout: float = 3, interval: float = 0.1) -> bool:
+        """
+        Wait until the RIB shrinks back to `baseline` routes (e.g., after the tester session is reset).
+        Return `False` if the RIB is still dirty after `timeout` seconds.
+        """
+        start_time = monotonic()
+        while True:
+            rib_size = self.get_rib_size()
+            if rib_size is not None and rib_size <= baseline:
+                return True
+            if monotonic() - start_time >= timeout:
+                print(f"RIB not clean: {rib_size} routes, {baseline} expected.")
+                return False
+            sleep(interval)
+
+    ########## Timing ##########
+
+    # The timing profile bounding the waits, loaded by `get_timing_profile`.
+    timing_profile : TimingProfile = None
+
+    def get_timing_profile(self) -> TimingProfile:
+        """
+        Get the timing profile of the routing software (calibrated, or the default one).
+        """
+        if self.timing_profile is None:
+            self.timing_profile = load_timing_profile(self.router_agent_configuration.router_type)
+        return self.timing_profile
+
+    def wait_until_running(self) -> bool:
+        """
+        Wait until the routing software runs, e.g., after (re)starting it.
+        Return `False` if it is not running after the restart timeout of the profile.
+        """
+        return wait_until(lambda: not self.check_crashed(),
+                          self.get_timing_profile().restart_timeout,
+                          interval=0.1)
+
     ########## Crash management ##########
 
-    @classmethod
-    @abstractmethod
-    def if_crashed(cls) -> bool:
+    # The watcher of the daemon processes, set by `track_daemons`.
+    daemon_watcher : ProcessWatcher = None
+    # Called with the PID (from a background thread) as soon as a tracked daemon exits.
+    crash_callback = None
+
+    def get_daemon_patterns(self) -> list[str]:
+        """
+        Get the regex patterns matching the command lines of the daemons (one pattern per daemon),
+        `None` if the daemons cannot be tracked.
+        """
+        return None
+
+    def set_crash_callback(self, callback):
+        """
+        Set the callback fired as soon as a tracked daemon exits.
+        """
+        self.crash_callback = callback
+        if self.daemon_watcher is not None:
+            self.track_daemons()
+
+    def track_daemons(self) -> bool:
+        """
+        Look up the PIDs of the daemons once, and watch them.
+        Return `False` if any of the daemons is not found.
+        """
+        self.untrack_daemons()
+        patterns = self.get_daemon_patterns()
+        if not patterns:
+            return False
+        pids = []
+        for pattern in patterns:
+            daemon_pids = find_pids(pattern)
+            if not daemon_pids:
+                return False
+            pids += daemon_pids
+        self.daemon_watcher = ProcessWatcher(pids, self.crash_callback)
+        return True
+
+    def untrack_daemons(self):
+        """
+        Stop watching the daemons.
+        """
+        if self.daemon_watcher is not None:
+            self.daemon_watcher.stop()
+            self.daemon_watcher = None
+
+    def if_crashed(self) -> bool:
         """
         Return if the router software has crashed.
+        No subprocess is spawned while the tracked daemons are alive.
+        Once a daemon exits (or before the daemons are tracked), the software is checked by `check_crashed`,
+        and the daemons are tracked again if it is running (e.g., after an intentional restart).
+        """
+        if self.daemon_watcher is not None and not self.daemon_watcher.exited():
+            return False
+        crashed = self.check_crashed()
+        if crashed:
+            self.untrack_daemons()
+        else:
+            self.track_daemons()
+        return crashed
+
+    @abstractmethod
+    def check_crashed(self) -> bool:
+        """
+        Check if the router software has crashed with the software-specific (slow) method.
         """
         raise NotImplementedError()
 
@@ -102,14 +314,13 @@ class BaseRouterAgent(ABC):
 
     ########## Other utils ##########
 
-    def wait_for_log(self, time_duration: float = 0.1):
+    def wait_for_log(self, idle_window: float = None, timeout: float = None) -> bool:
         """
-        Waiting until the log does not update anymore.
+        Waiting until the log does not update anymore,
+        i.e., no new bytes are appended to the log for `idle_window` seconds (from the timing profile by default).
+        Only the appended bytes are read (see `self.log_tailer`).
+        Return `False` if the log is still updating after `timeout` seconds.
         """
-        no_updates = False
-        prev_content = None
-        while not no_updates:
-            cur_content = self.read_log()
-            no_updates = prev_content==cur_content
-            prev_content = cur_content
-            sleep(time_duration)
+        if idle_window is None:
+            idle_window = self.get_timing_profile().log_idle_window
+        return self.log_tailer.wait_for_idle(idle_window, timeout)
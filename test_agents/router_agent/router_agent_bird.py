@@ -4,14 +4,24 @@ The BIRD router.
 
 from .basic_types import *
 from .router_agent_base import BaseRouterAgent
-from basic_utils.file_utils import read_file, clear_file
+from .bird_ctl import BIRDControlClient
+from .config_renderer import ConfigRenderer
+from basic_utils.log_tail_utils import LogTailer
+from basic_utils.file_utils import clear_file, file_exists
 from time import sleep
 import subprocess, re
 
 BIRD_CONF = "/etc/bird/bird.conf"
 BIRD_CONF = "/usr/local/etc/bird.conf"
 BIRD_CONF_MARKER = "###### Configure below ######"
+# The sections rendered below the marker (see `ConfigRenderer`).
+BIRD_CONF_SECTIONS = ["peers", "message_dump", "table_dump"]
+# The BGP protocols are named `peer1`, `peer2`, ... (see `get_protocol_name`).
+BIRD_PEER_PREFIX = "peer"
+BIRD_MRT_PROTOCOL = "mrt_table"
 BIRD_LOG = "/var/log/bird.log"
+# The control socket of the system-wide daemon (installed under `/usr/local`, like `BIRD_CONF`).
+BIRD_CTL = "/usr/local/var/run/bird.ctl"
 
 class BIRDRouterAgent(BaseRouterAgent):
     """
@@ -28,74 +38,51 @@ class BIRDRouterAgent(BaseRouterAgent):
             raise ValueError(f"Initializing BIRD router with router type {configuration.get_router_type()}!")
         self.router_agent_type : RouterAgentType = RouterAgentType.BIRD
         self.router_agent_configuration : RouterAgentConfiguration = configuration
+        if self.get_namespace() is None:
+            self.conf_path = BIRD_CONF
+            self.log_path = BIRD_LOG
+            self.socket_path = BIRD_CTL
+        else:
+            # Each instance has its own config, control socket, log and PID file.
+            self.conf_path = self.get_instance_path("bird.conf")
+            self.log_path = self.get_instance_path("bird.log")
+            self.socket_path = self.get_instance_path("bird.ctl")
+            self.pid_path = self.get_instance_path("bird.pid")
+        self.log_tailer = LogTailer(self.log_path)
+        # The persistent control channel to the daemon, all the commands go through it.
+        self.ctl = BIRDControlClient(self.socket_path, self.get_birdc())
+        # The config file is rendered incrementally, the global `mrtdump` of older versions is dropped.
+        self.renderer = ConfigRenderer(self.conf_path, BIRD_CONF_MARKER, BIRD_CONF_SECTIONS,
+                                       base_filter=r'^\s*mrtdump\s+"')
     
     ########## Turn on/off the instance ##########
 
     def start_bgp_instance(self):
         """
         Start the BGP instance using `self.router_agent_configuration` 
+        The config file is only written and reloaded if it changed,
+        and the peers disabled by `end_bgp_instance` are enabled again.
         """
-
-        # Preparing BIRD config file content.
-        peer_count = 1
-        neighbor_conf_list = []
-        for neighbor in self.router_agent_configuration.neighbors:
-            neighbor_conf = f"""
-protocol bgp peer{peer_count} {{
-  debug all;
-  mrtdump {{messages}};
-  local as {self.router_agent_configuration.asn};
-  neighbor {neighbor.peer_ip} as {neighbor.peer_asn};
-  enforce first as;
-  enable extended messages on;
-  interpret communities on;
-  passive yes;
-  ipv4 {{ import all; export all; }};
-}}
-"""
-            neighbor_conf_list.append(neighbor_conf)
-            peer_count = peer_count + 1
-        overall_conf = "".join(neighbor_conf_list)
-        
-        # Edit BIRD config file.
-        with open(BIRD_CONF, 'r') as f:
-            lines = f.readlines()
-        found = False
-        for i, line in enumerate(lines):
-            if line.strip() == BIRD_CONF_MARKER.strip():
-                found = True
-                break
-        if not found:
-            raise ValueError("BIRD configuration file marker not found! ({BIRD_CONF_MARKER})")
-        new_lines = lines[:i+1] + ['\n' + overall_conf + '\n']
-        # Write the configuration file of BIRD
-        with open(BIRD_CONF, 'w') as f:
-            f.writelines(new_lines)
+        if self.get_namespace() is not None and not file_exists(self.conf_path):
+            self.prepare_instance_config()
+        key = (self.router_agent_configuration.asn, tuple(self.router_agent_configuration.neighbors), self.get_bmp_station())
+        self.renderer.set_section("peers", key, self.render_peers)
+        written = self.renderer.write()
 
         # Apply configuration
-        self.config_instance()
+        if self.get_namespace() is not None and self.if_crashed():
+            # The configuration is read when the instance is launched.
+            self.launch_instance()
+        elif written:
+            self.config_instance()
+        self.ctl.execute(f'enable "{BIRD_PEER_PREFIX}*"')
 
     def end_bgp_instance(self):
         """
-        Shut down the BGP instance
+        Shut down the BGP instance by disabling its peers,
+        the config file is kept for the next instance.
         """
-        # Edit BIRD config file.
-        with open(BIRD_CONF, 'r') as f:
-            lines = f.readlines()
-        found = False
-        for i, line in enumerate(lines):
-            if line.strip() == BIRD_CONF_MARKER.strip():
-                found = True
-                break
-        if not found:
-            raise ValueError("BIRD configuration file marker not found! ({BIRD_CONF_MARKER})")
-        new_lines = lines[:i+1]
-        # Write the configuration file of BIRD
-        with open(BIRD_CONF, 'w') as f:
-            f.writelines(new_lines)
-        
-        # Apply configuration
-        self.config_instance()
+        self.ctl.execute(f'disable "{BIRD_PEER_PREFIX}*"')
 
     def restart_bgp_instance(self):
         """
@@ -105,134 +92,53 @@ protocol bgp peer{peer_count} {{
     
     ########## BIRD config file management ##########
 
-    def add_routes_mrt_config(self, dump_path: str):
+    def render_peers(self) -> str:
         """
-        Add the MRT config for dumping the routing table in the BIRD config file.
+        Render the BGP protocols of the neighbors (and the BMP protocol, if any).
         """
-        new_config = f'''protocol mrt {{
-\ttable "master4";
-\tfilename "{dump_path}";
-\tperiod 1;
+        neighbor_conf_list = []
+        for peer_count, neighbor in enumerate(self.router_agent_configuration.neighbors, start=1):
+            neighbor_conf = f"""
+protocol bgp {BIRD_PEER_PREFIX}{peer_count} {{
+  debug all;
+  mrtdump {{messages}};
+  local as {self.router_agent_configuration.asn};
+  neighbor {neighbor.peer_ip} as {neighbor.peer_asn};
+  enforce first as;
+  enable extended messages on;
+  interpret communities on;
+  passive yes;
+  ipv4 {{ import all; export all; }};
 }}
-'''
-        with open(BIRD_CONF, 'r') as f:
-            content = f.read()
-
-        # Regex match protocol mrt { ... }
-        pattern = re.compile(r'protocol\s+mrt\s*{[^}]*}', re.IGNORECASE | re.DOTALL)
-
-        if pattern.search(content):
-            # Why there is a `protocol mrt` configuration?
-            print(f"Warning: There is a existing mrt protocol configuration:\n {content}")
-            content = pattern.sub(new_config.strip(), content)
-        else:
-            # Append a configuration
-            content = content.strip()
-            content += '\n'
-            content += '\n' + new_config.strip() + '\n'
-
-        with open(BIRD_CONF, 'w') as f:
-            f.write(content)
-    
-    def remove_routes_mrt_config(self):
-        """
-        Remove the MRT config for dumping the routing table in the BIRD config file.
-        """
-        with open(BIRD_CONF, "r") as f:
-            content = f.read()
-
-        # match the protocol mrt { ... } section
-        pattern = re.compile(r'protocol\s+mrt\s*{[^}]*}', re.IGNORECASE | re.DOTALL)
-
-        if pattern.search(content):
-            content = pattern.sub('', content, count=1)
-            content = re.sub(r'\n{2,}', '\n\n', content) 
-            content = content.strip() + '\n'  # Maintain a newline in the end
-            with open(BIRD_CONF, 'w') as f:
-                f.write(content)
+"""
+            neighbor_conf_list.append(neighbor_conf)
+        bmp_station = self.get_bmp_station()
+        if bmp_station is not None:
+            # Report the Adj-RIB-In (pre/post-policy) to the BMP station (BIRD >= 2.14).
+            neighbor_conf_list.append(f"""
+protocol bmp {{
+  station address ip {bmp_station.ip} port {bmp_station.port};
+  monitoring rib in pre_policy;
+  monitoring rib in post_policy;
+}}
+""")
+        return "".join(neighbor_conf_list)
 
-    def add_messages_mrt_config(self, dump_path: str):
+    def apply_config(self) -> bool:
         """
-        Add the MRT config for dumping the BGP messages in the BIRD config file.
+        Write the config file and reload it, only if it changed.
+        Return `True` if it was reloaded.
         """
-        new_line = f'mrtdump "{dump_path}";'
-
-        with open(BIRD_CONF, 'r') as f:
-            content = f.read()
-
-        # Find all protocol {...} sections
-        protocol_blocks = [m.span() for m in re.finditer(r'protocol\s+\w+\s*{[^}]*}', content, re.DOTALL | re.IGNORECASE)]
-
-        # Check if the position is in any protocol block
-        def in_protocol_block(pos):
-            return any(start <= pos < end for start, end in protocol_blocks)
-
-        mrtdump_pattern = re.compile(r'mrtdump\s+"[^"]*"\s*;', re.IGNORECASE)
-        for match in mrtdump_pattern.finditer(content):
-            if not in_protocol_block(match.start()):
-                # Found an existing global config of mrtdump?
-                content = content[:match.start()] + new_line + content[match.end():]
-                print(f"Warning: There is a existing mrt protocol configuration:\n {content}")
-                break
-        else:
-            # Append a configuration
-            content = content.strip()
-            content += '\n'
-            content += '\n' + new_line + '\n'
-
-        with open(BIRD_CONF, 'w') as f:
-            f.write(content)
-    
-    def remove_messages_mrt_config(self):
-        """
-        Remove the MRT config for dumping the BGP messages in the BIRD config file.
-        """
-        with open(BIRD_CONF, "r") as f:
-            content = f.read()
-
-        # Gather all positions of protocol {...}
-        proto_spans = [
-            m.span()
-            for m in re.finditer(
-                r'protocol\s+\w+\s*{[^}]*}',
-                content,
-                flags=re.IGNORECASE | re.DOTALL,
-            )
-        ]
-
-        # Check if the position is in any protocol block
-        def inside_protocol(pos: int) -> bool:
-            return any(start <= pos < end for start, end in proto_spans)
-
-        # Matche all lines look like mrtdump "xxx";
-        mrtdump_pat = re.compile(
-            r'^[ \t]*mrtdump\s+"[^"]*"\s*;\s*$', flags=re.IGNORECASE | re.MULTILINE
-        )
-
-        new_chunks = []
-        last_end = 0
-        removed = False
-
-        for m in mrtdump_pat.finditer(content):
-            if not inside_protocol(m.start()):
-                new_chunks.append(content[last_end : m.start()])
-                last_end = m.end()
-                removed = True
-                break
-
-        new_chunks.append(content[last_end:])  # Append the other contents
+        if not self.renderer.write():
+            return False
+        self.config_instance()
+        return True
 
-        if removed:
-            # Write back, and make sure there is a newline in the end.
-            new_content = "".join(new_chunks).rstrip() + "\n"
-            with open(BIRD_CONF, "w") as f:
-                f.write(new_content)
-    
     def config_in_progress(self):
         """
         Check if the configuration is in progress
         """
-        output = subprocess.check_output(['sudo', 'birdc', 'show', 'status'], stderr=subprocess.STDOUT, text=True)
+        output = self.ctl.execute("show status").get_output()
         return "reconfiguration in progress" in output.lower()
                 
     def config_instance(self):
@@ -245,9 +151,9 @@ protocol bgp peer{peer_count} {{
             counter = counter + 1
             if counter>40:
                 print("BIRD routing daemon configure for too long! Regard as a failure.")
-                os.system("sudo kill -9 $(pidof bird)")
+                self.kill_software()
                 return
-        os.system("sudo birdc configure")
+        self.ctl.execute("configure")
 
     ########## Dump MRT file ##########
 
@@ -255,29 +161,94 @@ protocol bgp peer{peer_count} {{
         """
         Dump only BGP messages to `path`.
         """
-        self.add_messages_mrt_config(path)
-        self.config_instance()
+        self.renderer.set_section("message_dump", path, lambda: f'mrtdump "{path}";')
+        self.apply_config()
 
     def dump_routing_table(self, path: str):
         """
         Dump the whole BGP routing table to `path`.
         """
-        self.add_routes_mrt_config(path)
-        self.config_instance()
+        self.renderer.set_section("table_dump", (path, True), lambda: self.render_table_dump(path, enabled=True))
+        self.apply_config()
+        # The protocol may have been disabled by `stop_dump_routing_table`.
+        self.ctl.execute(f"enable {BIRD_MRT_PROTOCOL}")
     
     def stop_dump_messages(self):
         """
         Stop `dump_updates`.
         """
-        self.remove_messages_mrt_config()
-        self.config_instance()
+        self.renderer.remove_section("message_dump")
+        self.apply_config()
 
     def stop_dump_routing_table(self):
         """
         Stop `dump_routing_table`.
+        The protocol is disabled without reloading, the config file disables it too (e.g., for a restarted daemon).
         """
-        self.remove_routes_mrt_config()
-        self.config_instance()
+        self.ctl.execute(f"disable {BIRD_MRT_PROTOCOL}")
+        key = self.renderer.get_key("table_dump")
+        if key is not None:
+            path = key[0]
+            self.renderer.set_section("table_dump", (path, False), lambda: self.render_table_dump(path, enabled=False))
+            self.renderer.write()
+
+    def render_table_dump(self, path: str, enabled: bool) -> str:
+        """
+        Render the MRT protocol dumping the routing table every second.
+        """
+        return f'''protocol mrt {BIRD_MRT_PROTOCOL} {{
+\tdisabled {"no" if enabled else "yes"};
+\ttable "master4";
+\tfilename "{path}";
+\tperiod 1;
+}}
+'''
+
+    ########## Multiple instances ##########
+
+    MULTI_INSTANCE = True
+
+    BMP_SUPPORT = True
+
+    def get_birdc(self) -> list[str]:
+        """
+        Get the birdc command connecting to the control socket of the instance.
+        """
+        if self.get_namespace() is None:
+            return ['sudo', 'birdc']
+        return ['sudo', 'birdc', '-s', self.socket_path]
+
+    def prepare_instance_config(self):
+        """
+        Create the config file of the instance from the system-wide one (up to the marker),
+        logging into the log of the instance.
+        """
+        with open(BIRD_CONF, 'r') as f:
+            lines = f.readlines()
+        for i, line in enumerate(lines):
+            if line.strip() == BIRD_CONF_MARKER.strip():
+                lines = lines[:i+1]
+                break
+        log_pattern = re.compile(r'^(\s*log\s+)"[^"]*"')
+        lines = [line for line in lines if not log_pattern.match(line)]
+        with open(self.conf_path, 'w') as f:
+            f.writelines([f'log "{self.log_path}" all;\n'] + lines)
+
+    def launch_instance(self):
+        """
+        Launch the BIRD daemon of the instance in its namespace.
+        """
+        os.system(self.get_command(f"bird -c {self.conf_path} -s {self.socket_path} -P {self.pid_path}"))
+        self.wait_until_running()
+
+    def kill_software(self):
+        """
+        Kill the BIRD daemon (of the instance).
+        """
+        if self.get_namespace() is None:
+            os.system("sudo kill -9 $(pidof bird)")
+        else:
+            os.system(f"sudo kill -9 $(sudo cat {self.pid_path}) 2> /dev/null")
 
     ########## Log manipulation ##########
 
@@ -286,22 +257,63 @@ protocol bgp peer{peer_count} {{
         Read (all) the content from the routing softwares' log.
         Must execute with sudo-command.
         """
-        return read_file(BIRD_LOG)
+        return self.log_tailer.read_all()
 
     def clear_log(self):
         """
         Clear the content from the routing softwares' log.
         Must execute with sudo-command.
         """
-        clear_file(BIRD_LOG)
+        clear_file(self.log_path)
+        self.log_tailer.reset()
     
+    ########## Session reuse ##########
+
+    SESSION_REUSE = True
+
+    def get_protocol_name(self, peer_ip: str) -> str:
+        """
+        Get the name of the BGP protocol of the neighbor (see `start_bgp_instance`).
+        """
+        for peer_count, neighbor in enumerate(self.router_agent_configuration.neighbors, start=1):
+            if neighbor.peer_ip == peer_ip:
+                return f"{BIRD_PEER_PREFIX}{peer_count}"
+        raise ValueError(f"{peer_ip} is not a neighbor of the BIRD instance!")
+
+    def reset_peer(self, peer_ip: str):
+        """
+        Reset the BGP session with the peer, dropping the routes learned from it.
+        """
+        self.ctl.execute(f"restart {self.get_protocol_name(peer_ip)}")
+
+    def get_rib_size(self) -> int:
+        """
+        Get the number of routes in the RIB, `None` if it cannot be retrieved.
+        """
+        reply = self.ctl.execute("show route count")
+        if not reply.succeeded():
+            return None
+        match = re.search(r'(\d+) of \d+ routes', reply.get_output())
+        if match is None:
+            return None
+        return int(match.group(1))
+
     ########## Crash management ##########
     
-    @classmethod
-    def if_crashed(cls) -> bool:
+    def get_daemon_patterns(self) -> list[str]:
+        """
+        Get the pattern matching the command line of bird (of the instance, identified by its control socket).
+        """
+        if self.get_namespace() is not None:
+            return [rf"^(\S*/)?bird2? .*-s {re.escape(self.socket_path)}( |$)"]
+        return [r"^(\S*/)?bird2?( |$)"]
+
+    def check_crashed(self) -> bool:
         """
-        Return if the router software has crashed.
+        Check if the router software has crashed.
         """
+        if self.get_namespace() is not None:
+            return not self.pid_alive(self.pid_path)
         # Get all process
         ps_output = subprocess.check_output(["ps", "aux"]).decode("utf-8")
 
@@ -325,8 +337,11 @@ protocol bgp peer{peer_count} {{
         started = not self.if_crashed()
         counter = 0
         while not started:
-            os.system("sudo bird")
-            sleep(10)
+            if self.get_namespace() is None:
+                os.system("sudo bird")
+            else:
+                self.launch_instance()
+            self.wait_until_running()
             started = not self.if_crashed()
             counter  = counter + 1
             if counter>=5:
@@ -336,5 +351,8 @@ protocol bgp peer{peer_count} {{
         """
         Restart the software.
         """
-        os.system("sudo kill -9 $(pidof bird)")
-        os.system("sudo bird")
+        self.kill_software()
+        if self.get_namespace() is None:
+            os.system("sudo bird")
+        else:
+            self.launch_instance()
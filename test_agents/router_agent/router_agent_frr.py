@@ -4,11 +4,16 @@ The FRR router.
 
 from .basic_types import *
 from .router_agent_base import BaseRouterAgent
-from basic_utils.file_utils import read_file, clear_file
-from time import sleep
-import subprocess, os, time
+from .frr_vty import FRRVTYClient
+from basic_utils.log_tail_utils import LogTailer
+from basic_utils.file_utils import clear_file, file_exists, wait_for_file
+import subprocess, os, json, re
 
 FRR_LOG = "/var/log/frr/bgpd.log"
+FRR_DAEMON_DIR = "/usr/lib/frr"
+FRR_RUN_DIR = "/var/run/frr"
+# The daemons launched for an FRR instance (`bgpd` needs `zebra` for the interfaces).
+FRR_INSTANCE_DAEMONS = ["zebra", "bgpd"]
 
 class FRRRouterAgent(BaseRouterAgent):
     """
@@ -25,38 +30,48 @@ class FRRRouterAgent(BaseRouterAgent):
             raise ValueError(f"Initializing FRR router with router type {configuration.get_router_type()}!")
         self.router_agent_type : RouterAgentType = RouterAgentType.FRR
         self.router_agent_configuration : RouterAgentConfiguration = configuration
-    
-    # This should be attached to the begining of the command you want to execute.
-    FRR_CONFIG_TERMINAL = [
-        "sudo vtysh",
-        "-c 'configure terminal'"
-    ]
+        if self.get_namespace() is None:
+            self.log_path = FRR_LOG
+        else:
+            # The instance uses the FRR pathspace named after its namespace.
+            name = self.get_namespace()
+            os.system(f"sudo install -d -o frr -g frr /etc/frr/{name} /var/run/frr/{name} /var/log/frr/{name}")
+            self.log_path = f"/var/log/frr/{name}/bgpd.log"
+        self.log_tailer = LogTailer(self.log_path)
+        # The persistent control channel to bgpd, all the commands go through it.
+        self.vty = FRRVTYClient(self.get_vty_socket_path(), self.get_vtysh())
 
-    def execute_commands_in_config_level(self, commands: list[str]):
+    def get_vtysh(self) -> list[str]:
+        """
+        Get the vtysh command connecting to the instance.
+        """
+        if self.get_namespace() is None:
+            return ["sudo", "vtysh"]
+        return ["sudo", "vtysh", "-N", self.get_namespace()]
+
+    def get_vty_socket_path(self) -> str:
+        """
+        Get the VTY socket of the bgpd of the instance.
+        """
+        if self.get_namespace() is None:
+            return f"{FRR_RUN_DIR}/bgpd.vty"
+        return f"{FRR_RUN_DIR}/{self.get_namespace()}/bgpd.vty"
+
+    def execute_commands_in_config_level(self, commands: list[str]) -> bool:
         """
         Execute the commands in the `configure terminal` level
         the `commands` should be a list of the commands you want to execute
-        no need to care about the `sudo vtysh -c` stuff...
+        Return `False` if a command failed.
         """
-        modified_commands = [
-            f"-c '{command}'" for command in commands
-        ]
-        full_commands = FRRRouterAgent.FRR_CONFIG_TERMINAL + modified_commands
-        single_command = " ".join(full_commands)
-        os.system(single_command)
+        return self.vty.execute(commands, config=True)[-1].succeeded()
     
-    def execute_commands_in_router_level(self, commands: list[str]):
+    def execute_commands_in_router_level(self, commands: list[str]) -> bool:
         """
         Execute the commands in the `router bgp <asn>` level
         the `commands` should be a list of the commands you want to execute
-        no need to care about the `sudo vtysh -c` stuff...
+        Return `False` if a command failed.
         """
-        modified_commands = [
-            f"-c '{command}'" for command in commands
-        ]
-        full_commands = FRRRouterAgent.FRR_CONFIG_TERMINAL + [f"-c 'router bgp {self.router_agent_configuration.asn}'"] + modified_commands
-        single_command = " ".join(full_commands)
-        os.system(single_command)
+        return self.execute_commands_in_config_level([f"router bgp {self.router_agent_configuration.asn}"] + commands)
 
     ########## Turn on/off the instance ##########
 
@@ -64,6 +79,9 @@ class FRRRouterAgent(BaseRouterAgent):
         """
         Start the BGP instance using `self.router_agent_configuration` 
         """
+        if self.get_namespace() is not None and self.if_crashed():
+            # Launch the daemons of the instance first.
+            self.launch_instance()
         config_debugging_info = [
             "debug bgp neighbor-events",
             "debug bgp updates",
@@ -90,7 +108,20 @@ class FRRRouterAgent(BaseRouterAgent):
                 f"neighbor {neighbor.peer_ip} next-hop-self",
             ]
         ]
-        commands = config_debugging_info + config_router_info + config_local_prefix + config_neighbor
+        config_bmp = []
+        bmp_station = self.get_bmp_station()
+        if bmp_station is not None:
+            # Report the Adj-RIB-In (pre/post-policy) and the Loc-RIB to the BMP station (needs `bgpd -M bmp`).
+            config_bmp = [
+                "bmp targets bgprobe",
+                f"bmp connect {bmp_station.ip} port {bmp_station.port} min-retry 100 max-retry 1000",
+                "bmp monitor ipv4 unicast pre-policy",
+                "bmp monitor ipv4 unicast post-policy",
+                "bmp monitor ipv4 unicast loc-rib",
+                f"bmp stats interval {bmp_station.stats_interval * 1000}",
+                "exit",
+            ]
+        commands = config_debugging_info + config_router_info + config_local_prefix + config_neighbor + config_bmp
         # execute the command
         self.execute_commands_in_config_level(commands=commands)
     
@@ -125,27 +156,18 @@ class FRRRouterAgent(BaseRouterAgent):
 
     def dump_routing_table(self, path: str):
         """
-        Dump the whole BGP routing table to `path`, with a 3 second timeout.
+        Dump the whole BGP routing table to `path`, with the RIB dump timeout of the timing profile.
         Timeout if the file size keep growing
         """
         self.execute_commands_in_config_level([f"dump bgp routes-mrt {path}"])
-        sleep(0.1)
-        start_time = time.time()
-        cur_size = 0
-        prev_size = 0
-        still_increasing = True
-        while time.time() - start_time < 3:
-            cur_size = os.path.getsize(path)
-            if cur_size != prev_size:
-                sleep(0.1)
-            else:
-                still_increasing = False
-                break
-            prev_size = cur_size
-        if still_increasing:
+        completed = wait_for_file(path, idle_window=0.1, timeout=self.get_timing_profile().rib_dump_timeout)
+        if not completed and file_exists(path):
             # If the file size keeps increasing
-            os.system("sudo pkill -9 frr")
-            os.system("sudo pkill -9 bgpd")
+            if self.get_namespace() is None:
+                os.system("sudo pkill -9 frr")
+                os.system("sudo pkill -9 bgpd")
+            else:
+                self.kill_instance()
     
     def stop_dump_updates(self):
         """
@@ -159,6 +181,40 @@ class FRRRouterAgent(BaseRouterAgent):
         """
         self.execute_commands_in_config_level(["no dump bgp routes-mrt"])
 
+    ########## Multiple instances ##########
+
+    MULTI_INSTANCE = True
+
+    BMP_SUPPORT = True
+
+    def get_pid_path(self, daemon: str) -> str:
+        """
+        Get the PID file of the daemon of the instance.
+        """
+        return f"/var/run/frr/{self.get_namespace()}/{daemon}.pid"
+
+    def launch_instance(self):
+        """
+        Launch the daemons of the instance in its namespace, with the FRR pathspace (`-N`) of the instance.
+        """
+        name = self.get_namespace()
+        for daemon in FRR_INSTANCE_DAEMONS:
+            log_path = self.log_path if daemon == "bgpd" else f"/var/log/frr/{name}/{daemon}.log"
+            # Load the BMP module of `bgpd` (the system-wide instance needs `bgpd_options=" -M bmp"` in `/etc/frr/daemons`).
+            modules = " -M bmp" if daemon == "bgpd" and self.get_bmp_station() is not None else ""
+            os.system(self.get_command(
+                f"{FRR_DAEMON_DIR}/{daemon} -d -N {name} -i {self.get_pid_path(daemon)}{modules} "
+                f"--log file:{log_path} --log-level debug"
+            ))
+        self.wait_until_running()
+
+    def kill_instance(self):
+        """
+        Kill the daemons of the instance.
+        """
+        for daemon in reversed(FRR_INSTANCE_DAEMONS):
+            os.system(f"sudo kill -9 $(sudo cat {self.get_pid_path(daemon)}) 2> /dev/null")
+
     ########## Log manipulation ##########
 
     def read_log(self):
@@ -166,22 +222,52 @@ class FRRRouterAgent(BaseRouterAgent):
         Read (all) the content from the routing softwares' log.
         Must execute with sudo-command.
         """
-        return read_file(FRR_LOG)
+        return self.log_tailer.read_all()
 
     def clear_log(self):
         """
         Clear the content from the routing softwares' log.
         Must execute with sudo-command.
         """
-        clear_file(FRR_LOG)
+        clear_file(self.log_path)
+        self.log_tailer.reset()
+
+    ########## Session reuse ##########
+
+    SESSION_REUSE = True
+
+    def reset_peer(self, peer_ip: str):
+        """
+        Reset the BGP session with the peer, dropping the routes learned from it.
+        """
+        self.vty.execute([f"clear bgp {peer_ip}"])
+
+    def get_rib_size(self) -> int:
+        """
+        Get the number of IPv4 unicast routes in the RIB, `None` if it cannot be retrieved.
+        """
+        output = self.vty.get_output("show bgp summary json")
+        try:
+            return json.loads(output).get("ipv4Unicast", {}).get("ribCount", 0)
+        except (json.JSONDecodeError, AttributeError, TypeError):
+            return None
 
     ########## Crash management ##########
 
-    @classmethod
-    def if_crashed(cls) -> bool:
+    def get_daemon_patterns(self) -> list[str]:
         """
-        Return if the router software has crashed.
+        Get the patterns matching the command lines of zebra and bgpd (of the instance, identified by `-N`).
         """
+        if self.get_namespace() is not None:
+            return [rf"^{FRR_DAEMON_DIR}/{daemon} .*-N {re.escape(self.get_namespace())}( |$)" for daemon in FRR_INSTANCE_DAEMONS]
+        return [rf"^{FRR_DAEMON_DIR}/{daemon}(?!.* -N )( |$)" for daemon in FRR_INSTANCE_DAEMONS]
+
+    def check_crashed(self) -> bool:
+        """
+        Check if the router software has crashed.
+        """
+        if self.get_namespace() is not None:
+            return not all(self.pid_alive(self.get_pid_path(daemon)) for daemon in FRR_INSTANCE_DAEMONS)
         output = subprocess.getoutput("systemctl is-active frr")
         return output!="active"
 
@@ -192,8 +278,12 @@ class FRRRouterAgent(BaseRouterAgent):
         started = not self.if_crashed()
         counter = 0
         while not started:
-            os.system("sudo systemctl start frr")
-            sleep(0.5)
+            if self.get_namespace() is None:
+                os.system("sudo systemctl start frr")
+            else:
+                self.kill_instance()
+                self.launch_instance()
+            self.wait_until_running()
             started = not self.if_crashed()
             counter  = counter + 1
             if counter>=5:
@@ -203,9 +293,13 @@ class FRRRouterAgent(BaseRouterAgent):
         """
         Restart the software.
         """
+        if self.get_namespace() is not None:
+            self.kill_instance()
+            self.launch_instance()
+            return
         os.system("sudo systemctl reset-failed frr.service")
         os.system("sudo systemctl restart frr")
-        sleep(0.5)
+        self.wait_until_running()
 
    
     ########## Modification, derpecated ##########
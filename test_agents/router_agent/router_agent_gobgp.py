@@ -4,8 +4,10 @@ The GoBGP router.
 
 from .basic_types import *
 from .router_agent_base import BaseRouterAgent
-from basic_utils.file_utils import read_file, clear_file, delete_file
-from time import sleep
+from .gobgp_api import GoBGPAPIClient, GOBGP_API_PORT
+from basic_utils.log_tail_utils import LogTailer
+from basic_utils.file_utils import clear_file, delete_file, file_exists
+from basic_utils.time_utils import wait_until
 from basic_utils.const import REPO_ROOT_PATH
 from tomlkit import parse, dumps
 import subprocess, re
@@ -29,13 +31,39 @@ class GoBGPRouterAgent(BaseRouterAgent):
             raise ValueError(f"Initializing GoBGP router with router type {configuration.get_router_type()}!")
         self.router_agent_type : RouterAgentType = RouterAgentType.GOBGP
         self.router_agent_configuration : RouterAgentConfiguration = configuration
+        if self.get_namespace() is None:
+            self.conf_path = GOBGP_CONF
+            self.log_path = GOBGP_LOG
+        else:
+            # Each instance has its own config and log, the gRPC API listens in its own namespace.
+            self.conf_path = self.get_instance_path("gobgpd.conf")
+            self.log_path = self.get_instance_path("gobgp.log")
+            if not file_exists(self.conf_path):
+                os.system(f"cp {GOBGP_CONF} {self.conf_path}")
+        self.log_tailer = LogTailer(self.log_path)
+        # The gRPC API of the long-running gobgpd, used if `grpc` and the stubs are available.
+        if self.get_namespace() is None:
+            self.api = GoBGPAPIClient(f"127.0.0.1:{GOBGP_API_PORT}")
+        else:
+            # The API listens on a unix socket, reachable from outside the namespace.
+            self.api_socket_path = self.get_instance_path("gobgpd.sock")
+            self.api = GoBGPAPIClient(f"unix://{self.api_socket_path}")
+        # The MRT files of the next instance (see `message_mrt_dump_config`, `route_mrt_dump_config`).
+        self.message_mrt_path : str = None
+        self.route_mrt_path : str = None
+        # Set if an MRT dump could not be disabled, gobgpd is restarted to stop it.
+        self.mrt_leftover = False
 
     ########## Turn on/off the instance ##########
 
     def start_bgp_instance(self):
         """
         Start the BGP instance using `self.router_agent_configuration` 
+        Through the gRPC API of the running gobgpd if available, otherwise by rewriting the config file and restarting gobgpd.
         """
+        if self.api.available():
+            self.start_bgp_instance_with_api()
+            return
         global_conf = f"""
 [global.config]
   as = {self.router_agent_configuration.asn}
@@ -72,14 +100,25 @@ class GoBGPRouterAgent(BaseRouterAgent):
     multihop-ttl = 100
 """
             neighbor_conf_list.append(neighbor_conf)
+        bmp_station = self.get_bmp_station()
+        if bmp_station is not None:
+            # Report the Adj-RIB-In (pre/post-policy) and the Loc-RIB to the BMP station.
+            neighbor_conf_list.append(f"""
+[[bmp-servers]]
+  [bmp-servers.config]
+    address = "{bmp_station.ip}"
+    port = {bmp_station.port}
+    route-monitoring-policy = "all"
+    statistics-timeout = {bmp_station.stats_interval}
+""")
         overall_conf = global_conf + only_allow_neighboring_as_policy + "".join(neighbor_conf_list)
         
         # Remove the old log file
-        delete_file(GOBGP_LOG)
+        delete_file(self.log_path)
         # Clear the old gobgpd process
-        os.system("sudo pkill gobgp")
+        self.kill_software()
         # Edit GoBGP config file.
-        with open(GOBGP_CONF, 'r') as f:
+        with open(self.conf_path, 'r') as f:
             lines = f.readlines()
         found = False
         for i, line in enumerate(lines):
@@ -90,17 +129,23 @@ class GoBGPRouterAgent(BaseRouterAgent):
             raise ValueError(f"GoBGP configuration file marker not found! ({GOBGP_CONF_MARKER})")
         new_lines = lines[:i+1] + ['\n' + overall_conf + '\n']
         # Write the configuration file of BIRD
-        with open(GOBGP_CONF, 'w') as f:
+        with open(self.conf_path, 'w') as f:
             f.writelines(new_lines)
         
-        os.system(f"nohup sudo -E gobgpd -f {GOBGP_CONF} -p -l debug > {GOBGP_LOG} &")
-        sleep(0.5)
+        if self.get_namespace() is None:
+            os.system(f"nohup sudo -E gobgpd -f {self.conf_path} -p -l debug > {self.log_path} &")
+        else:
+            os.system(f"nohup {self.get_command(f'gobgpd -f {self.conf_path} -p -l debug')} > {self.log_path} &")
+        self.wait_until_running()
     
     def end_bgp_instance(self):
         """
         Shut down the BGP instance
         """
-        os.system("sudo pkill gobgp")
+        if self.api.available():
+            self.end_bgp_instance_with_api()
+            return
+        self.kill_software()
 
     def restart_bgp_instance(self):
         """
@@ -108,32 +153,147 @@ class GoBGPRouterAgent(BaseRouterAgent):
         """
         raise NotImplementedError("`restart_bgp_instance` not implemented!")
     
+    ########## gRPC API ##########
+
+    def launch_daemon(self):
+        """
+        Launch a bare gobgpd, whose BGP instance is set up through the gRPC API.
+        """
+        # Remove the old log file
+        delete_file(self.log_path)
+        if self.get_namespace() is None:
+            os.system(f"nohup sudo -E gobgpd -p -l debug > {self.log_path} &")
+        else:
+            os.system(f"nohup {self.get_command(f'gobgpd -p -l debug --api-hosts unix://{self.api_socket_path}')} "
+                      f"> {self.log_path} &")
+        self.wait_until_running()
+        timeout = self.get_timing_profile().restart_timeout
+        if self.get_namespace() is not None:
+            # The socket is created by root.
+            wait_until(lambda: os.path.exists(self.api_socket_path), timeout, interval=0.05)
+            os.system(f"sudo chmod a+rw {self.api_socket_path}")
+        self.api.close()
+        if not self.api.wait_until_ready(timeout):
+            print("The gRPC API of gobgpd is not ready!")
+
+    def start_bgp_instance_with_api(self):
+        """
+        Start the BGP instance through the gRPC API, launching gobgpd only if it is not running.
+        """
+        if self.check_crashed():
+            self.launch_daemon()
+        bmp_station = self.get_bmp_station()
+        if not self.api.start_bgp(self.router_agent_configuration, bmp_station):
+            # Leftovers of an instance not shut down (e.g., an interrupted run).
+            self.api.stop_bgp(self.router_agent_configuration, bmp_station)
+            self.api.start_bgp(self.router_agent_configuration, bmp_station)
+        if self.message_mrt_path is not None:
+            self.api.enable_mrt(self.message_mrt_path, table=False)
+        if self.route_mrt_path is not None:
+            self.api.enable_mrt(self.route_mrt_path, table=True)
+
+    def end_bgp_instance_with_api(self):
+        """
+        Shut down the BGP instance through the gRPC API, gobgpd keeps running.
+        """
+        if self.check_crashed():
+            return
+        for path in [self.message_mrt_path, self.route_mrt_path]:
+            if path is not None and not self.api.disable_mrt(path):
+                self.mrt_leftover = True
+        self.api.stop_bgp(self.router_agent_configuration, self.get_bmp_station())
+
+    def get_rib(self, peer_ip: str = None) -> list[dict]:
+        """
+        Get the destinations of the Loc-RIB, or of the Adj-RIB-In of the peer, `None` if they cannot be retrieved.
+        """
+        if not self.api.available():
+            return None
+        return self.api.list_paths(peer_ip)
+
+    def get_peers(self) -> list[dict]:
+        """
+        Get the peers (config, session state, counters), `None` if they cannot be retrieved.
+        """
+        if not self.api.available():
+            return None
+        return self.api.list_peers()
+
+    def reset_peer(self, peer_ip: str):
+        """
+        Reset the BGP session with the peer, dropping the routes learned from it.
+        """
+        if not self.api.available():
+            raise NotImplementedError("`reset_peer` needs the gRPC API of GoBGP!")
+        self.api.reset_peer(peer_ip)
+
+    def get_rib_size(self) -> int:
+        """
+        Get the number of routes in the RIB, `None` if it cannot be retrieved.
+        """
+        if not self.api.available():
+            return None
+        return self.api.get_rib_size()
+
     ########## GoBGP config file management ##########
 
     def message_mrt_dump_config(self, path: str):
         """
         Modify the config file for message MRT dumping.
+        With the gRPC API, the dump is enabled when the instance starts.
         """
-        with open(GOBGP_CONF, "r") as f:
+        self.message_mrt_path = path
+        if self.api.available():
+            return
+        with open(self.conf_path, "r") as f:
             config = parse(f.read())
         for entry in config["mrt-dump"]:
             if entry["config"]["dump-type"] == "updates":
                 entry["config"]["file-name"] = path
-        with open(GOBGP_CONF, "w") as f:
+        with open(self.conf_path, "w") as f:
             f.write(dumps(config))
 
     def route_mrt_dump_config(self, path: str):
         """
         Modify the config file for route MRT dumping.
+        With the gRPC API, the dump is enabled when the instance starts.
         """
-        with open(GOBGP_CONF, "r") as f:
+        self.route_mrt_path = path
+        if self.api.available():
+            return
+        with open(self.conf_path, "r") as f:
             config = parse(f.read())
         for entry in config["mrt-dump"]:
             if entry["config"]["dump-type"] == "table":
                 entry["config"]["file-name"] = path
-        with open(GOBGP_CONF, "w") as f:
+        with open(self.conf_path, "w") as f:
             f.write(dumps(config))
     
+    ########## Multiple instances ##########
+
+    MULTI_INSTANCE = True
+
+    BMP_SUPPORT = True
+
+    def get_daemon_identifier(self) -> str:
+        """
+        Get the part of the command line identifying the gobgpd of the instance:
+        its API socket with the gRPC API, its config path otherwise.
+        """
+        if self.api.available():
+            return self.api_socket_path
+        return self.conf_path
+
+    def kill_software(self):
+        """
+        Kill the gobgpd process (of the instance, identified by its API socket or config path).
+        """
+        if self.get_namespace() is None:
+            os.system("sudo pkill gobgp")
+        else:
+            os.system(f"sudo pkill -f {self.get_daemon_identifier()}")
+        self.api.close()
+
     ########## Log manipulation ##########
 
     def read_log(self):
@@ -141,22 +301,32 @@ class GoBGPRouterAgent(BaseRouterAgent):
         Read (all) the content from the routing softwares' log.
         Must execute with sudo-command.
         """
-        return read_file(GOBGP_LOG)
+        return self.log_tailer.read_all()
 
     def clear_log(self):
         """
         Clear the content from the routing softwares' log.
         Must execute with sudo-command.
         """
-        clear_file(GOBGP_LOG)
+        clear_file(self.log_path)
+        self.log_tailer.reset()
     
     ########## Crash management ##########
     
-    @classmethod
-    def if_crashed(cls) -> bool:
+    def get_daemon_patterns(self) -> list[str]:
+        """
+        Get the pattern matching the command line of gobgpd (of the instance, identified by its API socket or config path).
+        """
+        if self.get_namespace() is not None:
+            return [rf"^(\S*/)?gobgpd .*{re.escape(self.get_daemon_identifier())}( |$)"]
+        return [r"^(\S*/)?gobgpd( |$)"]
+
+    def check_crashed(self) -> bool:
         """
-        Return if the router software has crashed.
+        Check if the router software has crashed.
         """
+        if self.get_namespace() is not None:
+            return not self.process_alive(f"gobgpd .*{self.get_daemon_identifier()}")
         # Get all process
         ps_output = subprocess.check_output(["ps", "aux"]).decode("utf-8")
 
@@ -176,13 +346,18 @@ class GoBGPRouterAgent(BaseRouterAgent):
     def recover_from_crash(self):
         """
         Recover the software from crash.
-        Do NOTHING here because the daemon and instance of GoBGP are as a whole.
+        Without the gRPC API, do NOTHING here because the daemon and instance of GoBGP are as a whole.
         """
-        return
+        if self.api.available() and self.check_crashed():
+            self.launch_daemon()
     
     def restart_software(self):
         """
         Restart the software.
-        Do NOTHING here because the daemon and instance of GoBGP are as a whole.
+        With the gRPC API, gobgpd is only restarted if an MRT dump could not be stopped
+        (a crashed gobgpd is launched again by `start_bgp_instance`).
+        Without it, do NOTHING here because the daemon and instance of GoBGP are as a whole.
         """
-        return
+        if self.api.available() and self.mrt_leftover:
+            self.kill_software()
+            self.mrt_leftover = False
@@ -4,7 +4,9 @@ The OpenBGPD router.
 
 from .basic_types import *
 from .router_agent_base import BaseRouterAgent
-from basic_utils.file_utils import read_file, clear_file, delete_file
+from .config_renderer import ConfigRenderer
+from basic_utils.log_tail_utils import LogTailer
+from basic_utils.file_utils import clear_file, delete_file, file_exists
 from time import sleep
 from basic_utils.const import REPO_ROOT_PATH
 from tomlkit import parse, dumps
@@ -12,6 +14,8 @@ import subprocess, re
 
 OPENBGPD_CONF = "/usr/local/etc/bgpd.conf"
 OPENBGPD_CONF_MARKER = "###### Configure below ######"
+# The sections rendered below the marker (see `ConfigRenderer`), the global settings come before the neighbors.
+OPENBGPD_CONF_SECTIONS = ["global", "message_dump", "table_dump", "neighbors"]
 OPENBGPD_LOG = "/var/log/bgpd.log"
 
 class OpenBGPDRouterAgent(BaseRouterAgent):
@@ -29,14 +33,96 @@ class OpenBGPDRouterAgent(BaseRouterAgent):
             raise ValueError(f"Initializing OpenBGPD router with router type {configuration.get_router_type()}!")
         self.router_agent_type : RouterAgentType = RouterAgentType.OPENBGPD
         self.router_agent_configuration : RouterAgentConfiguration = configuration
+        if self.get_namespace() is None:
+            self.conf_path = OPENBGPD_CONF
+            self.log_path = OPENBGPD_LOG
+        else:
+            # Each instance has its own config, control socket and log.
+            # The instance runs in the foreground, logging to its own log instead of syslog.
+            self.conf_path = self.get_instance_path("bgpd.conf")
+            self.log_path = self.get_instance_path("bgpd.log")
+            self.socket_path = self.get_instance_path("bgpd.sock")
+            if not file_exists(self.conf_path):
+                os.system(f"cp {OPENBGPD_CONF} {self.conf_path}")
+        self.log_tailer = LogTailer(self.log_path)
+        # The config file is rendered incrementally, the dumps written above the marker by older versions are dropped.
+        self.renderer = ConfigRenderer(self.conf_path, OPENBGPD_CONF_MARKER, OPENBGPD_CONF_SECTIONS,
+                                       base_filter=r'^dump (all in|table-v2)\s')
     
     ########## Turn on/off the instance ##########
 
     def start_bgp_instance(self):
         """
         Start the BGP instance using `self.router_agent_configuration` 
+        If bgpd is running, the config file is only written and reloaded if it changed,
+        and the neighbors taken down by `end_bgp_instance` are brought up again.
+        """
+        self.renderer.set_section("global", self.router_agent_configuration.asn, self.render_global)
+        self.renderer.set_section("neighbors", tuple(self.router_agent_configuration.neighbors), self.render_neighbors)
+        written = self.renderer.write()
+
+        if self.check_crashed():
+            if self.get_namespace() is None:
+                os.system("sudo -E bgpd -v")
+            else:
+                os.system(f"nohup {self.get_command(f'bgpd -d -v -f {self.conf_path}')} > {self.log_path} 2>&1 &")
+            return
+        if written:
+            self.execute_bgpctl(["reload"])
+        self.set_neighbors_up(True)
+    
+    def end_bgp_instance(self):
+        """
+        Shut down the BGP instance by taking its neighbors down, bgpd keeps running.
+        The MRT dumps are removed, so the files of this testcase are not written any more.
+        """
+        if self.check_crashed():
+            return
+        self.set_neighbors_up(False)
+        self.renderer.remove_section("message_dump")
+        self.renderer.remove_section("table_dump")
+        if self.renderer.write():
+            self.execute_bgpctl(["reload"])
+
+    def restart_bgp_instance(self):
+        """
+        Restart the BGP instance.
+        """
+        raise NotImplementedError("`restart_bgp_instance` not implemented!")
+
+    ########## bgpctl ##########
+
+    def get_bgpctl(self) -> list[str]:
+        """
+        Get the bgpctl command connecting to the control socket of the instance.
         """
+        if self.get_namespace() is None:
+            return ["sudo", "bgpctl"]
+        return ["sudo", "bgpctl", "-s", self.socket_path]
 
+    def execute_bgpctl(self, args: list[str]) -> bool:
+        """
+        Run a bgpctl command, and print its error if it failed.
+        """
+        completed = subprocess.run(self.get_bgpctl() + args, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"bgpctl {' '.join(args)} failed: {(completed.stdout + completed.stderr).strip()}")
+            return False
+        return True
+
+    def set_neighbors_up(self, up: bool):
+        """
+        Bring the sessions with the neighbors up or down.
+        """
+        for neighbor in self.router_agent_configuration.neighbors:
+            self.execute_bgpctl(["neighbor", neighbor.peer_ip, "up" if up else "down"])
+    
+    ########## OpenBGPD config file management ##########
+
+    def render_global(self) -> str:
+        """
+        Render the global configuration.
+        """
         global_conf = f"""
 AS {self.router_agent_configuration.asn}
 router-id 10.0.0.127
@@ -48,6 +134,14 @@ listen on 127.0.0.1
 listen on 10.0.0.127
 log updates
 """
+        if self.get_namespace() is not None:
+            global_conf += f'socket "{self.socket_path}"\n'
+        return global_conf
+
+    def render_neighbors(self) -> str:
+        """
+        Render the neighbors.
+        """
         neighbor_conf_list = []
         for neighbor in self.router_agent_configuration.neighbors:
             neighbor_conf = f"""
@@ -62,92 +156,19 @@ neighbor {neighbor.peer_ip} {{
 }}
 """
             neighbor_conf_list.append(neighbor_conf)
-        overall_conf = global_conf + "".join(neighbor_conf_list)
-        # Clear the old bgpd process
-        os.system("sudo pkill bgpd")
-        # Edit OpenBGPD config file.
-        with open(OPENBGPD_CONF, 'r') as f:
-            lines = f.readlines()
-        found = False
-        for i, line in enumerate(lines):
-            if line.strip() == OPENBGPD_CONF_MARKER.strip():
-                found = True
-                break
-        if not found:
-            raise ValueError(f"OpenBGPD configuration file marker not found! ({OPENBGPD_CONF_MARKER})")
-        new_lines = lines[:i+1] + ['\n' + overall_conf + '\n']
-        # Write the configuration file of BIRD
-        with open(OPENBGPD_CONF, 'w') as f:
-            f.writelines(new_lines)
-
-        os.system("sudo -E bgpd -v")
-    
-    def end_bgp_instance(self):
-        """
-        Shut down the BGP instance
-        """
-        os.system("sudo pkill bgpd")
-
-    def restart_bgp_instance(self):
-        """
-        Restart the BGP instance.
-        """
-        raise NotImplementedError("`restart_bgp_instance` not implemented!")
-    
-    ########## OpenBGPD config file management ##########
+        return "".join(neighbor_conf_list)
 
     def message_mrt_dump_config(self, path: str):
         """
-        Modify the config file for message MRT dumping.
+        Set the message MRT dumping in the config file (applied when the instance starts).
         """
-        dump_allin_pattern = re.compile(r'^dump all in\s+"([^"]+)"\s+(\d+)\s*$')
-        with open(OPENBGPD_CONF, "r") as f:
-            lines = f.readlines()
-        if OPENBGPD_CONF_MARKER in (line.strip() for line in lines):
-            marker_index = next(
-                i for i, line in enumerate(lines) if OPENBGPD_CONF_MARKER in line
-            )
-        else:
-            marker_index = len(lines)
-        found_allin = False
-        for i in range(marker_index):
-            if dump_allin_pattern.match(lines[i]):
-                lines[i] = f'dump all in "{path}" 300\n'
-                found_allin = True
-        inserts = []
-        if not found_allin:
-            inserts.append(f'dump all in "{path}" 300\n')
-
-        lines = inserts + lines
-        with open(OPENBGPD_CONF, "w") as f:
-            f.writelines(lines)
-        
+        self.renderer.set_section("message_dump", path, lambda: f'dump all in "{path}" 300')
         
     def route_mrt_dump_config(self, path: str):
         """
-        Modify the config file for route MRT dumping.
+        Set the route MRT dumping in the config file (applied when the instance starts).
         """
-        dump_tablev2_pattern = re.compile(r'^dump table-v2\s+"([^"]+)"\s+(\d+)\s*$')
-        with open(OPENBGPD_CONF, "r") as f:
-            lines = f.readlines()
-        if OPENBGPD_CONF_MARKER in (line.strip() for line in lines):
-            marker_index = next(
-                i for i, line in enumerate(lines) if OPENBGPD_CONF_MARKER in line
-            )
-        else:
-            marker_index = len(lines)
-        found_tablev2 = False
-        for i in range(marker_index):
-            if dump_tablev2_pattern.match(lines[i]):
-                lines[i] = f'dump table-v2 "{path}" 1\n'
-                found_tablev2 = True
-        inserts = []
-        if not found_tablev2:
-            inserts.append(f'dump table-v2 "{path}" 1\n')
-
-        lines = inserts + lines
-        with open(OPENBGPD_CONF, "w") as f:
-            f.writelines(lines)
+        self.renderer.set_section("table_dump", path, lambda: f'dump table-v2 "{path}" 1')
     
     ########## Log manipulation ##########
 
@@ -156,22 +177,45 @@ neighbor {neighbor.peer_ip} {{
         Read (all) the content from the routing softwares' log.
         Must execute with sudo-command.
         """
-        return read_file(OPENBGPD_LOG)
+        return self.log_tailer.read_all()
 
     def clear_log(self):
         """
         Clear the content from the routing softwares' log.
         Must execute with sudo-command.
         """
-        clear_file(OPENBGPD_LOG)
+        clear_file(self.log_path)
+        self.log_tailer.reset()
     
+    ########## Multiple instances ##########
+
+    MULTI_INSTANCE = True
+
+    def kill_software(self):
+        """
+        Kill the bgpd processes (of the instance, identified by its config path).
+        """
+        if self.get_namespace() is None:
+            os.system("sudo pkill bgpd")
+        else:
+            os.system(f"sudo pkill -f {self.conf_path}")
+
     ########## Crash management ##########
     
-    @classmethod
-    def if_crashed(cls) -> bool:
+    def get_daemon_patterns(self) -> list[str]:
+        """
+        Get the pattern matching the command line of bgpd (of the instance, identified by its config path).
+        """
+        if self.get_namespace() is not None:
+            return [rf"^(\S*/)?bgpd -d -v -f {re.escape(self.conf_path)}( |$)"]
+        return [r"^(\S*/)?bgpd( |$)"]
+
+    def check_crashed(self) -> bool:
         """
-        Return if the router software has crashed.
+        Check if the router software has crashed.
         """
+        if self.get_namespace() is not None:
+            return not self.process_alive(f"bgpd -d -v -f {self.conf_path}")
         # Get all process
         ps_output = subprocess.check_output(["ps", "aux"]).decode("utf-8")
 
@@ -0,0 +1,69 @@
+"""
+The timing profile of the routing software.
+
+The testbed waits on observable conditions (quiescent logs, complete MRT dumps, running daemons)
+instead of fixed sleeps, and the profile bounds each wait.
+The defaults are the former fixed sleeps, `run_calibration.py` measures the real latencies of a router
+and writes its profile into `TIMING_PROFILE_PATH`.
+"""
+
+import json, os
+from dataclasses import dataclass, asdict, fields
+from .basic_types import RouterAgentType
+from basic_utils.const import REPO_ROOT_PATH
+from basic_utils.log_tail_utils import LOG_IDLE_WINDOW
+
+TIMING_PROFILE_PATH = f"{REPO_ROOT_PATH}/config/timing_profiles.json"
+
+@dataclass
+class TimingProfile:
+    """
+    The timeouts (in seconds) of the condition-based waits of the testbed.
+    """
+    # The time without log updates before a BGP speaker is regarded as stable.
+    log_idle_window : float = LOG_IDLE_WINDOW
+    # The timeout of waiting for the router and ExaBGP to become stable at a `Halt`.
+    halt_timeout : float = 2
+    # The time without ExaBGP log updates before the propagated routes are regarded as complete.
+    propagation_window : float = 2
+    # The timeout of waiting for the ExaBGP log to become stable.
+    propagation_timeout : float = 4
+    # The timeout of waiting for the RIB to be dumped into the MRT file.
+    rib_dump_timeout : float = 2
+    # The timeout of waiting for the routing software to run after (re)starting it.
+    restart_timeout : float = 5
+
+# The profiles used before the router is calibrated.
+DEFAULT_TIMING_PROFILES = {
+    RouterAgentType.FRR: TimingProfile(rib_dump_timeout=3),
+    RouterAgentType.BIRD: TimingProfile(rib_dump_timeout=2, restart_timeout=10),
+    RouterAgentType.GOBGP: TimingProfile(rib_dump_timeout=1),
+    RouterAgentType.OPENBGPD: TimingProfile(rib_dump_timeout=1),
+}
+
+def load_timing_profile(router_type: RouterAgentType, path: str = TIMING_PROFILE_PATH) -> TimingProfile:
+    """
+    Load the calibrated profile of the router, or the default one if the router is not calibrated.
+    """
+    profile = DEFAULT_TIMING_PROFILES.get(router_type, TimingProfile())
+    if not os.path.exists(path):
+        return profile
+    with open(path, 'r') as f:
+        profiles = json.load(f)
+    if router_type.name not in profiles:
+        return profile
+    known_fields = {field.name for field in fields(TimingProfile)}
+    return TimingProfile(**{**asdict(profile),
+                            **{key: value for key, value in profiles[router_type.name].items() if key in known_fields}})
+
+def save_timing_profile(router_type: RouterAgentType, profile: TimingProfile, path: str = TIMING_PROFILE_PATH):
+    """
+    Save the profile of the router, keeping the profiles of the other routers.
+    """
+    profiles = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            profiles = json.load(f)
+    profiles[router_type.name] = asdict(profile)
+    with open(path, 'w') as f:
+        json.dump(profiles, f, indent=2)
@@ -2,16 +2,143 @@
 This file defines the TCP agent of BGProbe.
 """
 
+import threading
+from time import monotonic
+from dataclasses import dataclass
 from network_utils.tcp_client import TCPClientConfiguration, TCPClient
+from bgp_toolkit.message import MessageType, KeepAliveMessage_BFN, KeepAliveMessage
+from bgp_toolkit.wire_utils import is_message_type, get_open_hold_time, split_messages
 
+@dataclass
 class TCPAgentConfiguration (TCPClientConfiguration):
     """
-    Simply override the TCPClientConfiguration in `network_utils`.
+    Override the TCPClientConfiguration in `network_utils`.
     """
-    pass
+    # if KEEPALIVE messages are sent in the background to keep the session alive
+    keepalive : bool = True
 
 class TCPAgent(TCPClient):
     """
-    Simply override the TCPClient in `network_utils`.
+    Override the TCPClient in `network_utils`.
+
+    The agent tracks the BGP messages on both directions.
+    Once both OPEN messages are exchanged, the negotiated hold time is known,
+    and the KEEPALIVE manager (see `start_keepalive`) sends a KEEPALIVE message
+    whenever the tester has been silent for a third of the hold time.
     """
-    pass
+    def __init__(self, configuration = TCPAgentConfiguration):
+        super().__init__(configuration)
+        self.reset_session_state()
+        # Set to stop the KEEPALIVE manager.
+        self.keepalive_stop = threading.Event()
+        self.keepalive_thread : threading.Thread = None
+
+    def reset_session_state(self):
+        """
+        Reset the BGP state tracked on the connection.
+        """
+        # Hold time in the OPEN message sent by the tester, and in that of the router.
+        self.local_hold_time : int = None
+        self.remote_hold_time : int = None
+        # When the tester sent its last message, and when the router sent its last message.
+        self.last_send_time = monotonic()
+        self.last_receive_time = monotonic()
+        # Bytes received but not framed into a complete message yet.
+        self.receive_stream = b''
+        # If the router has closed the session with a NOTIFICATION message.
+        self.notified = False
+
+    def start(self):
+        """
+        Initialize and connect the TCP agent.
+        """
+        self.reset_session_state()
+        return super().start()
+
+    def get_negotiated_hold_time(self):
+        """
+        Get the negotiated hold time (the smaller one of both sides) of the session.
+        Return `None` if the OPEN message of the router is not received yet.
+        The OPEN message sent by the tester may be absent (or arbitrarily mutated),
+        in this case the hold time of the router is used.
+        """
+        if self.remote_hold_time is None:
+            return None
+        if self.local_hold_time is None:
+            return self.remote_hold_time
+        return min(self.local_hold_time, self.remote_hold_time)
+
+    def hold_timer_expired(self):
+        """
+        Check if the router has been silent for longer than the negotiated hold time.
+        """
+        hold_time = self.get_negotiated_hold_time()
+        if not hold_time:
+            return False
+        return monotonic() - self.last_receive_time > hold_time
+
+    def on_send(self, data: bytes):
+        """
+        Track the OPEN message sent by the tester.
+        """
+        super().on_send(data)
+        self.last_send_time = monotonic()
+        # Messages are sent whole, except for the deliberately malformed ones.
+        messages, _ = split_messages(data)
+        for message in messages:
+            if is_message_type(message, MessageType.OPEN) and len(message) >= 24:
+                self.local_hold_time = get_open_hold_time(message)
+
+    def on_receive(self, data: bytes):
+        """
+        Track the OPEN and NOTIFICATION messages sent by the router.
+        """
+        super().on_receive(data)
+        self.last_receive_time = monotonic()
+        messages, self.receive_stream = split_messages(self.receive_stream + data)
+        for message in messages:
+            if is_message_type(message, MessageType.OPEN) and len(message) >= 24:
+                self.remote_hold_time = get_open_hold_time(message)
+            elif is_message_type(message, MessageType.NOTIFICATION):
+                self.notified = True
+
+    def start_keepalive(self, check_interval: float = 0.5):
+        """
+        Start the KEEPALIVE manager in a background thread.
+        Must be called after `start_receiving`, which tracks the OPEN message of the router.
+
+        `check_interval`: How often (in seconds) the manager checks the timers.
+        No KEEPALIVE message is sent before the OPEN messages are exchanged,
+        after a NOTIFICATION from the router, or if the negotiated hold time is 0.
+        """
+        if not self.configuration.keepalive:
+            return
+        keepalive_bytes = KeepAliveMessage(KeepAliveMessage_BFN.get_bfn()).get_binary_expression()
+
+        def keepalive_loop():
+            expired = False
+            while not self.keepalive_stop.wait(check_interval):
+                if not self.connected or self.notified:
+                    break
+                hold_time = self.get_negotiated_hold_time()
+                if not hold_time or self.local_hold_time is None:
+                    continue
+                if not expired and self.hold_timer_expired():
+                    expired = True
+                    print(f"Hold timer ({hold_time}s) of the router expired!")
+                if monotonic() - self.last_send_time >= hold_time / 3:
+                    self.send(keepalive_bytes)
+
+        self.keepalive_stop.clear()
+        self.keepalive_thread = threading.Thread(target=keepalive_loop, daemon=True)
+        self.keepalive_thread.start()
+
+    def end(self):
+        """
+        Stop the KEEPALIVE manager and close the connection.
+        """
+        self.keepalive_stop.set()
+        if self.keepalive_thread is not None:
+            self.keepalive_thread.join(timeout=1)
+            self.keepalive_thread = None
+        super().end()
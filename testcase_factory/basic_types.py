@@ -1,7 +1,9 @@
 # Define the basic testcase types
 
+from dataclasses import dataclass
+from enum import Enum
 from basic_utils.binary_utils import bytes2hexstr
-from bgp_toolkit.message import Message
+from bgp_toolkit.message import Message, MessageType
 
 class Halt:
     """
@@ -9,12 +11,88 @@ class Halt:
     """
     pass
 
+class RawMessage(Message):
+    """
+    A BGP message given by its wire bytes (e.g., read from a capture), without a BFN tree.
+    """
+    def __init__(self, binary_expression: bytes, send_time: float = None):
+        """
+        `send_time`: When the message should be sent (in seconds),
+        relative to the first message of the testcase. Used by `SendMode.TIMED`.
+        """
+        super().__init__(None)
+        self.binary_expression = binary_expression
+        self.send_time = send_time
+
+    def get_message_type(self):
+        """Return the type of the message."""
+        if len(self.binary_expression) < 19:
+            return MessageType.UNDEFINED
+        try:
+            return MessageType(self.binary_expression[18])
+        except ValueError:
+            return MessageType.UNDEFINED
+
+    def get_binary_expression(self):
+        """Get the binary expression of the message."""
+        return self.binary_expression
+
+@dataclass
+class SocketOption:
+    """
+    A directive used to notify the test agent to change the TCP options of its socket.
+    Takes effect on the messages after it in the testcase.
+    `None` means leaving the option unchanged.
+    """
+    # TCP_NODELAY: send small segments immediately (disable Nagle's algorithm)
+    nodelay : bool = None
+    # TCP_CORK: hold partial segments until the cork is removed
+    cork : bool = None
+
+class SendMode(Enum):
+    """
+    How the test agent sends the messages of a testcase.
+    """
+    # Send the messages one-by-one, waiting for the router to become stable after each message.
+    SEQUENTIAL = 1
+    # Coalesce the messages between two `Halt`s into a single scatter-gather write.
+    BURST = 2
+    # Send the messages one-by-one at a fixed rate.
+    PACED = 3
+    # Send each `RawMessage` at its `send_time`, scaled by the speed-up factor.
+    TIMED = 4
+
+@dataclass
+class SendPolicy:
+    """
+    The policy used by the test agent to send the messages of a testcase.
+    """
+    mode : SendMode = SendMode.SEQUENTIAL
+    # messages per second, used by `SendMode.PACED`
+    rate : float = 5
+    # speed-up factor of the original timing, used by `SendMode.TIMED`
+    # `None` means sending as fast as possible.
+    speedup : float = 1
+    # initial TCP_NODELAY/TCP_CORK options, can be changed by `SocketOption` in the testcase
+    nodelay : bool = None
+    cork : bool = None
+
+    def __post_init__(self):
+        if not self.rate > 0:
+            raise ValueError(f"Wrong initialization of `SendPolicy`: rate {self.rate} not positive")
+        if self.speedup is not None and not self.speedup > 0:
+            raise ValueError(f"Wrong initialization of `SendPolicy`: speedup {self.speedup} not positive")
+
 class TestCase(list[Message]):
     """
     A list of the BGP messages as the test case.
     Send one-by-one to form the test
+    The way of sending can be changed by `send_policy`.
     """
-    def __new__(cls, value=None):
+    # Class-level default, so that testcases pickled without a policy still work.
+    send_policy : SendPolicy = None
+
+    def __new__(cls, value=None, send_policy=None):
         if value is None:
             # Called by pickle or internal machinery, skip validation
             return super().__new__(cls)
@@ -23,21 +101,39 @@ class TestCase(list[Message]):
             raise ValueError("Wrong initialization of `TestCase`: value not a list")
         
         for item in value:
-            if not isinstance(item, (Message, Halt)):
+            if not isinstance(item, (Message, Halt, SocketOption)):
                 raise ValueError(f"Wrong initialization of `TestCase`: {item} not a legal type")
         
         # Create the instance using the validated list
         return super().__new__(cls, value)
+
+    def __init__(self, value=None, send_policy=None):
+        """
+        Initialize the list content and the send policy.
+        """
+        super().__init__(value if value is not None else [])
+        if send_policy is not None:
+            self.send_policy = send_policy
+
+    def get_send_policy(self) -> SendPolicy:
+        """
+        Get the send policy of the testcase, the default policy is sequential sending.
+        """
+        return self.send_policy if self.send_policy is not None else SendPolicy()
     
     def get_string_expression(self) -> str:
         """
         Get the string expression of the testcase.
         """
         string = ""
+        if self.send_policy is not None:
+            string = string + f"SendPolicy {self.send_policy}\n"
         for item in self:
-            assert isinstance(item, (Message, Halt))
+            assert isinstance(item, (Message, Halt, SocketOption))
             if isinstance(item, Halt):
                 string = string + "Halt\n"
+            elif isinstance(item, SocketOption):
+                string = string + f"{item}\n"
             else:
                 string = string + bytes2hexstr(item.get_binary_expression()) + "\n"
         return string
@@ -14,11 +14,10 @@ from bgp_toolkit.basic_bfn_types import IPv4Prefix_BFN, Length_BFN
 from bgp_toolkit.binary_field_node import BinaryFieldNode
 
 from testcase_factory.basic_types import TestCase, Halt
+from testcase_factory.corpus import TEST_BATCH_DIR, save_corpus, get_corpus_path
 
 from bgprobe_config import *
 
-TEST_BATCH_DIR = f"{REPO_ROOT_PATH}/testcase_factory/batched_testcases"
-
 def probability_true(p) -> bool:
     """
     Return True with probability p
@@ -52,20 +51,31 @@ CONST_PREFIX = "59.66.130.0/24"
 def generate_test_batch(gen_func,
                         testcase_num: int,
                         test_batch_name: str,
-                        include_timestamp: bool = False):
+                        include_timestamp: bool = False,
+                        corpus: bool = False):
     """
     Generate the test batch from the generating function and the test batch name.
+    The testcases are written one by one as they are generated, so that a run can read only the testcases it selects:
+    - `corpus=False`: Into the pickle of the batch, with its index (see `save_variables_indexed`).
+      The BFN trees are kept, e.g., for the minimizer to revert the mutations of the crashing testcases.
+    - `corpus=True`: Into the corpus of the batch (see `corpus.py`), as wire bytes, faster to read.
+      The BFN trees are lost: the crash signatures have no mutated field, and the minimizer only drops items.
     """
     if include_timestamp:
         test_batch_name = f"{test_batch_name}_{get_current_time()}"
-    target_file =  f"{TEST_BATCH_DIR}/{test_batch_name}.pkl"
-    if file_exists(target_file):
-        delete_file(target_file)
-    testcase_list = []
-    for _ in range(0, testcase_num):
-        testcase = gen_func()
-        testcase_list.append(testcase)
-    save_variable_to_file(testcase_list,target_file)
+    pickle_file = f"{TEST_BATCH_DIR}/{test_batch_name}.pkl"
+    corpus_file = get_corpus_path(test_batch_name)
+    # Remove the former batch of the same name, in either format.
+    for target_file in [pickle_file, f"{pickle_file}{INDEX_SUFFIX}", corpus_file]:
+        if file_exists(target_file):
+            delete_file(target_file)
+    testcases = (gen_func() for _ in range(0, testcase_num))
+    if corpus:
+        lineages = ({"test_batch": test_batch_name, "generator": gen_func.__name__, "index": i}
+                    for i in range(0, testcase_num))
+        save_corpus(testcases, corpus_file, lineages)
+    else:
+        save_variables_indexed(testcases, pickle_file)
 
 ############### Test bacth generating functions ###############
 
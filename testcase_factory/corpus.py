@@ -0,0 +1,257 @@
+# The indexed corpus format of the test batches.
+
+# A corpus stores the testcases as pre-serialized wire bytes, so a testcase is read without unpickling BFN trees,
+# and the reader maps the file into memory, so testcase N is read in O(1) and the memory stays flat.
+#
+# +------------------------------------------------------------+
+# | Header: magic (8) | version (2) | reserved (6)             |
+# |         record number (8) | offset of the table (8)        |
+# +------------------------------------------------------------+
+# | Records (one per testcase, see `encode_record`)            |
+# +------------------------------------------------------------+
+# | Offset table: record number + 1 offsets (8 each),          |
+# | the last one is the end of the last record                 |
+# +------------------------------------------------------------+
+#
+# The table is written after the records, so the testcases are written as they are generated.
+# The testcases read back are made of `RawMessage`s, the BFN trees are not kept:
+# keep the pickled batches (see `IndexedVariableFile`) when the mutated fields are needed (e.g., by the minimizer).
+
+import json, math, mmap, os, struct
+from array import array
+from dataclasses import asdict
+from basic_utils.const import REPO_ROOT_PATH
+from basic_utils.serialize_utils import IndexedVariableFile
+from .basic_types import Halt, RawMessage, SocketOption, SendMode, SendPolicy, TestCase
+
+TEST_BATCH_DIR = f"{REPO_ROOT_PATH}/testcase_factory/batched_testcases"
+CORPUS_SUFFIX = ".corpus"
+
+CORPUS_MAGIC = b"BGPCORP\0"
+CORPUS_VERSION = 1
+# magic, version, reserved, record number, offset of the table
+HEADER_FORMAT = "!8sH6xQQ"
+HEADER_LEN = struct.calcsize(HEADER_FORMAT)
+OFFSET_FORMAT = "!Q"
+OFFSET_LEN = struct.calcsize(OFFSET_FORMAT)
+
+# item number, length of the send policy, length of the lineage
+RECORD_HEADER_FORMAT = "!IHI"
+RECORD_HEADER_LEN = struct.calcsize(RECORD_HEADER_FORMAT)
+ITEM_MESSAGE = 0
+ITEM_HALT = 1
+ITEM_SOCKET_OPTION = 2
+# kind, send time (NaN for `None`), length of the wire bytes
+MESSAGE_FORMAT = "!BdI"
+MESSAGE_LEN = struct.calcsize(MESSAGE_FORMAT)
+# kind, TCP_NODELAY, TCP_CORK (-1 for `None`)
+SOCKET_OPTION_FORMAT = "!Bbb"
+SOCKET_OPTION_LEN = struct.calcsize(SOCKET_OPTION_FORMAT)
+HALT_FORMAT = "!B"
+HALT_LEN = struct.calcsize(HALT_FORMAT)
+
+########## Encoding ##########
+
+def encode_option(value: bool) -> int:
+    """Encode an optional boolean."""
+    return -1 if value is None else int(value)
+
+def decode_option(value: int) -> bool:
+    """Decode an optional boolean."""
+    return None if value < 0 else bool(value)
+
+def encode_record(testcase: TestCase, lineage: dict = None) -> bytes:
+    """
+    Encode a testcase as a record:
+    the record header, the send policy (JSON, empty if unset), the lineage (JSON, empty if unset),
+    then the items: the messages (wire bytes and send time), the `Halt`s and the `SocketOption`s.
+    `lineage`: Where the testcase comes from (e.g., the generating function, the parent testcase).
+    """
+    policy = b''
+    if testcase.send_policy is not None:
+        policy = json.dumps({**asdict(testcase.send_policy), "mode": testcase.send_policy.mode.name}).encode()
+    lineage = json.dumps(lineage).encode() if lineage is not None else b''
+    chunks = [struct.pack(RECORD_HEADER_FORMAT, len(testcase), len(policy), len(lineage)), policy, lineage]
+    for item in testcase:
+        if isinstance(item, Halt):
+            chunks.append(struct.pack(HALT_FORMAT, ITEM_HALT))
+        elif isinstance(item, SocketOption):
+            chunks.append(struct.pack(SOCKET_OPTION_FORMAT, ITEM_SOCKET_OPTION,
+                                      encode_option(item.nodelay), encode_option(item.cork)))
+        else:
+            message_bytes = item.get_binary_expression()
+            send_time = getattr(item, "send_time", None)
+            chunks.append(struct.pack(MESSAGE_FORMAT, ITEM_MESSAGE,
+                                      math.nan if send_time is None else send_time, len(message_bytes)))
+            chunks.append(message_bytes)
+    return b''.join(chunks)
+
+def decode_record(buffer, offset: int) -> tuple[TestCase, dict]:
+    """
+    Decode the record at the offset of the buffer.
+    Return the testcase and its lineage.
+    """
+    item_num, policy_len, lineage_len = struct.unpack_from(RECORD_HEADER_FORMAT, buffer, offset)
+    offset += RECORD_HEADER_LEN
+    send_policy = None
+    if policy_len:
+        policy = json.loads(bytes(buffer[offset:offset+policy_len]))
+        send_policy = SendPolicy(**{**policy, "mode": SendMode[policy["mode"]]})
+    offset += policy_len
+    lineage = json.loads(bytes(buffer[offset:offset+lineage_len])) if lineage_len else None
+    offset += lineage_len
+    testcase = TestCase([], send_policy=send_policy)
+    for _ in range(item_num):
+        kind = buffer[offset]
+        if kind == ITEM_HALT:
+            testcase.append(Halt())
+            offset += HALT_LEN
+        elif kind == ITEM_SOCKET_OPTION:
+            _, nodelay, cork = struct.unpack_from(SOCKET_OPTION_FORMAT, buffer, offset)
+            testcase.append(SocketOption(nodelay=decode_option(nodelay), cork=decode_option(cork)))
+            offset += SOCKET_OPTION_LEN
+        elif kind == ITEM_MESSAGE:
+            _, send_time, length = struct.unpack_from(MESSAGE_FORMAT, buffer, offset)
+            offset += MESSAGE_LEN
+            testcase.append(RawMessage(bytes(buffer[offset:offset+length]),
+                                       None if math.isnan(send_time) else send_time))
+            offset += length
+        else:
+            raise ValueError(f"Unknown item kind {kind} in the corpus record!")
+    return testcase, lineage
+
+########## Writing ##########
+
+class CorpusWriter:
+    """
+    Write the testcases into a corpus file one by one.
+    Use as a context manager, the offset table and the header are written when closed.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(b'\0' * HEADER_LEN)
+        self.offsets = array('Q', [HEADER_LEN])
+
+    def append(self, testcase: TestCase, lineage: dict = None):
+        """
+        Append a testcase (and its lineage).
+        """
+        self.file.write(encode_record(testcase, lineage))
+        self.offsets.append(self.file.tell())
+
+    def close(self):
+        """
+        Write the offset table and the header, then close the file.
+        """
+        if self.file is None:
+            return
+        table_offset = self.file.tell()
+        offsets = array('Q', self.offsets)
+        if struct.pack("=Q", 1) != struct.pack(OFFSET_FORMAT, 1):
+            offsets.byteswap()
+        self.file.write(offsets.tobytes())
+        self.file.seek(0)
+        self.file.write(struct.pack(HEADER_FORMAT, CORPUS_MAGIC, CORPUS_VERSION, len(self.offsets) - 1, table_offset))
+        self.file.close()
+        self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def save_corpus(testcases, path: str, lineages=None):
+    """
+    Save the testcases (possibly a generator) into a corpus file.
+    `lineages`: The lineages of the testcases, in the same order.
+    """
+    lineages = iter(lineages) if lineages is not None else None
+    with CorpusWriter(path) as writer:
+        for testcase in testcases:
+            writer.append(testcase, next(lineages) if lineages is not None else None)
+
+########## Reading ##########
+
+class CorpusReader:
+    """
+    Read the testcases of a corpus file by their indices.
+    The file is mapped into memory, and a testcase is decoded on access.
+    The reader can be shared by forked processes.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.record_num, self.table_offset = struct.unpack_from(HEADER_FORMAT, self.buffer, 0)
+        if magic != CORPUS_MAGIC:
+            raise ValueError(f"{path} is not a corpus file!")
+        if version != CORPUS_VERSION:
+            raise ValueError(f"Unsupported corpus version {version} of {path}!")
+
+    def __len__(self):
+        return self.record_num
+
+    def get_offset(self, index: int) -> int:
+        """
+        Get the offset of the record from the offset table.
+        """
+        return struct.unpack_from(OFFSET_FORMAT, self.buffer, self.table_offset + index * OFFSET_LEN)[0]
+
+    def get_record(self, index: int) -> tuple[TestCase, dict]:
+        """
+        Get the testcase and its lineage.
+        """
+        if index < 0:
+            index += self.record_num
+        if not 0 <= index < self.record_num:
+            raise IndexError(f"Testcase {index} out of the corpus of {self.record_num} testcases!")
+        return decode_record(self.buffer, self.get_offset(index))
+
+    def __getitem__(self, index: int) -> TestCase:
+        return self.get_record(index)[0]
+
+    def get_lineage(self, index: int) -> dict:
+        """
+        Get the lineage of the testcase (`None` if not recorded).
+        """
+        return self.get_record(index)[1]
+
+    def get_record_bytes(self, index: int) -> bytes:
+        """
+        Get the encoded record (see `encode_record`), without decoding it.
+        """
+        return bytes(self.buffer[self.get_offset(index):self.get_offset(index + 1)])
+
+    def close(self):
+        """
+        Unmap the file.
+        """
+        self.buffer.close()
+
+########## Test batches ##########
+
+def get_corpus_path(test_batch_name: str) -> str:
+    """
+    Get the path of the corpus of the test batch.
+    """
+    return f"{TEST_BATCH_DIR}/{test_batch_name}{CORPUS_SUFFIX}"
+
+def open_test_batch(test_batch_name: str):
+    """
+    Open the test batch for random access: its corpus if any, otherwise its pickle (see `IndexedVariableFile`).
+    """
+    corpus_path = get_corpus_path(test_batch_name)
+    if os.path.exists(corpus_path):
+        return CorpusReader(corpus_path)
+    return IndexedVariableFile(f"{TEST_BATCH_DIR}/{test_batch_name}.pkl")
+
+def convert_test_batch_to_corpus(test_batch_name: str):
+    """
+    Convert the pickled test batch into a corpus, reading the pickled testcases one by one if they are indexed.
+    """
+    testcase_list = IndexedVariableFile(f"{TEST_BATCH_DIR}/{test_batch_name}.pkl")
+    save_corpus((testcase_list[i] for i in range(len(testcase_list))),
+                get_corpus_path(test_batch_name),
+                ({"test_batch": test_batch_name, "index": i} for i in range(len(testcase_list))))
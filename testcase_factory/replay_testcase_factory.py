@@ -0,0 +1,82 @@
+# Build replay testcases from recorded sessions (pcap captures and MRT dumps).
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bgp_toolkit.bgp_toolkit_configuration import BGPToolkitConfiguration
+from bgp_toolkit.message import MessageType, OpenMessage_BFN, KeepAliveMessage_BFN
+from bgp_toolkit.wire_utils import split_messages
+from basic_utils.mrt_utils import read_bgp4mp_messages
+from network_utils.pcap_utils import read_pcap, TCP_SYN, TCP_ACK
+from .basic_types import RawMessage, TestCase, SendPolicy, SendMode
+
+def get_replay_testcase(timed_messages: list[tuple[float, bytes]],
+                        speedup: float = 1,
+                        bgp_config: BGPToolkitConfiguration = None) -> TestCase:
+    """
+    Build the replay testcase from a list of `(timestamp, message)`.
+
+    The send time of each message is relative to the first message.
+    `speedup`: The speed-up factor of the original timing, `None` to send as fast as possible.
+    `bgp_config`: If given and the recorded messages do not start with an OPEN message
+    (e.g., FRRouting only dumps UPDATE messages), an OPEN and a KEEPALIVE message built from it
+    are sent first.
+    """
+    testcase = TestCase([], send_policy=SendPolicy(mode=SendMode.TIMED, speedup=speedup))
+    if not timed_messages:
+        return testcase
+    start_time = timed_messages[0][0]
+    first_message = RawMessage(timed_messages[0][1])
+    if bgp_config is not None and first_message.get_message_type() != MessageType.OPEN:
+        testcase.append(RawMessage(OpenMessage_BFN.get_bfn(bgp_config).get_binary_expression(), 0))
+        testcase.append(RawMessage(KeepAliveMessage_BFN.get_bfn().get_binary_expression(), 0))
+    for timestamp, message in timed_messages:
+        testcase.append(RawMessage(message, timestamp - start_time))
+    return testcase
+
+def read_tester_messages_from_pcap(path: str, tester_ip: str = None) -> list[tuple[float, bytes]]:
+    """
+    Read the BGP messages sent by the tester from a pcap capture.
+
+    `tester_ip`: The address of the tester.
+    By default, the tester is the endpoint sending the first SYN (i.e., the connecting side).
+    """
+    packets = read_pcap(path)
+    if tester_ip is None:
+        syn_packets = [packet for packet in packets
+                       if packet.flags & TCP_SYN and not packet.flags & TCP_ACK]
+        if syn_packets:
+            tester_ip = syn_packets[0].src[0]
+        elif packets:
+            tester_ip = packets[0].src[0]
+    timed_messages = []
+    stream = b''
+    for packet in packets:
+        if packet.src[0] != tester_ip or len(packet.payload) == 0:
+            continue
+        stream += packet.payload
+        messages, stream = split_messages(stream)
+        # A message is sent when its last byte is sent.
+        timed_messages += [(packet.timestamp, message) for message in messages]
+    return timed_messages
+
+def read_tester_messages_from_mrt(path: str, tester_ip: str = None, tester_asn: int = None) -> list[tuple[float, bytes]]:
+    """
+    Read the BGP messages received from the tester from a BGP4MP MRT dump (e.g., `messages.mrt`).
+    The dump of the router also records the other peers (e.g., the ExaBGP observer), which must not be replayed.
+
+    `tester_ip`: The address of the tester.
+    `tester_asn`: If `tester_ip` is not given, the tester is the peer with this AS.
+    If neither is given, the messages are taken from all the peers.
+    """
+    entries = [entry for entry in read_bgp4mp_messages(path) if not entry.sent_by_local]
+    if tester_ip is None and tester_asn is not None:
+        tester_ips = {entry.peer_ip for entry in entries if entry.peer_as == tester_asn}
+        if len(tester_ips) != 1:
+            print(f"Cannot infer the tester of AS {tester_asn} in {path} (peers: {sorted(tester_ips)})!")
+            return []
+        tester_ip = tester_ips.pop()
+    return [
+        (entry.timestamp, entry.message) for entry in entries
+        if tester_ip is None or entry.peer_ip == tester_ip
+    ]
@@ -0,0 +1,268 @@
+# Shrink a crashing testcase by delta debugging (ddmin).
+
+# The testcase is reduced at three levels, repeated until none of them makes progress:
+# - The items: the messages, `Halt`s and `SocketOption`s are dropped.
+# - The mutations: the mutated BFNs (`set_bval`, `set_prefix`, `set_suffix`, detached lengths...)
+#   are reverted to the values derived from their dependencies, i.e., towards the vanilla message.
+# - The lists: the elements of the list BFNs (NLRI, withdrawn routes, AS_PATH, communities...) are dropped.
+# Every candidate is re-executed by the oracle, which runs a batch of candidates (possibly in parallel)
+# and tells which of them still crash the routing software.
+
+from copy import deepcopy
+from typing import Callable
+from bgp_toolkit.binary_field_node import BinaryFieldNode
+from bgp_toolkit.basic_bfn_types import BinaryFieldList_BFN
+from bgp_toolkit.message import Message
+from .basic_types import TestCase
+
+# Run the candidates, and return whether each of them crashes the routing software.
+Oracle = Callable[[list[TestCase]], list[bool]]
+# The path of a BFN in a testcase: the index of the message, then the keys of the children from the message BFN.
+BFNPath = tuple[int, tuple[str, ...]]
+
+########## BFN manipulation ##########
+
+def get_bfn(testcase: TestCase, path: BFNPath) -> BinaryFieldNode:
+    """
+    Get the BFN of the testcase at the path.
+    """
+    index, keys = path
+    bfn = testcase[index].message_bfn
+    for key in keys:
+        bfn = bfn.children[key]
+    return bfn
+
+def iter_bfn_paths(testcase: TestCase):
+    """
+    Iterate over `(path, bfn)` of all the BFNs of the messages in the testcase, parents first.
+    Messages without a BFN tree (e.g., `RawMessage`) are skipped.
+    """
+    def iter_subtree(index: int, keys: tuple[str, ...], bfn: BinaryFieldNode):
+        yield (index, keys), bfn
+        for key, child in bfn.children.items():
+            yield from iter_subtree(index, keys + (key,), child)
+    for index, item in enumerate(testcase):
+        if isinstance(item, Message) and item.message_bfn is not None:
+            yield from iter_subtree(index, (), item.message_bfn)
+
+def get_raw_message_num(testcase: TestCase) -> int:
+    """
+    Count the messages without a BFN tree (e.g., read from a corpus), whose mutations and lists cannot be reduced.
+    """
+    return sum(1 for item in testcase if isinstance(item, Message) and item.message_bfn is None)
+
+def get_field_path(testcase: TestCase, path: BFNPath) -> str:
+    """
+    Get the names of the BFNs along the path, without the positions of the children
+    (e.g., all the elements of an NLRI have the same field path).
+    """
+    index, keys = path
+    return "/".join([testcase[index].message_bfn.get_bfn_name()] + [key.rsplit("_", 1)[0] for key in keys])
+
+def has_own_mutation(bfn: BinaryFieldNode) -> bool:
+    """
+    Check if the binary expression of the BFN itself is modified by a set-function.
+    """
+    return bfn.binary_content is not None or bfn.prefix != b'' or bfn.suffix != b''
+
+def is_mutated(bfn: BinaryFieldNode) -> bool:
+    """
+    Check if the BFN is a mutation point:
+    its binary expression is modified, or it is detached without any detached children
+    (e.g., a length field set by `set_num`).
+    """
+    return has_own_mutation(bfn) or (
+        bfn.detached and not any(child.detached for child in bfn.children.values()))
+
+def get_mutated_paths(testcase: TestCase) -> list[BFNPath]:
+    """
+    Get the paths of all the mutation points of the testcase.
+    """
+    return [path for path, bfn in iter_bfn_paths(testcase) if is_mutated(bfn)]
+
+def get_list_paths(testcase: TestCase) -> list[BFNPath]:
+    """
+    Get the paths of all the non-empty list BFNs of the testcase, parents first.
+    """
+    return [path for path, bfn in iter_bfn_paths(testcase)
+            if isinstance(bfn, BinaryFieldList_BFN) and bfn.children]
+
+def refresh_ancestors(bfn: BinaryFieldNode):
+    """
+    Re-attach the ancestors left without any mutation, and update the BFNs depending on the path
+    (e.g., the length fields), from the BFN up to the message.
+    A detached parent stops the propagation of `update`, so every level is updated explicitly.
+    """
+    parent = bfn.parent
+    while parent is not None and parent.detached and not has_own_mutation(parent) \
+            and not any(child.detached for child in parent.children.values()):
+        parent.detached = False
+        parent = parent.parent
+    node = bfn
+    while node is not None:
+        node.update_depend_on_me()
+        node = node.parent
+
+def revert_mutation(bfn: BinaryFieldNode):
+    """
+    Revert the mutation of the BFN, so that its value is derived from its dependencies again.
+    """
+    bfn.prefix = b''
+    bfn.suffix = b''
+    bfn.binary_content = None
+    bfn.attach()
+    refresh_ancestors(bfn)
+
+def keep_list_elements(bfn: BinaryFieldList_BFN, keys: list[str]):
+    """
+    Keep only the elements of the list BFN with the given keys.
+    """
+    bfn.set_bfn_list([bfn.children[key] for key in bfn.children if key in keys])
+    # `set_bfn_list` does not attach the list when its detached elements are dropped.
+    bfn.detached = has_own_mutation(bfn) or any(child.detached for child in bfn.children.values())
+    refresh_ancestors(bfn)
+
+########## Delta debugging ##########
+
+def split_chunks(elements: list, chunk_num: int) -> list[list]:
+    """
+    Split the elements into `chunk_num` chunks of (almost) the same size.
+    """
+    chunks = []
+    start = 0
+    for i in range(chunk_num):
+        end = start + (len(elements) - start) // (chunk_num - i)
+        chunks.append(elements[start:end])
+        start = end
+    return [chunk for chunk in chunks if chunk]
+
+def ddmin(elements: list,
+          build: Callable[[list], TestCase],
+          oracle: Oracle,
+          allow_empty: bool = True) -> list:
+    """
+    Find a 1-minimal subset of the elements whose testcase (built by `build`) still crashes.
+
+    The complements of all the chunks at the current granularity are run as one batch,
+    so the oracle can execute them in parallel. The first crashing complement is kept.
+    `allow_empty`: Whether the empty subset is tried first.
+    """
+    if allow_empty and elements and oracle([build([])])[0]:
+        return []
+    chunk_num = 2
+    while len(elements) >= 2:
+        chunks = split_chunks(elements, chunk_num)
+        complements = [[element for chunk_j in chunks if chunk_j is not chunk for element in chunk_j]
+                       for chunk in chunks]
+        results = oracle([build(complement) for complement in complements])
+        if any(results):
+            elements = complements[results.index(True)]
+            chunk_num = max(chunk_num - 1, 2)
+        elif chunk_num >= len(elements):
+            break
+        else:
+            chunk_num = min(chunk_num * 2, len(elements))
+    return elements
+
+class TestCaseMinimizer:
+    """
+    Minimize a crashing testcase with delta debugging.
+    """
+    def __init__(self,
+                 testcase: TestCase,
+                 oracle: Oracle,
+                 max_rounds: int = 5):
+        """
+        `oracle`: Run a batch of candidates, and return whether each of them crashes.
+        `max_rounds`: The maximum number of rounds of the three reductions.
+        """
+        self.testcase = testcase
+        self.oracle = oracle
+        self.max_rounds = max_rounds
+        # The number of candidates executed.
+        self.run_num = 0
+
+    def run_oracle(self, candidates: list[TestCase]) -> list[bool]:
+        """
+        Run the candidates by the oracle, and count them.
+        """
+        self.run_num += len(candidates)
+        print(f"Running {len(candidates)} candidates ({self.run_num} in total)...")
+        return self.oracle(candidates)
+
+    def reduce_items(self):
+        """
+        Drop the messages, `Halt`s and `SocketOption`s not needed for the crash.
+        """
+        def build(indices: list[int]) -> TestCase:
+            return TestCase([self.testcase[i] for i in indices], send_policy=self.testcase.send_policy)
+        indices = ddmin(list(range(len(self.testcase))), build, self.run_oracle, allow_empty=False)
+        self.testcase = build(indices)
+
+    def reduce_mutations(self):
+        """
+        Revert the mutations not needed for the crash.
+        """
+        paths = get_mutated_paths(self.testcase)
+        def build(kept_paths: list[BFNPath]) -> TestCase:
+            candidate = deepcopy(self.testcase)
+            # Children first, so that the reverted children re-attach their parents.
+            for path in reversed(paths):
+                if path not in kept_paths:
+                    revert_mutation(get_bfn(candidate, path))
+            return candidate
+        self.testcase = build(ddmin(paths, build, self.run_oracle))
+
+    def reduce_lists(self):
+        """
+        Drop the list elements not needed for the crash, one list at a time.
+        """
+        # A reduced list may drop the lists below it, so the paths are enumerated again each time.
+        reduced_paths = set()
+        while True:
+            paths = [path for path in get_list_paths(self.testcase) if path not in reduced_paths]
+            if not paths:
+                break
+            path = paths[0]
+            reduced_paths.add(path)
+            def build(keys: list[str]) -> TestCase:
+                candidate = deepcopy(self.testcase)
+                keep_list_elements(get_bfn(candidate, path), keys)
+                return candidate
+            keys = list(get_bfn(self.testcase, path).children.keys())
+            kept_keys = ddmin(keys, build, self.run_oracle)
+            if len(kept_keys) < len(keys):
+                self.testcase = build(kept_keys)
+                # The keys of the remaining elements are renumbered, so are the paths of the lists below.
+                reduced_paths = {reduced for reduced in reduced_paths
+                                 if not (reduced[0] == path[0] and len(reduced[1]) > len(path[1])
+                                         and reduced[1][:len(path[1])] == path[1])}
+
+    def minimize(self) -> TestCase:
+        """
+        Reduce the testcase until none of the reductions makes progress.
+        Return the smallest testcase found still crashing the routing software.
+        """
+        if not self.run_oracle([self.testcase])[0]:
+            print("The testcase does not crash the routing software, nothing to minimize.")
+            return self.testcase
+        raw_message_num = get_raw_message_num(self.testcase)
+        if raw_message_num:
+            print(f"WARNING: {raw_message_num} messages of the testcase have no BFN tree (e.g., read from a corpus), "
+                  "their mutations and lists cannot be reduced! "
+                  "Generate the test batch with `corpus=False` to keep the BFN trees.")
+        for i in range(self.max_rounds):
+            previous = self.testcase.get_string_expression()
+            print(f"======= Minimization round {i+1}: {len(self.testcase)} items =======")
+            self.reduce_items()
+            self.reduce_mutations()
+            self.reduce_lists()
+            if self.testcase.get_string_expression() == previous:
+                break
+        return self.testcase
+
+def get_wire_bytes(testcase: TestCase) -> bytes:
+    """
+    Get the bytes the tester sends on the wire for the testcase (the messages concatenated).
+    """
+    return b''.join(item.get_binary_expression() for item in testcase if isinstance(item, Message))
@@ -55,18 +55,28 @@ def set_up_vnet(config):
 
     ###### Processing the router software's veth ######
 
+    # The router software runs in the default namespace unless a namespace is given.
+    router_namespace = router_software.get("namespace")
+    if router_namespace is not None:
+        exec_ns(create_network_namespace(router_namespace))
+        exec_ns(start_veth("lo"), namespace=router_namespace)
     # Create the veth for the router instance
     exec_ns(create_veth(router_software["veth"],
                         peer_name(router_software["veth"])))
     # Bind the peer side of the router's veth into the bridge.
     exec_ns(bind_veth_to_bridge(peer_name(router_software["veth"]),
                                 bridge_name))
+    if router_namespace is not None:
+        exec_ns(bind_interface_with_network_namespace(router_software["veth"],
+                                                      router_namespace))
     # Start both sides of the router's veth.
-    exec_ns(start_veth(router_software["veth"]))
+    exec_ns(start_veth(router_software["veth"]),
+            namespace=router_namespace)
     exec_ns(start_veth(peer_name(router_software["veth"])))
     # Assign the adress for the router 
     exec_ns(assign_prefix_to_interface(router_software["ip"],
-                                       router_software["veth"]))
+                                       router_software["veth"]),
+            namespace=router_namespace)
 
     ###### Processing the clients' veth ######
 
@@ -103,6 +113,8 @@ def cleanup_namespaces(config: dict):
     # Use a shorter expression
     exec_ns = execute_under_namespace
     namespaces = [client["namespace"] for client in clients]
+    if config["router_software"].get("namespace") is not None:
+        namespaces.append(config["router_software"]["namespace"])
     for namespace in namespaces:
         exec_ns(delete_network_namespace(namespace))
 